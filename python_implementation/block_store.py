@@ -0,0 +1,222 @@
+# -----------------------------------------------------------
+# Store of the blocks of the stories, each block stored once under its hash
+#
+# Each story file written by mining.py is a full copy of the story: the 50 files of a 50-chapter story hold 1 + 2 + ... + 50 copies of the blocks.
+# The store keeps each block once, in the file block_store/blocks/[first 2 characters of the hash]/[hash].block (serialised like in the story files). A story is then only a reference to its last block (its tip): each block contains the hash of the previous one. The tips are named (by default with the name of the imported story file) and recorded in block_store/tips.index.
+# A block is only stored if its hash value matches its content, is consistent with the difficulty of the previous block and if it is linked to the previous block, which must already be stored. This is checked once per block hash: the blocks of an imported story that are already stored are not read again (the stored block is the one of the story, even if the imported file was modified).
+# The stories are exported to the usual story files ({'0': ..., '1': ..., ...}), byte for byte like the files written by mining.py, so that they can be sent to the discord server and checked by checks.py.
+# Set the environment variable BLOCK_STORE_DIR to use another directory than block_store in the working directory.
+#
+# Use with:
+#    python block_store.py import [--remove] story_file_1.json story_file_2.json ...
+#    python block_store.py export tip_name [story_file.json]
+#    python block_store.py list
+# With --remove, the imported story files are deleted once they are stored.
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import sys
+import json
+
+import blockchain_functions
+from story_stream import index_story_file, read_story_block
+
+block_store_directory = os.environ.get('BLOCK_STORE_DIR', 'block_store')
+block_store_tips_file_name = os.path.join(block_store_directory, 'tips.index')
+
+def get_block_file_name(block_hash):
+    return os.path.join(block_store_directory, 'blocks', block_hash[:2], block_hash+'.block')
+
+def has_block(block_hash):
+    return os.path.isfile(get_block_file_name(block_hash))
+
+def read_block_text(block_hash):
+    # This returns the serialised block, as it is written in the story files.
+
+    with open(get_block_file_name(block_hash), encoding='utf-8') as infile:
+        return infile.read()
+
+def read_block(block_hash):
+    return json.loads(read_block_text(block_hash))
+
+def get_block_number(block):
+    # The genesis block is block 0, the other blocks have the number of their chapter.
+
+    if 'signed_chapter_data' not in block['block_content'].keys():
+        return 0
+    return block['block_content']['signed_chapter_data']['chapter_data']['chapter_number']
+
+def write_block(block):
+    # This writes a block in the store (the checks are done by store_block). The file is replaced atomically, so that a block file is always complete.
+
+    file_name = get_block_file_name(block['hash'])
+    os.makedirs(os.path.dirname(file_name), exist_ok = True)
+    with open(file_name+'.tmp', 'w', encoding='utf-8') as outfile:
+        outfile.write(json.dumps(block, sort_keys = True, ensure_ascii = False))
+    os.replace(file_name+'.tmp', file_name)
+
+def check_block(block_number, block, previous_block, block_format):
+    # This checks the hash value, chapter number, difficulty and link of a block against the previous block (None for the genesis block). It returns True or 'error'.
+
+    test = blockchain_functions.check(blockchain_functions.check_hash(block['hash'], block['block_content'], block_format if block_number > 0 else 1), 'The hash value of block '+str(block_number)+' does not match its data.')
+    if test == 'error':
+        return 'error'
+    test = blockchain_functions.check(get_block_number(block) == block_number, 'Block '+str(block_number)+' does not have the right chapter number.')
+    if test == 'error':
+        return 'error'
+    if block_number > 0:
+        max_hash = 2**(256-previous_block['block_content']['difficulty'])-1
+        test = blockchain_functions.check(int.from_bytes(bytes.fromhex(block['hash']),'big') <= max_hash, 'The hash value of block '+str(block_number)+' is not consistent with the difficulty setting.')
+        if test == 'error':
+            return 'error'
+        test = blockchain_functions.check(block['block_content']['hash_previous_block'] == previous_block['hash'], 'The hash of block '+str(block_number-1)+' does not match the \'hash_previous_block\' field of block '+str(block_number)+'.')
+        if test == 'error':
+            return 'error'
+    return True
+
+def store_block(block_number, block, previous_block, block_format):
+    # This checks a block (see check_block) and stores it. It returns True or 'error'.
+
+    test = check_block(block_number, block, previous_block, block_format)
+    if test == 'error':
+        return 'error'
+    write_block(block)
+    return True
+
+def import_story(file_name):
+    # This stores the blocks of a story file that are not stored yet and returns the hash of its last block or 'error'.
+    # The file is read one block at a time (see story_stream.py), from the last block down to the first stored block. Only the blocks after it are checked and stored.
+
+    try:
+        index = index_story_file(file_name)
+    except OSError as error:
+        print('The file '+file_name+' could not be read: '+str(error))
+        return 'error'
+    test = blockchain_functions.check((index is not None) and (sorted(index.keys()) == list(range(len(index)))), 'The file '+file_name+' is not a story.')
+    if test == 'error':
+        return 'error'
+
+    try:
+        with open(file_name, 'rb') as infile:
+            # Find the last block that is already stored.
+            last_block_number = len(index)-1
+            first_new_block_number = 0
+            for block_number in range(last_block_number, -1, -1):
+                block_hash = read_story_block(infile, index, block_number)['hash']
+                if has_block(block_hash):
+                    test = blockchain_functions.check(get_block_number(read_block(block_hash)) == block_number, 'Block '+str(block_number)+' of '+file_name+' is stored with another block number.')
+                    if test == 'error':
+                        return 'error'
+                    first_new_block_number = block_number + 1
+                    break
+            if first_new_block_number > last_block_number:
+                return block_hash
+
+            # Check and store the new blocks.
+            genesis = read_block(get_chain_hashes(block_hash)[0]) if first_new_block_number > 0 else read_story_block(infile, index, 0)
+            block_format = blockchain_functions.get_block_format(genesis['block_content'])
+            previous_block = read_block(block_hash) if first_new_block_number > 0 else None
+            for block_number in range(first_new_block_number, last_block_number + 1):
+                block = read_story_block(infile, index, block_number)
+                test = store_block(block_number, block, previous_block, block_format)
+                if test == 'error':
+                    return 'error'
+                previous_block = block
+    except (OSError, KeyError, TypeError, ValueError, AttributeError) as error:
+        print('The file '+file_name+' is not a valid story: '+repr(error))
+        return 'error'
+    return previous_block['hash']
+
+def get_chain_hashes(tip_hash):
+    # This returns the hashes of the blocks of the story ending with the given block, in block order.
+
+    hashes = []
+    block_hash = tip_hash
+    while True:
+        hashes.append(block_hash)
+        block = read_block(block_hash)
+        if 'hash_previous_block' not in block['block_content'].keys():
+            break
+        block_hash = block['block_content']['hash_previous_block']
+    hashes.reverse()
+    return hashes
+
+def export_story(tip_hash, file_name):
+    # This writes the story ending with the given block to a story file, like save_mined_story (see mining.py). The blocks are copied one at a time.
+
+    hashes = get_chain_hashes(tip_hash)
+    return blockchain_functions.write_story_file(file_name, len(hashes)-1, lambda block_number: read_block_text(hashes[block_number]).encode('utf8'))
+
+def load_tips():
+    # This returns the named tips: {name: {'tip_hash', 'block_number', 'story_title'}}.
+
+    return blockchain_functions.load_json_file(block_store_tips_file_name)
+
+def import_story_files(file_names, remove = False):
+    # This imports story files in the store and names their tips with the file names. The imported files are deleted if remove is True.
+
+    tips = {}
+    for file_name in file_names:
+        tip_hash = import_story(file_name)
+        if tip_hash == 'error':
+            print(file_name+' was not imported.')
+            continue
+        tip = read_block(tip_hash)
+        genesis = read_block(get_chain_hashes(tip_hash)[0]) if get_block_number(tip) > 0 else tip
+        tips[file_name] = {'tip_hash': tip_hash, 'block_number': get_block_number(tip), 'story_title': genesis['block_content']['story_title']}
+        print(file_name+' is stored (block '+str(get_block_number(tip))+').')
+
+    def add_tips(stored_tips):
+        stored_tips.update(tips)
+    os.makedirs(block_store_directory, exist_ok = True)
+    blockchain_functions.update_json_file(block_store_tips_file_name, add_tips)
+    if remove:
+        for file_name in tips.keys():
+            os.remove(file_name)
+    return tips
+
+def print_block_store():
+    # This prints the named tips and compares the size of the store with the size of the story files.
+
+    tips = load_tips()
+    block_sizes = {}
+    stories_size = 0
+    for name in sorted(tips.keys()):
+        tip = tips[name]
+        print(name+': '+str(tip['story_title'])+', block '+str(tip['block_number'])+', '+tip['tip_hash'])
+        for block_hash in get_chain_hashes(tip['tip_hash']):
+            if block_hash not in block_sizes.keys():
+                block_sizes[block_hash] = os.path.getsize(get_block_file_name(block_hash))
+            stories_size += block_sizes[block_hash]
+    print(str(len(tips))+' stories ('+str(stories_size)+' bytes as story files) in '+str(len(block_sizes))+' blocks ('+str(sum(block_sizes.values()))+' bytes).')
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    remove = blockchain_functions.pop_flag(sys.argv, '--remove')
+    if (len(sys.argv) >= 3) and (sys.argv[1] == 'import'):
+        import_story_files(sys.argv[2:], remove)
+    elif (len(sys.argv) in [3, 4]) and (sys.argv[1] == 'export'):
+        tips = load_tips()
+        if sys.argv[2] in tips.keys():
+            tip_hash = tips[sys.argv[2]]['tip_hash']
+        elif has_block(sys.argv[2]):
+            tip_hash = sys.argv[2]
+        else:
+            print('There is no story named '+sys.argv[2]+' in the store.')
+            sys.exit()
+        if len(sys.argv) == 4:
+            file_name = sys.argv[3]
+        elif sys.argv[2] in tips.keys():
+            file_name = sys.argv[2]
+        else:
+            file_name = tip_hash+'.json'
+        print('The story was exported to '+export_story(tip_hash, file_name)+'.')
+    elif (len(sys.argv) == 2) and (sys.argv[1] == 'list'):
+        print_block_store()
+    else:
+        print('Usage: python block_store.py import [--remove] story_file_1.json story_file_2.json ...')
+        print('       python block_store.py export tip_name [story_file.json]')
+        print('       python block_store.py list')
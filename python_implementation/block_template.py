@@ -0,0 +1,161 @@
+# -----------------------------------------------------------
+# Pre-serialized block template used by the mining loop
+#
+# The hash of a block is the SHA-256 hash of json.dumps(block_content, sort_keys = True, ensure_ascii = False). During the mining, only a few fields of the block change from one try to the next: 'difficulty', 'mining_date', 'nb_tries', 'nonce' and 'story_runtime_seconds'. Everything else (in particular the signed chapter data) stays the same.
+# The template serializes the block once and cuts the result in constant chunks around the values of the changing fields. Each try then only splices the new values in between the chunks, as raw bytes, instead of serializing the whole block again.
+# The constant chunk in front of the first changing field is hashed once and the corresponding SHA-256 state is copied for each try.
+# The time-dependent fields ('difficulty', 'mining_date' and 'story_runtime_seconds') only change once per second. The mining loop calls set_template_time_fields when the second changes and then only splices 'nb_tries' and 'nonce' for each try (see hash_template_try).
+# The obtained bytes are exactly the ones produced by json.dumps, so that check_hash accepts the mined blocks.
+#
+# Run it as a script to compare the hashing speed of the two block formats on a chapter of maximal length (the length is taken from the 'character_limits' of 'genesis_block.json' if available):
+#    python block_template.py [duration_in_seconds]
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import json
+import hashlib
+import sys
+import time
+import random
+from blockchain_functions import get_hashed_block_content, import_json
+
+mining_fields = ['difficulty', 'mining_date', 'nb_tries', 'nonce', 'story_runtime_seconds']
+
+def serialize_block(block_content):
+    # This is the canonical serialization of a block. Its SHA-256 hash is the block hash.
+
+    return json.dumps(block_content, sort_keys = True, ensure_ascii = False).encode('utf8')
+
+def encode_field(value):
+    # This serializes a single value exactly as json.dumps does it inside the block.
+
+    if type(value) == int:
+        return str(value).encode('utf8')
+    return json.dumps(value, ensure_ascii = False).encode('utf8')
+
+def make_block_template(new_block):
+    # This serializes the block once with placeholders for the mining fields and cuts it in constant chunks around them.
+    # The pattern '"field": "placeholder"' can not appear inside a string value (the quotes would be escaped there), so the placeholders are found unambiguously.
+
+    template_block = new_block.copy()
+    for field in mining_fields:
+        template_block[field] = '@'+field+'@'
+    serialized = serialize_block(template_block)
+
+    positions = []
+    for field in mining_fields:
+        placeholder = encode_field('@'+field+'@')
+        marker = encode_field(field) + b': ' + placeholder
+        start = serialized.find(marker)
+        if (start == -1) or (serialized.find(marker, start + 1) != -1):
+            print('The field '+field+' could not be located in the block template.')
+            return 'error'
+        value_start = start + len(marker) - len(placeholder)
+        positions.append((value_start, value_start + len(placeholder), field))
+    positions.sort()
+
+    chunks = []
+    previous_end = 0
+    for value_start, value_end, field in positions:
+        chunks.append(serialized[previous_end:value_start])
+        previous_end = value_end
+    chunks.append(serialized[previous_end:])
+
+    template = {'chunks': chunks, 'fields': [field for _, _, field in positions]}
+    # The SHA-256 state after the constant prefix is computed once (the 'midstate') and copied for each try.
+    template['prefix_hash'] = hashlib.sha256(chunks[0])
+    return template
+
+def fill_block_template(template, new_block):
+    # This returns the serialized block (identical to serialize_block(new_block)) by splicing the mining fields into the template.
+
+    parts = [template['chunks'][0]]
+    for field, chunk in zip(template['fields'], template['chunks'][1:]):
+        parts.append(encode_field(new_block[field]))
+        parts.append(chunk)
+    return b''.join(parts)
+
+def hash_block_template(template, new_block):
+    # This returns the SHA-256 hash (as bytes) of the block, starting from the precomputed state of the constant prefix.
+
+    parts = []
+    for field, chunk in zip(template['fields'], template['chunks'][1:]):
+        parts.append(encode_field(new_block[field]))
+        parts.append(chunk)
+    block_hash = template['prefix_hash'].copy()
+    block_hash.update(b''.join(parts))
+    return block_hash.digest()
+
+def set_template_time_fields(template, new_block):
+    # This splices the time-dependent fields of new_block into the template. Everything in front of the 'nb_tries' value is hashed once here and everything after the nonce value is kept as a single chunk.
+    # 'nb_tries' and 'nonce' are next to each other in the serialized block (the keys are sorted), so only the chunk in between them is left.
+
+    fields = template['fields']
+    chunks = template['chunks']
+    tries_position = fields.index('nb_tries')
+    nonce_position = fields.index('nonce')
+    if nonce_position != tries_position + 1:
+        print('The fields \'nb_tries\' and \'nonce\' are not next to each other in the block template.')
+        return 'error'
+
+    head = []
+    for field, chunk in zip(fields[:tries_position], chunks[1:tries_position + 1]):
+        head.append(encode_field(new_block[field]))
+        head.append(chunk)
+    tail = [chunks[nonce_position + 1]]
+    for field, chunk in zip(fields[nonce_position + 1:], chunks[nonce_position + 2:]):
+        tail.append(encode_field(new_block[field]))
+        tail.append(chunk)
+
+    template['head_hash'] = template['prefix_hash'].copy()
+    template['head_hash'].update(b''.join(head))
+    template['middle'] = chunks[tries_position + 1] + b'"'
+    template['tail'] = b'"' + b''.join(tail)
+    return template
+
+def hash_template_try(template, nb_tries, nonce):
+    # This returns the SHA-256 hash (as bytes) of the block for one try. The nonce is given as 64 hexadecimal characters (bytes) and set_template_time_fields must have been called before.
+
+    block_hash = template['head_hash'].copy()
+    block_hash.update(b'%d' % nb_tries + template['middle'] + nonce + template['tail'])
+    return block_hash.digest()
+
+def make_benchmark_block(text_length):
+    # This makes a block to mine with a chapter text of the given length. The other fields have the size of the real ones (1024 bits RSA keys and signatures).
+
+    return {'signed_chapter_data': {'chapter_data': {'author': 'benchmark', 'chapter_number': 1, 'chapter_title': 'benchmark', 'story_title': 'benchmark', 'text': 'x'*text_length},
+                                    'encrypted_hashed_chapter': '0'*256, 'public_key': '0'*500},
+            'hash_previous_block': '0'*64, 'hash_eth': '0x'+'0'*64, 'miner_name': 'benchmark',
+            'difficulty': 25, 'mining_date': '2023/10/17 12:30:00', 'story_runtime_seconds': 0}
+
+def benchmark_block_format(block_format, text_length, duration = 5):
+    # This measures how many block hashes per second the template produces for a block with a chapter text of the given length.
+
+    new_block = make_benchmark_block(text_length)
+    template = make_block_template(get_hashed_block_content(new_block, block_format))
+    template = set_template_time_fields(template, new_block)
+    nonce_base = random.getrandbits(256)
+    nb_tries = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < duration:
+        for _ in range(1000):
+            nb_tries += 1
+            hash_template_try(template, nb_tries, b'%064x' % ((nonce_base + nb_tries) % 2**256))
+    return nb_tries/(time.perf_counter() - start_time)
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        duration = float(sys.argv[1])
+    else:
+        duration = 5
+    genesis = import_json('genesis_block.json', False)
+    text_length = genesis.get('character_limits', {}).get('text', 30000)
+    print('Hashing blocks with a chapter text of '+str(text_length)+' characters for '+str(duration)+' seconds per block format.')
+    hashes_per_second = {}
+    for block_format in [1, 2]:
+        hashes_per_second[block_format] = benchmark_block_format(block_format, text_length, duration)
+        print('    - block format '+str(block_format)+': '+str(round(hashes_per_second[block_format]))+' hashes per second.')
+    print('The block format 2 is '+str(round(hashes_per_second[2]/hashes_per_second[1], 1))+' times faster.')
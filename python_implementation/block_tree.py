@@ -0,0 +1,209 @@
+# -----------------------------------------------------------
+# Tree of the blocks of all the story files of the working directory, to select the canonical story
+#
+# The working directory can contain hundreds of story files downloaded from the discord server. They share their first blocks and differ by their last ones (forks).
+# The blocks of all the story files are put in a single tree: each block is recorded once, by hash, with the hash of its previous block, its number, its story run-time and its miner. Each story file is then only the hash of its last block (its tip).
+# The canonical story of a title is the one that the miners must extend (see the blockchain rules in README.md): the story with the largest number of chapters and, among those, the one with the smallest story run-time (and then the smallest hash of the last block).
+# A story file is only added to the tree if the hash values of its blocks match their content, are consistent with the difficulty and are linked to each other. The signatures and the ETH blocks are not checked here (see checks.py).
+# The tree is kept in the file block_tree.index in the working directory, together with the modification time and size of each story file. Only the new and modified story files are read (see workspace.py).
+#
+# Print the forks and the canonical story of each title with:
+#    python block_tree.py [story title]
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import sys
+
+import blockchain_functions
+import workspace
+from story_stream import index_story_file, iter_story_blocks
+
+block_tree_file_name = 'block_tree.index'
+# The tree of this process (see get_block_tree).
+known_block_tree = None
+
+def make_block_tree():
+    # The tree has two parts:
+    #    - 'blocks': {block hash: {'block_number', 'hash_previous_block', 'story_title', 'story_runtime_seconds', 'miner_name'}}
+    #    - 'files': {file name: {'mtime_ns', 'size', 'tip_hash'}}, with 'tip_hash' None for the story files that are not valid.
+
+    return {'blocks': {}, 'files': {}}
+
+def read_story_file_blocks(file_name):
+    # This reads a story file one block at a time and returns its blocks (without the chapters) in block order or 'error' if the file is not a valid story (see the description above).
+
+    try:
+        index = index_story_file(file_name)
+        if (index is None) or (sorted(index.keys()) != list(range(len(index)))):
+            return 'error'
+        blocks = []
+        for block_number, block in iter_story_blocks(file_name, index):
+            block_content = block['block_content']
+            if block_number == 0:
+                genesis = block_content
+                block_format = blockchain_functions.get_block_format(genesis)
+                if not blockchain_functions.check_hash(block['hash'], block_content):
+                    return 'error'
+                hash_previous_block = None
+            else:
+                if not blockchain_functions.check_hash(block['hash'], block_content, block_format):
+                    return 'error'
+                if int.from_bytes(bytes.fromhex(block['hash']), 'big') > 2**(256-previous_difficulty)-1:
+                    return 'error'
+                hash_previous_block = block_content['hash_previous_block']
+                if hash_previous_block != blocks[-1][0]:
+                    return 'error'
+            blocks.append((block['hash'], {'block_number': block_number, 'hash_previous_block': hash_previous_block, 'story_title': genesis['story_title'],
+                                           'story_runtime_seconds': block_content['story_runtime_seconds'], 'miner_name': block_content.get('miner_name')}))
+            previous_difficulty = block_content['difficulty']
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return 'error'
+    if len(blocks) == 0:
+        return 'error'
+    return blocks
+
+def update_block_tree(block_tree, index):
+    # This updates the tree with the story files of the workspace index (see workspace.py): the new and modified files are read and the files that are not stories anymore are removed. It returns True if the tree changed.
+
+    story_files = {file_name: summary for file_name, summary in index.items() if summary['type'] == 'story'}
+    changed = False
+    for file_name in list(block_tree['files'].keys()):
+        if file_name not in story_files.keys():
+            del block_tree['files'][file_name]
+            changed = True
+    for file_name, summary in story_files.items():
+        known_file = block_tree['files'].get(file_name)
+        if (known_file is not None) and (known_file['mtime_ns'] == summary['mtime_ns']) and (known_file['size'] == summary['size']):
+            continue
+        blocks = read_story_file_blocks(file_name)
+        if blocks == 'error':
+            tip_hash = None
+        else:
+            block_tree['blocks'].update(blocks)
+            tip_hash = blocks[-1][0]
+        block_tree['files'][file_name] = {'mtime_ns': summary['mtime_ns'], 'size': summary['size'], 'tip_hash': tip_hash}
+        changed = True
+    return changed
+
+def get_story_tips(block_tree, story_title = None):
+    # This returns the tips of the valid story files (of the given title), from the canonical one to the last one (see the description above).
+    # Each tip is a dictionary with the fields of its block, its 'hash' and the sorted names of the story 'files' that end with it.
+
+    tips = {}
+    for file_name, known_file in block_tree['files'].items():
+        if known_file['tip_hash'] is None:
+            continue
+        block = block_tree['blocks'][known_file['tip_hash']]
+        if (story_title is not None) and (block['story_title'] != story_title):
+            continue
+        if known_file['tip_hash'] not in tips.keys():
+            tips[known_file['tip_hash']] = dict(block, hash = known_file['tip_hash'], files = [])
+        tips[known_file['tip_hash']]['files'].append(file_name)
+    for tip in tips.values():
+        tip['files'].sort()
+    return sorted(tips.values(), key = lambda tip: (-tip['block_number'], tip['story_runtime_seconds'], tip['hash']))
+
+def get_fork_block_number(block_tree, tip_hash, other_tip_hash):
+    # This returns the number of the last block shared by the stories ending with the two tips (-1 if they do not share their genesis block).
+
+    chain = set()
+    block_hash = other_tip_hash
+    while block_hash is not None:
+        chain.add(block_hash)
+        block_hash = block_tree['blocks'][block_hash]['hash_previous_block']
+    block_hash = tip_hash
+    while block_hash is not None:
+        if block_hash in chain:
+            return block_tree['blocks'][block_hash]['block_number']
+        block_hash = block_tree['blocks'][block_hash]['hash_previous_block']
+    return -1
+
+def load_block_tree():
+    # This returns the tree kept in block_tree.index or an empty tree.
+
+    try:
+        block_tree = blockchain_functions.load_json_file(block_tree_file_name)
+    except (OSError, ValueError):
+        block_tree = {}
+    if set(block_tree.keys()) != set(['blocks', 'files']):
+        return make_block_tree()
+    return block_tree
+
+def save_block_tree(block_tree):
+    # This saves the tree in block_tree.index. The blocks that are not in any story file anymore are forgotten.
+
+    used_blocks = {}
+    for known_file in block_tree['files'].values():
+        block_hash = known_file['tip_hash']
+        while (block_hash is not None) and (block_hash not in used_blocks.keys()):
+            used_blocks[block_hash] = block_tree['blocks'][block_hash]
+            block_hash = used_blocks[block_hash]['hash_previous_block']
+    block_tree['blocks'] = used_blocks
+
+    def replace(stored_block_tree):
+        stored_block_tree.clear()
+        stored_block_tree.update(block_tree)
+    try:
+        blockchain_functions.update_json_file(block_tree_file_name, replace)
+    except OSError as error:
+        print('The block tree '+block_tree_file_name+' could not be saved: '+str(error))
+
+def get_block_tree(index = None):
+    # This returns the tree of the process, updated with the workspace index (see workspace.py). It is read from block_tree.index on the first call and saved when it changes.
+
+    global known_block_tree
+    if index is None:
+        index = workspace.get_workspace_index()
+    if known_block_tree is None:
+        known_block_tree = load_block_tree()
+    if update_block_tree(known_block_tree, index):
+        save_block_tree(known_block_tree)
+    return known_block_tree
+
+def get_canonical_story_file(story_title, index = None):
+    # This returns the name of a story file that ends with the canonical tip of the story or None if there is no valid story file with this title.
+
+    tips = get_story_tips(get_block_tree(index), story_title)
+    if len(tips) == 0:
+        return None
+    return tips[0]['files'][0]
+
+def print_story_forks(block_tree, story_title = None):
+    # This prints the tips of each story, the canonical one first, with the block where they fork from the canonical story.
+
+    tips = get_story_tips(block_tree, story_title)
+    if len(tips) == 0:
+        print('There is no valid story file in the working directory.')
+    titles = []
+    for tip in tips:
+        if tip['story_title'] not in titles:
+            titles.append(tip['story_title'])
+    for title in titles:
+        story_tips = [tip for tip in tips if tip['story_title'] == title]
+        canonical_tip = story_tips[0]
+        print(title+': '+str(len(story_tips))+' tip(s)')
+        for tip in story_tips:
+            line = '    '+str(tip['block_number'])+' chapter(s), story run-time '+str(tip['story_runtime_seconds'])+' s, last miner '+str(tip['miner_name'])+', '+str(len(tip['files']))+' file(s) (e.g. '+tip['files'][0]+')'
+            if tip is canonical_tip:
+                line = line+', canonical'
+            else:
+                fork_block_number = get_fork_block_number(block_tree, tip['hash'], canonical_tip['hash'])
+                if fork_block_number == tip['block_number']:
+                    line = line+', contained in the canonical story'
+                else:
+                    line = line+', forks after block '+str(fork_block_number)
+            print(line)
+    nb_invalid_files = len([known_file for known_file in block_tree['files'].values() if known_file['tip_hash'] is None])
+    if nb_invalid_files > 0:
+        print(str(nb_invalid_files)+' story file(s) are not valid and are ignored.')
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        print_story_forks(get_block_tree())
+    elif len(sys.argv) == 2:
+        print_story_forks(get_block_tree(), sys.argv[1])
+    else:
+        print('Usage: python block_tree.py [story title]')
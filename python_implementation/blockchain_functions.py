@@ -8,11 +8,26 @@
 import json
 import rsa
 import sys
+import os
+import time
 import glob
+import threading
 import numpy as np
 import datetime as dt
-from web3 import Web3, AsyncWeb3
+import requests
 import pytz
+from functools import lru_cache
+from eth_cache import get_cached_eth_block, cache_eth_block
+import eth_snapshot
+import block_tree
+from signature_cache import get_signature_key, get_cached_signature, cache_signatures
+
+# The ETH blocks are read from this JSON-RPC endpoint. Set the environment variable ETH_API_URL to use another node (for example a local test server, see eth_test_server.py).
+eth_api_url = os.environ.get('ETH_API_URL', 'https://eth-mainnet.public.blastapi.io')
+# Time between two ETH blocks (slots) since the merge.
+eth_slot_seconds = 12
+# The HTTP session is shared by all the requests of a thread, so that the connection to the node is reused. Each thread has its own session, so that the lookups can run in parallel (see check_file).
+eth_sessions = threading.local()
 
 def check_chapter_data(chapter_data, genesis):
     # This checks that the chapter to submit does not violate the rules given in the genesis block.
@@ -78,18 +93,14 @@ def write_chapter_to_readable_file(chapter_data):
 def get_genesis_block(story_title):
     # Get the genesis block. Use the validated blockchain file if available and default to the local file 'genesis_block.json' if not.
     # With the validated blockchain, check the integrity of the genesis block and stop the script if the hash value does not match.
+    # The validated blockchain is the canonical story of this title (see block_tree.py), only the chosen story is read.
     
-    files = glob.glob('*.json')
-    
-    files = [f for f in files if (all([x.isdigit() for x in import_json(f, False).keys()]) and (len(import_json(f, False)) != 0))]
-    files = [f for f in files if import_json(f)['0']['block_content']['story_title'] == story_title]
+    file_name = block_tree.get_canonical_story_file(story_title)
     
-    if len(files) == 0:
+    if file_name is None:
         print('The genesis block is not validated. Using the file \'genesis_block.json\'.')
         return import_json('genesis_block.json', False)
     
-    file_index = np.argmax(np.array([max([int(x) for x in import_json(f).keys()]) for f in files]))
-    file_name = files[file_index]
     try:
         blockchain = import_json(file_name, False)
         if check_hash(blockchain['0']['hash'],blockchain['0']['block_content']):
@@ -120,94 +131,292 @@ def check(statement,message):
         return 'error'
         #sys.exit()
         
-def check_hash(provided_hash,block_content):
-    computed_hash = rsa.compute_hash(json.dumps(block_content, ensure_ascii = False, sort_keys = True).encode('utf8'), 'SHA-256').hex()
+def pop_option(args, name, default = None):
+    # This removes an option of the form '--name value' from the list of command line arguments and returns its value.
+    # The positional arguments are left in place so that the scripts can keep reading them from sys.argv.
+    
+    if name not in args:
+        return default
+    position = args.index(name)
+    if position + 1 >= len(args):
+        print('The option '+name+' needs a value.')
+        return 'error'
+    value = args[position + 1]
+    del args[position:position + 2]
+    return value
+
+def pop_flag(args, name):
+    # This removes a flag of the form '--name' from the list of command line arguments and returns whether it was present.
+    
+    if name not in args:
+        return False
+    args.remove(name)
+    return True
+
+def load_json_file(file_name):
+    # This returns the content of a json file kept by the scripts (for example a queue or a cache) or an empty dictionary if it does not exist yet.
+    
+    if not os.path.isfile(file_name):
+        return {}
+    with open(file_name, encoding='utf-8') as infile:
+        return json.load(infile)
+
+def update_json_file(file_name, function, indent = None, stale_lock_seconds = 60):
+    # This applies function(content) to the content of a json file while holding a lock, so that several processes (the command line scripts and the graphical user interface) can update the same file. It returns what function returns or 'error'.
+    # The lock is a file created next to it. A lock older than stale_lock_seconds was left behind by a crashed process and is removed.
+    # The file is replaced atomically, so that it can always be read without the lock.
+    
+    lock_file_name = file_name+'.lock'
+    start_time = time.time()
+    while True:
+        try:
+            lock = os.open(lock_file_name, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_file_name) > stale_lock_seconds:
+                    os.remove(lock_file_name)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() - start_time > 2*stale_lock_seconds:
+                print('Could not lock the file '+file_name+'.')
+                return 'error'
+            time.sleep(0.1)
+    try:
+        content = load_json_file(file_name)
+        result = function(content)
+        with open(file_name+'.tmp', "w", encoding='utf-8') as outfile:
+            json.dump(content, outfile, sort_keys = True, ensure_ascii = False, indent = indent)
+        os.replace(file_name+'.tmp', file_name)
+    finally:
+        os.close(lock)
+        os.remove(lock_file_name)
+    return result
+
+def write_story_file(file_name, last_block_number, read_block_bytes):
+    # This writes a story file one block at a time, without loading the whole story. read_block_bytes(block_number) returns the block serialized as in the story files (see save_mined_story in mining.py), encoded in utf-8.
+    # The blocks are written in the order of their keys sorted as strings, like json.dump(story, sort_keys = True, ensure_ascii = False) does, so that the file is byte-identical. The file is replaced atomically.
+    
+    with open(file_name+'.tmp', 'wb') as outfile:
+        outfile.write(b'{')
+        for i, block_number in enumerate(sorted([str(n) for n in range(last_block_number + 1)])):
+            if i > 0:
+                outfile.write(b', ')
+            outfile.write(b'"'+block_number.encode()+b'": '+read_block_bytes(int(block_number)))
+        outfile.write(b'}')
+    os.replace(file_name+'.tmp', file_name)
+    return file_name
+
+def get_block_format(genesis):
+    # The block format is declared in the genesis block with the optional 'block_format' field. It defaults to 1.
+    #    - 1: the block hash is the hash of the whole block content.
+    #    - 2: the 'signed_chapter_data' field is replaced by its own hash (in the field 'chapter_digest') before hashing the block content. The mining fields then come after a fixed-size digest and each mining try only hashes a few hundred bytes, whatever the length of the chapter.
+    
+    return genesis.get('block_format', 1)
+
+def get_hashed_block_content(block_content, block_format = 1):
+    # This returns the dictionary whose serialization is hashed to get the block hash.
+    
+    if (block_format == 2) and ('signed_chapter_data' in block_content.keys()):
+        hashed_block_content = {k: block_content[k] for k in block_content.keys() if k != 'signed_chapter_data'}
+        hashed_block_content['chapter_digest'] = rsa.compute_hash(json.dumps(block_content['signed_chapter_data'], ensure_ascii = False, sort_keys = True).encode('utf8'), 'SHA-256').hex()
+        return hashed_block_content
+    return block_content
+
+def check_hash(provided_hash,block_content, block_format = 1):
+    computed_hash = rsa.compute_hash(json.dumps(get_hashed_block_content(block_content, block_format), ensure_ascii = False, sort_keys = True).encode('utf8'), 'SHA-256').hex()
     
     if computed_hash == provided_hash:
         return True
     return False
 
-def validate_chapter_data(signed_chapter_data, story):
+def make_chain_index(story):
+    # This indexes the authors of the story in a single pass over its blocks (see add_block_to_chain_index).
+    
+    chain_index = {'authors': {}, 'public_keys': {}}
+    for block_number in sorted([int(k) for k in story.keys() if k != '0']):
+        add_block_to_chain_index(chain_index, block_number, story[str(block_number)]['block_content']['signed_chapter_data'])
+    return chain_index
+
+def add_block_to_chain_index(chain_index, block_number, signed_chapter_data):
+    # This adds a block to the index of the authors of a story:
+    #    - chain_index['authors'][author] contains the public keys used by the author (in block order) and the first block of the author.
+    #    - chain_index['public_keys'][public_key] contains the authors that used the public key.
+    # Adding the same block twice does not change the index.
+    
+    author = signed_chapter_data['chapter_data']['author']
+    public_key = signed_chapter_data['public_key']
+    author_entry = chain_index['authors'].setdefault(author, {'public_keys': [], 'first_block': block_number})
+    author_entry['first_block'] = min(author_entry['first_block'], block_number)
+    if public_key not in author_entry['public_keys']:
+        author_entry['public_keys'].append(public_key)
+    key_authors = chain_index['public_keys'].setdefault(public_key, [])
+    if author not in key_authors:
+        key_authors.append(author)
+    return chain_index
+
+@lru_cache(maxsize = 256)
+def load_public_key(public_key):
+    # This parses a public key (PKCS#1, in hexadecimal). The parsed keys are kept, since a few keys sign all the chapters of a story.
+    
+    return rsa.PublicKey.load_pkcs1(bytes.fromhex(public_key))
+
+def check_chapter_signature(signed_chapter_data):
+    # This returns True if the signature of the signed chapter data is right and False otherwise, without the cache.
+    
+    clear_chapter_data = json.dumps(signed_chapter_data['chapter_data'], ensure_ascii = False, sort_keys = True).encode('utf8')
+    encrypted_hashed_chapter = bytes.fromhex(signed_chapter_data['encrypted_hashed_chapter'])
+    public_key = load_public_key(signed_chapter_data['public_key'])
+    try:
+        rsa.verify(clear_chapter_data, encrypted_hashed_chapter, public_key)
+        return True
+    except:
+        return False
+
+def verify_chapter_signature(signed_chapter_data):
+    # This returns True if the signature of the signed chapter data is right and False otherwise.
+    # The results are cached by content (see signature_cache.py), so that each signed chapter is only checked once.
+    
+    signature_key = get_signature_key(signed_chapter_data)
+    valid = get_cached_signature(signature_key)
+    if valid is None:
+        valid = check_chapter_signature(signed_chapter_data)
+        cache_signatures({signature_key: valid})
+    return valid
+
+def validate_chapter_data(signed_chapter_data, story, chain_index = None):
     # This validates the signed chapter data. It checks:
     #    - that the chapter data complies with the rules of the genesis block.
     #    - that the digital signature of the signed chapter data is right.
     #    - that there is only one public key assocaited with each author name.
+    # chain_index is the index of the authors of the story (see make_chain_index). It is built from the story if not provided. Provide it when validating several blocks of the same story, so that the story is only scanned once.
     
     genesis = story['0']['block_content']
     test = check_chapter_data(signed_chapter_data['chapter_data'], genesis)
     
-    clear_chapter_data = json.dumps(signed_chapter_data['chapter_data'], ensure_ascii = False, sort_keys = True).encode('utf8')
-    encrypted_hashed_chapter = bytes.fromhex(signed_chapter_data['encrypted_hashed_chapter'])
-    public_key = rsa.PublicKey.load_pkcs1(bytes.fromhex(signed_chapter_data['public_key']))
-    try:
-        temp = rsa.verify(clear_chapter_data, encrypted_hashed_chapter, public_key) == 'SHA-256'
-    except:
+    if not verify_chapter_signature(signed_chapter_data):
         test = False
         print('The signed chapter data has been modified.')
     
-    authors = {k: story[k]['block_content']['signed_chapter_data']['chapter_data']['author'] for k in story.keys() if k!= '0' and story[k]['block_content']['signed_chapter_data']['chapter_data']['author'] == signed_chapter_data['chapter_data']['author']}
-    public_keys = {k: story[k]['block_content']['signed_chapter_data']['public_key'] for k in story.keys() if k!= '0' and story[k]['block_content']['signed_chapter_data']['chapter_data']['author'] == signed_chapter_data['chapter_data']['author']}
+    if chain_index is None:
+        chain_index = make_chain_index(story)
+    public_keys = set(chain_index['authors'].get(signed_chapter_data['chapter_data']['author'], {'public_keys': []})['public_keys'])
     
-    if len(set(public_keys.values())) > 1:
+    if len(public_keys) > 1:
         print('There is something wrong with the story file. Multiple public keys are associated with a single author.')
         test = False
-    elif len(set(public_keys.values())) == 1:    
-        if {signed_chapter_data['public_key']} != set(public_keys.values()):
+    elif len(public_keys) == 1:    
+        if {signed_chapter_data['public_key']} != public_keys:
             print('The public key of the signed chapter data does not correspond with the key used in previous chapters. Please provide the right keys file or change the author name.')
             test = False
         
     return test
 
-def get_eth_block_info(target_date, retry = True):
+def get_eth_session():
+    # This returns the HTTP session used for the requests to the ETH node from the current thread.
+
+    if not hasattr(eth_sessions, 'session'):
+        eth_sessions.session = requests.Session()
+    return eth_sessions.session
+
+def get_eth_headers(block_ids, headers, api_url = None):
+    # This fetches the number, timestamp and hash of several ETH blocks in a single batched JSON-RPC request. The blocks are given by number or by tag ('latest', 'finalized').
+    # The results are added to the dictionary headers (indexed by block number, and also by tag for the tags). The blocks already in headers are not fetched again.
+
+    if api_url is None:
+        api_url = eth_api_url
+    block_ids = [block_id for block_id in dict.fromkeys(block_ids) if block_id not in headers.keys()]
+    if len(block_ids) == 0:
+        return headers
+    payload = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_getBlockByNumber', 'params': [hex(block_id) if type(block_id) == int else block_id, False]} for i, block_id in enumerate(block_ids)]
+    response = get_eth_session().post(api_url, json = payload, timeout = 30)
+    response.raise_for_status()
+    results = response.json()
+    if type(results) != list:
+        raise ValueError('Unexpected answer from the ETH node: '+str(results))
+    for result in results:
+        block = result.get('result')
+        if block is None:
+            raise ValueError('The ETH node could not return block '+str(block_ids[result['id']])+': '+str(result.get('error')))
+        header = {'number': int(block['number'], 16), 'timestamp': int(block['timestamp'], 16), 'hash': block['hash']}
+        headers[block_ids[result['id']]] = header
+        headers[header['number']] = header
+    return headers
+
+def get_eth_block_info(target_date, retry = True, api_url = None):
     # This finds the right block from the ETH blockchain and returns its hash value.
-    # The block is the first block that comes after the target_date.
-    # The algorithm starts from the current block and makes a conservative guess to jump to another block in the past. Then it uses the timestamp of the obtained block as a new current date. It repeates this until the obtained block timestamp is before the target_date. The corresponding block should be just before the target block.
-    # This works fine, but can fail if one block is missing (time interval betwen block is more than 12 seconds) close to the target block. In that case, the obtained block is to far in the past. Then, the block number is increased one-by-one until the block timestamp passed again.
-    # The search terminates if it lasts more than 10 minutes.
+    # The block is the first block that comes after the target_date (its timestamp is strictly larger).
+    # A block mined exactly at the target date is not the right one. This is intended: the previous search could return either this block or the next one, depending on the blocks it went through (see test_eth_block_info.py).
+    # The block is found with an interpolation search between a block before the target date and a block after it, starting from the latest block. The interpolated block is fetched together with its neighbour and the middle of the interval (binary search), in case that the block times are irregular (missed slots, or the slower blocks before the merge).
+    # Each step is a single batched request and the blocks already fetched are remembered, so that a search takes a few requests.
+    # The search is retried once in case of a network problem.
+    # The finalised answers are kept in the ETH cache (see eth_cache.py), so that the same date is only searched once.
+    # The dates covered by the local snapshot of the ETH headers (see eth_snapshot.py) are looked up in it, without network access.
     
-    api = 'https://eth-mainnet.public.blastapi.io'
-    w3 = Web3(Web3.HTTPProvider(api))
+    if api_url is None:
+        api_url = eth_api_url
     if target_date.tzinfo is None:
         target_date = pytz.utc.localize(target_date)
+    target_timestamp = target_date.timestamp()
+
+    in_snapshot = eth_snapshot.find_eth_block_in_snapshot(target_timestamp)
+    if in_snapshot is not None:
+        return in_snapshot[1]
 
-    start_time = get_now()
-    approx_nb_blocks = int(np.ceil((start_time-target_date).total_seconds()/(12.5)))
-    latest_block = w3.eth.get_block('latest').number
-    target_block = latest_block - approx_nb_blocks
-    block_timestamp = pytz.utc.localize(dt.datetime.utcfromtimestamp(w3.eth.get_block(target_block).timestamp))
-
-    while (block_timestamp > target_date) & (get_now() < start_time+dt.timedelta(minutes = 5)):
-        # stop if the function iterates for more than 5 minutes.
-        approx_nb_blocks = int(np.ceil((block_timestamp-target_date).total_seconds()/(12.5)))
-        target_block = target_block - approx_nb_blocks
-        block_timestamp = pytz.utc.localize(dt.datetime.utcfromtimestamp(w3.eth.get_block(target_block).timestamp))
-    target_block += 1
-    
-    if (pytz.utc.localize(dt.datetime.utcfromtimestamp(w3.eth.get_block(target_block).timestamp)) < target_date):
-        # If we overshoot, come back one block at a time. This should only happen when a block is missing close to the target time.
-        while (pytz.utc.localize(dt.datetime.utcfromtimestamp(w3.eth.get_block(target_block).timestamp)) < target_date):
-            target_block += 1
-    
-    if ((get_now() > start_time+dt.timedelta(minutes = 5)) or
-        (pytz.utc.localize(dt.datetime.utcfromtimestamp(w3.eth.get_block(target_block).timestamp)) < target_date) or
-        (pytz.utc.localize(dt.datetime.utcfromtimestamp(w3.eth.get_block(target_block-1).timestamp)) > target_date)):
-        # check that the search did not time out, that the target block is after the target date and that the block just before the target block is before the target date.
-        # If this is not the case, try once more.
+    cached = get_cached_eth_block(api_url, target_timestamp)
+    if cached is not None:
+        return cached[1]
+
+    headers = {}
+    try:
+        get_eth_headers(['latest', 'finalized'], headers, api_url)
+        latest = headers['latest']
+        if latest['timestamp'] <= target_timestamp:
+            print('There is no ETH block after '+target_date.strftime('%Y/%m/%d %H:%M:%S')+' yet.')
+            return 'error'
+
+        # The search interval: the last block known to be before (or at) the target date and the first block known to be after it.
+        before = None
+        after = latest['number']
+        # There is at most one block per slot since the target date. A few slots are missed (about 1%), so the first guesses assume 0% to 2% of missed slots.
+        nb_slots = (latest['timestamp'] - target_timestamp)/eth_slot_seconds
+        block_numbers = [max(0, after - int(nb_slots*(1 - missed_slots))) for missed_slots in [0, 0.005, 0.01, 0.02]]
+        for _ in range(64):
+            get_eth_headers([n for n in block_numbers if 0 <= n <= after], headers, api_url)
+            for n, header in headers.items():
+                if type(n) != int:
+                    continue
+                if (header['timestamp'] <= target_timestamp) and ((before is None) or (n > before)):
+                    before = n
+                if (header['timestamp'] > target_timestamp) and (n < after):
+                    after = n
+            if (after == 0) or ((before is not None) and (after == before + 1)):
+                break
+            if before is None:
+                # No block before the target date yet. Step further back.
+                step = 2*int(np.ceil((headers[after]['timestamp'] - target_timestamp)/eth_slot_seconds))
+                block_numbers = [max(0, after - step)]
+            else:
+                interpolated = before + int((target_timestamp - headers[before]['timestamp'])*(after - before)/(headers[after]['timestamp'] - headers[before]['timestamp']))
+                interpolated = min(max(interpolated, before + 1), after - 1)
+                block_numbers = [interpolated - 1, interpolated, interpolated + 1, interpolated + 2, (before + after)//2]
+        else:
+            raise ValueError('The search did not converge.')
+    except (requests.RequestException, ValueError, KeyError) as error:
         if retry:
             # Try a second time in case that it's a network problem.
-            target_block = get_eth_block_info(target_date, False)
-            if target_block is None:
-                return None
-        else:
-            print('Could not find ETH block.')
-            return 'error'
-            #sys.exit(0)
-        
-    if w3.eth.get_block('finalized').number < target_block:
+            return get_eth_block_info(target_date, False, api_url)
+        print('Could not find ETH block: '+str(error))
+        return 'error'
+
+    finalized = headers['finalized']['number'] >= after
+    if not finalized:
         # If the obtained block number is larger than the last finalised block number, then warn the user.
         print('The ETH block is not finalised yet. Wait about 15 minutes to be sure to mine effectively.')
+    cache_eth_block(api_url, target_timestamp, after, headers[after]['hash'], finalized)
         
-    return w3.eth.get_block(target_block).hash.hex()
+    return headers[after]['hash']
 
 def get_now():
     # This function constructs a datetime object for right now, UTC time zone and the seconds rounded to the closest integer.
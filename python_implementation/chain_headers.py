@@ -0,0 +1,97 @@
+# -----------------------------------------------------------
+# Table of the block headers of a story, to check the chain rules on all the blocks at once
+#
+# The headers of the blocks (mining date, difficulty, story run-time and hash) are collected in a single pass over the story, one list per field, and put in numpy arrays:
+#    - 'mining_date': the mining dates in seconds since 01/01/1970 (UTC),
+#    - 'difficulty': the difficulties,
+#    - 'story_runtime_seconds': the story run-times,
+#    - 'hash': the block hashes, one row of 32 bytes per block.
+# The rules linking each block to the previous one (mining delay, story run-time, difficulty and proof of work) are then checked with array operations over all the blocks (see check_header_rules). checks.py reads the results block by block, so that the errors are still reported for the first faulty block and with the same messages.
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import re
+import datetime as dt
+import numpy as np
+
+# The mining dates that can be converted by numpy in the same way as by strptime. The other dates are checked one by one by checks.py.
+header_date_pattern = re.compile(r'\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}')
+
+def make_block_headers():
+    # This returns empty headers, to be filled one block at a time in block order (see add_block_header): one list per field ('hash', 'mining_date', 'difficulty' and 'story_runtime_seconds').
+
+    return {'hash': [], 'mining_date': [], 'difficulty': [], 'story_runtime_seconds': []}
+
+def add_block_header(headers, block):
+    # This adds the header of the next block of the story. A missing field is added as None.
+
+    headers['hash'].append(block.get('hash'))
+    for field in ['mining_date', 'difficulty', 'story_runtime_seconds']:
+        headers[field].append(block['block_content'].get(field))
+    return headers
+
+def make_header_table(headers):
+    # This builds the table of the headers of the blocks of a story (see make_block_headers).
+    # It returns None if a header does not fit in the table (missing field, other date format, difficulty that is not an integer or hash that is not 32 bytes long).
+
+    mining_dates = []
+    hashes = bytearray()
+    try:
+        for block_hash, mining_date, difficulty, runtime in zip(headers['hash'], headers['mining_date'], headers['difficulty'], headers['story_runtime_seconds']):
+            if (type(mining_date) != str) or (header_date_pattern.fullmatch(mining_date) is None):
+                return None
+            if (type(difficulty) != int) or (type(runtime) not in [int, float]):
+                return None
+            block_hash = bytes.fromhex(block_hash)
+            if len(block_hash) != 32:
+                return None
+            mining_dates.append(mining_date.replace('/', '-').replace(' ', 'T'))
+            hashes.extend(block_hash)
+        return {'mining_date': np.array(mining_dates, dtype = 'datetime64[s]').astype(np.int64),
+                'difficulty': np.array(headers['difficulty'], dtype = np.int64),
+                'story_runtime_seconds': np.array(headers['story_runtime_seconds'], dtype = np.float64),
+                'hash': np.frombuffer(bytes(hashes), dtype = np.uint8).reshape(-1, 32)}
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return None
+
+def get_leading_zero_bits(hashes):
+    # This returns the number of leading zero bits of each hash (256 for a hash equal to zero).
+
+    bits = np.unpackbits(hashes, axis = 1)
+    return np.where(bits.any(axis = 1), bits.argmax(axis = 1), 256)
+
+def check_header_rules(table, genesis, first_block_number = 0):
+    # This checks the rules linking each block to the previous one, for all the blocks at once. The table starts with the block first_block_number (the genesis block by default).
+    # It returns a boolean array per rule, indexed by block number. The genesis block and the blocks up to first_block_number (already verified, see verification_store.py) always comply:
+    #    - 'mining_delay': the block was mined at least 'mining_delay_days' after the previous one.
+    #    - 'story_runtime': the story run-time is the one of the previous block plus the time since the genesis block.
+    #    - 'difficulty': the difficulty is set from the mining time of the block, like in get_difficulty (see checks.py).
+    #    - 'proof_of_work': the hash is not larger than 2**(256-difficulty of the previous block)-1, that is it starts with at least that many zero bits.
+    # The dates are compared in microseconds, like the datetime objects. It returns None if the genesis block does not contain the needed fields.
+
+    try:
+        microsecond = dt.timedelta(microseconds = 1)
+        mining_delay = dt.timedelta(days = genesis['mining_delay_days'])
+        intended_mining_time = dt.timedelta(days = genesis['intended_mining_time_days'])
+        grace = 0.25*intended_mining_time
+        if (type(genesis['mining_date']) != str) or (header_date_pattern.fullmatch(genesis['mining_date']) is None):
+            return None
+        genesis_mining_date = np.datetime64(genesis['mining_date'].replace('/', '-').replace(' ', 'T'), 's').astype(np.int64)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return None
+    mining_delay = mining_delay // microsecond
+    late = (mining_delay + intended_mining_time // microsecond + grace // microsecond)
+    early = (mining_delay + intended_mining_time // microsecond - grace // microsecond)
+
+    mining_dates = table['mining_date']*10**6
+    previous_dates = mining_dates[:-1]
+    dates = mining_dates[1:]
+    previous_difficulties = table['difficulty'][:-1]
+    expected_difficulties = np.where(dates > previous_dates + late, previous_difficulties - 1, np.where(dates < previous_dates + early, previous_difficulties + 1, previous_difficulties))
+    runtimes = table['story_runtime_seconds']
+    rules = {'mining_delay': dates >= previous_dates + mining_delay,
+             'story_runtime': runtimes[:-1] + (table['mining_date'][1:] - genesis_mining_date) == runtimes[1:],
+             'difficulty': expected_difficulties == table['difficulty'][1:],
+             'proof_of_work': get_leading_zero_bits(table['hash'][1:]) >= previous_difficulties}
+    return {rule: np.concatenate([np.ones(first_block_number + 1, dtype = bool), rules[rule]]) for rule in rules.keys()}
@@ -0,0 +1,277 @@
+# -----------------------------------------------------------
+# Append-only log of the blocks of a story
+#
+# A story file is rewritten in full for each new block and must be read in full to reach its last block. A chain log is a directory ([StoryTitle].chain) in which the blocks are only appended:
+#    - segment_000000.log, segment_000001.log, ...: the blocks, one record per block. A record is the length of the block (unsigned 32 bits integer, little endian) followed by the block serialised like in the story files (sorted keys, UTF-8). A new segment is started when the last one is larger than chain_log_segment_bytes.
+#    - chain.index: one record of 48 bytes per block, in block order: the segment number (unsigned 32 bits), the position of the block in the segment (unsigned 64 bits), the length of the block (unsigned 32 bits) and the block hash (32 bytes).
+#    - authors.index: the index of the authors and public keys of the story (see make_chain_index in blockchain_functions.py) and the number of blocks it covers, in json. It is updated with each appended block, so that mining.py never reads the whole log.
+# Appending a block writes one record at the end of the last segment and then one record at the end of the index. Reading a block (for example the last one) reads its index record and then the block itself, with one seek.
+# A block is only appended if its hash value matches its content, is consistent with the difficulty of the previous block and if it is linked to the previous block (see check_block in block_store.py).
+# If the writing of a block is interrupted, the block is not in the index and the end of the segment is overwritten by the next block. If authors.index is behind chain.index, the missing blocks are added to it the next time it is read.
+# The chain logs are exported to the usual story files ({'0': ..., '1': ..., ...}), byte for byte like the files written by mining.py, to be shared. check_file (see checks.py) and mine_chapter (see mining.py) read them directly.
+#
+# Use with:
+#    python chain_log.py import story_file.json [log_directory]     (creates a chain log from a story file)
+#    python chain_log.py append log_directory story_file.json       (appends the blocks of a longer story file)
+#    python chain_log.py export log_directory [story_file.json]
+#    python chain_log.py info log_directory
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import sys
+import json
+import struct
+
+import blockchain_functions
+import block_store
+from story_stream import index_story_file, read_story_block, iter_story_blocks
+
+chain_log_segment_bytes = 64*2**20
+chain_log_index_file_name = 'chain.index'
+chain_log_authors_file_name = 'authors.index'
+chain_log_length_record = struct.Struct('<I')
+chain_log_index_record = struct.Struct('<IQI32s')
+
+def is_chain_log(file_name):
+    return os.path.isdir(file_name) and os.path.isfile(os.path.join(file_name, chain_log_index_file_name))
+
+def get_segment_file_name(directory, segment):
+    return os.path.join(directory, 'segment_'+str(segment).rjust(6, '0')+'.log')
+
+class ChainLog:
+    # An open chain log. Usage:
+    #    with ChainLog(directory) as chain_log:
+    #        block = chain_log.read_block(len(chain_log)-1)
+    #        chain_log.append_block(new_block)
+
+    def __init__(self, directory, create = False):
+        self.directory = directory
+        self.segments = {}
+        self.block_format = None
+        self.chain_index = None
+        index_file_name = os.path.join(directory, chain_log_index_file_name)
+        if create:
+            os.makedirs(directory)
+            open(index_file_name, 'wb').close()
+        with open(index_file_name, 'rb') as infile:
+            self.index = bytearray(infile.read())
+        # A record that was not completely written is forgotten.
+        del self.index[len(self.index) - len(self.index) % chain_log_index_record.size:]
+
+    def __len__(self):
+        return len(self.index) // chain_log_index_record.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        for segment_file in self.segments.values():
+            segment_file.close()
+        self.segments = {}
+
+    def get_index_record(self, block_number):
+        # This returns (segment, position, length, hash) of a block.
+
+        if (block_number < 0) or (block_number >= len(self)):
+            raise KeyError(block_number)
+        return chain_log_index_record.unpack_from(self.index, block_number*chain_log_index_record.size)
+
+    def get_block_hash(self, block_number):
+        return self.get_index_record(block_number)[3].hex()
+
+    def read_block_bytes(self, block_number):
+        # This returns the serialised block.
+
+        segment, position, length, block_hash = self.get_index_record(block_number)
+        if segment not in self.segments.keys():
+            self.segments[segment] = open(get_segment_file_name(self.directory, segment), 'rb')
+        segment_file = self.segments[segment]
+        segment_file.seek(position)
+        data = segment_file.read(length)
+        if len(data) != length:
+            raise ValueError('The segment '+str(segment)+' of '+self.directory+' is truncated.')
+        return data
+
+    def read_block(self, block_number):
+        return json.loads(self.read_block_bytes(block_number).decode('utf8'))
+
+    def get_chain_index(self):
+        # This returns the index of the authors of the blocks of the log (see make_chain_index in blockchain_functions.py). It is read from authors.index and completed with the blocks that are not in it yet.
+
+        if self.chain_index is None:
+            try:
+                with open(os.path.join(self.directory, chain_log_authors_file_name), encoding='utf-8') as infile:
+                    authors_index = json.load(infile)
+                self.chain_index = authors_index['chain_index']
+                self.chain_index_blocks = authors_index['blocks']
+            except (OSError, ValueError, KeyError, TypeError):
+                self.chain_index = {'authors': {}, 'public_keys': {}}
+                self.chain_index_blocks = 1
+            if self.chain_index_blocks > len(self):
+                self.chain_index = {'authors': {}, 'public_keys': {}}
+                self.chain_index_blocks = 1
+        if self.chain_index_blocks < len(self):
+            for block_number in range(max(self.chain_index_blocks, 1), len(self)):
+                blockchain_functions.add_block_to_chain_index(self.chain_index, block_number, self.read_block(block_number)['block_content']['signed_chapter_data'])
+            self.save_chain_index()
+        return self.chain_index
+
+    def save_chain_index(self):
+        self.chain_index_blocks = len(self)
+        file_name = os.path.join(self.directory, chain_log_authors_file_name)
+        with open(file_name+'.tmp', 'w', encoding='utf-8') as outfile:
+            json.dump({'blocks': self.chain_index_blocks, 'chain_index': self.chain_index}, outfile, sort_keys = True, ensure_ascii = False)
+        os.replace(file_name+'.tmp', file_name)
+
+    def append_block(self, block):
+        # This checks a block against the last block of the log (see check_block in block_store.py) and appends it. It returns True or 'error'.
+
+        block_number = len(self)
+        chain_index = self.get_chain_index()
+        previous_block = self.read_block(block_number-1) if block_number > 0 else None
+        if block_number == 1:
+            self.block_format = blockchain_functions.get_block_format(previous_block['block_content'])
+        elif (block_number > 1) and (self.block_format is None):
+            self.block_format = blockchain_functions.get_block_format(self.read_block(0)['block_content'])
+        test = block_store.check_block(block_number, block, previous_block, self.block_format)
+        if test == 'error':
+            return 'error'
+        data = json.dumps(block, sort_keys = True, ensure_ascii = False).encode('utf8')
+
+        # The block is written after the last block of the last segment.
+        if block_number == 0:
+            segment, position = 0, 0
+        else:
+            segment, last_position, last_length, last_hash = self.get_index_record(block_number-1)
+            position = last_position + last_length
+            if position >= chain_log_segment_bytes:
+                segment, position = segment + 1, 0
+        segment_file_name = get_segment_file_name(self.directory, segment)
+        with open(segment_file_name, 'r+b' if os.path.isfile(segment_file_name) else 'wb') as outfile:
+            outfile.seek(position)
+            outfile.write(chain_log_length_record.pack(len(data)))
+            outfile.write(data)
+            outfile.truncate()
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        if segment in self.segments.keys():
+            self.segments[segment].close()
+            del self.segments[segment]
+
+        record = chain_log_index_record.pack(segment, position + chain_log_length_record.size, len(data), bytes.fromhex(block['hash']))
+        with open(os.path.join(self.directory, chain_log_index_file_name), 'r+b') as outfile:
+            outfile.seek(len(self.index))
+            outfile.write(record)
+            outfile.truncate()
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        self.index.extend(record)
+        if block_number > 0:
+            blockchain_functions.add_block_to_chain_index(chain_index, block_number, block['block_content']['signed_chapter_data'])
+        self.save_chain_index()
+        return True
+
+def get_chain_log_name(story_title):
+    return story_title.title().replace(' ','')+'.chain'
+
+def read_chain_log_tip(directory, chain_index = None):
+    # This returns the genesis block and the last block of a chain log as a story dictionary ({'0': ..., 'n': ...}), together with the index of the authors of the story (see make_chain_index in blockchain_functions.py), or 'error'.
+    # If chain_index is None, the index kept in authors.index is used. The other blocks are not read.
+
+    with ChainLog(directory) as chain_log:
+        test = blockchain_functions.check(len(chain_log) > 0, 'The chain log '+directory+' is empty.')
+        if test == 'error':
+            return 'error'
+        last_block_number = len(chain_log)-1
+        story = {'0': chain_log.read_block(0), str(last_block_number): chain_log.read_block(last_block_number)}
+        if chain_index is None:
+            chain_index = chain_log.get_chain_index()
+    return story, chain_index
+
+def append_story_file(chain_log, file_name):
+    # This appends the blocks of a story file that come after the last block of the log. The story file must contain the blocks of the log. It returns the number of appended blocks or 'error'.
+
+    index = index_story_file(file_name)
+    test = blockchain_functions.check((index is not None) and (sorted(index.keys()) == list(range(len(index)))), 'The file '+file_name+' is not a story.')
+    if test == 'error':
+        return 'error'
+    first_block_number = len(chain_log)
+    if first_block_number > 0:
+        # The blocks of the log are identified by the hash of the last one.
+        with open(file_name, 'rb') as infile:
+            test = blockchain_functions.check((len(index) >= first_block_number) and (read_story_block(infile, index, first_block_number-1)['hash'] == chain_log.get_block_hash(first_block_number-1)), 'The story in '+file_name+' does not contain the blocks of the chain log.')
+        if test == 'error':
+            return 'error'
+    for block_number, block in iter_story_blocks(file_name, index, first_block_number):
+        test = chain_log.append_block(block)
+        if test == 'error':
+            return 'error'
+    return len(index) - first_block_number
+
+def import_story_file(file_name, directory = None):
+    # This creates a chain log from a story file. The log is named after the story title (see get_chain_log_name) if directory is None. It returns the name of the log or 'error'.
+
+    if directory is None:
+        index = index_story_file(file_name)
+        test = blockchain_functions.check((index is not None) and (0 in index.keys()), 'The file '+file_name+' is not a story.')
+        if test == 'error':
+            return 'error'
+        genesis_block = next(iter_story_blocks(file_name, index))[1]
+        directory = get_chain_log_name(genesis_block['block_content']['story_title'])
+    test = blockchain_functions.check(not os.path.exists(directory), 'The chain log '+directory+' already exists. Use \'python chain_log.py append\' to add blocks to it.')
+    if test == 'error':
+        return 'error'
+    with ChainLog(directory, create = True) as chain_log:
+        nb_blocks = append_story_file(chain_log, file_name)
+    if nb_blocks == 'error':
+        return 'error'
+    return directory
+
+def export_chain_log(directory, file_name = None):
+    # This writes the story of a chain log to a story file, like save_mined_story (see mining.py), one block at a time. The file is named like in mining.py if file_name is None.
+
+    with ChainLog(directory) as chain_log:
+        last_block_number = len(chain_log)-1
+        if file_name is None:
+            genesis = chain_log.read_block(0)['block_content']
+            mining_date = chain_log.read_block(last_block_number)['block_content']['mining_date']
+            file_name = genesis['story_title'].title().replace(' ','')+'_'+str(last_block_number).rjust(3, '0')+'_'+mining_date.replace(' ','_').replace(':','_').replace('/','_')+'.json'
+        return blockchain_functions.write_story_file(file_name, last_block_number, chain_log.read_block_bytes)
+
+def print_chain_log_info(directory):
+    with ChainLog(directory) as chain_log:
+        if len(chain_log) == 0:
+            print(directory+' is empty.')
+            return
+        genesis = chain_log.read_block(0)['block_content']
+        last_block = chain_log.read_block(len(chain_log)-1)
+        nb_segments = chain_log.get_index_record(len(chain_log)-1)[0] + 1
+    print(directory+': '+genesis['story_title']+', '+str(len(chain_log))+' block(s) in '+str(nb_segments)+' segment(s).')
+    print('Last block: '+last_block['hash']+', mined on '+last_block['block_content']['mining_date']+' by '+str(last_block['block_content'].get('miner_name'))+'.')
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    if (len(sys.argv) in [3, 4]) and (sys.argv[1] == 'import'):
+        directory = import_story_file(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        if directory != 'error':
+            print('The story was imported in '+directory+'.')
+    elif (len(sys.argv) == 4) and (sys.argv[1] == 'append'):
+        with ChainLog(sys.argv[2]) as chain_log:
+            nb_blocks = append_story_file(chain_log, sys.argv[3])
+        if nb_blocks != 'error':
+            print(str(nb_blocks)+' block(s) appended to '+sys.argv[2]+'.')
+    elif (len(sys.argv) in [3, 4]) and (sys.argv[1] == 'export'):
+        print('The story was exported to '+export_chain_log(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)+'.')
+    elif (len(sys.argv) == 3) and (sys.argv[1] == 'info'):
+        print_chain_log_info(sys.argv[2])
+    else:
+        print('Usage: python chain_log.py import story_file.json [log_directory]')
+        print('       python chain_log.py append log_directory story_file.json')
+        print('       python chain_log.py export log_directory [story_file.json]')
+        print('       python chain_log.py info log_directory')
@@ -17,6 +17,7 @@ import json
 import rsa
 import sys
 from blockchain_functions import *
+import workspace
 
 def write_keys_to_file(public_key, private_key, author_name, keys_file_name):
     
@@ -56,12 +57,8 @@ def sign_chapter(file_name):
     if test == 'error':
         return 'error'
 
-    # get all json files
-    json_files = glob.glob('*.json')
-    # keep only the key files
-    json_files = [f for f in json_files if set(['public_key', 'private_key', 'author']) == set(import_json(f, False).keys())]
-    # get the file with the right author
-    json_files = [f for f in json_files if import_json(f, False)['author'] == chapter_data['author']]
+    # get the key files with the right author (see workspace.py)
+    json_files = workspace.find_workspace_files('keys', author = chapter_data['author'])
     if len(json_files) == 0:
         print('No key file was found. A new private-public key set was generated and saved to the working folder.')
         # Generate public and private keys
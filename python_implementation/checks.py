@@ -10,11 +10,26 @@ import json
 #import io
 import datetime as dt
 import sys
+import os
 #from web3 import Web3, AsyncWeb3
 import pytz
 import numpy as np
 #import glob
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from blockchain_functions import *
+from verification_store import *
+from story_stream import index_story_file, StoryFileReader
+from chain_headers import make_block_headers, add_block_header, make_header_table, check_header_rules
+import chain_log
+
+# Maximal number of ETH lookups running at the same time when a story is checked.
+eth_lookup_workers = 8
+# Number of processes checking the hash values and the signatures of the blocks of a story (see start_block_verification).
+verification_workers = os.cpu_count()
+# The stories with fewer blocks are checked in a single process, starting the processes would take longer.
+min_parallel_blocks = 16
+# The story files of this size or larger are checked one block at a time (see check_story_stream).
+stream_threshold_bytes = 64*2**20
         
 def get_difficulty(genesis, block, previous_block):
 
@@ -30,7 +45,368 @@ def get_difficulty(genesis, block, previous_block):
         return previous_block['difficulty'] + 1
     return previous_block['difficulty']
 
-def check_file(file_name):
+def get_earliest_mining_date(genesis, previous_mining_date):
+    # The ETH block of a block is the first one after this date.
+
+    return pytz.utc.localize(dt.datetime.strptime(previous_mining_date, '%Y/%m/%d %H:%M:%S')) + dt.timedelta(days = genesis['mining_delay_days'])
+
+def start_eth_lookups(mining_dates, genesis, first_block_number, executor):
+    # This starts the ETH lookups of the blocks first_block_number to the last one in the background, so that they overlap with each other and with the other checks. It returns the lookups (futures) indexed by block number.
+    # mining_dates are the mining dates of the blocks from first_block_number-1 to the last one. The blocks whose date can not be read are left out, their check fails in check_new_block.
+
+    lookups = {}
+    dates = {}
+    for block_number in range(first_block_number, first_block_number - 1 + len(mining_dates)):
+        try:
+            earliest_mining_date = get_earliest_mining_date(genesis, mining_dates[block_number - first_block_number])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if earliest_mining_date not in dates.keys():
+            dates[earliest_mining_date] = executor.submit(get_eth_block_info, earliest_mining_date)
+        lookups[block_number] = dates[earliest_mining_date]
+    return lookups
+
+def verify_blocks(blocks, block_format):
+    # This performs the checks of some blocks that do not depend on the other blocks: the hash value, the hash value against the difficulty of the previous block and the signature. It runs in the verification processes (see start_block_verification).
+    # blocks is a list of (block number, block, difficulty of the previous block, whether to check the signature). It returns the results indexed by block number.
+    # A check that can not be performed (malformed block) is left to None. check_file then performs it again in order and reports the error.
+
+    results = {}
+    for block_number, block, previous_difficulty, with_signature in blocks:
+        result = {'hash': None, 'max_hash': None, 'signature': None}
+        try:
+            result['hash'] = check_hash(block['hash'], block['block_content'], block_format)
+        except:
+            pass
+        try:
+            result['max_hash'] = int.from_bytes(bytes.fromhex(block['hash']),'big') <= 2**(256-previous_difficulty)-1
+        except:
+            pass
+        if with_signature:
+            try:
+                signed_chapter_data = block['block_content']['signed_chapter_data']
+                result['signature'] = (get_signature_key(signed_chapter_data), check_chapter_signature(signed_chapter_data))
+            except:
+                pass
+        results[block_number] = result
+    return results
+
+def start_block_verification(data, block_format, first_signature_block, executor, workers):
+    # This sends the blocks of the story in chunks to the verification processes (see verify_blocks). The signatures are only checked from first_signature_block onward and if they are not in the signature cache.
+    # It returns the chunks (futures).
+
+    blocks = []
+    for block_number in range(1, len(data)):
+        block = data[str(block_number)]
+        try:
+            previous_difficulty = data[str(block_number-1)]['block_content']['difficulty']
+        except (KeyError, TypeError):
+            previous_difficulty = None
+        with_signature = False
+        if block_number >= first_signature_block:
+            try:
+                with_signature = get_cached_signature(get_signature_key(block['block_content']['signed_chapter_data'])) is None
+            except (KeyError, TypeError, ValueError):
+                pass
+        blocks.append((block_number, block, previous_difficulty, with_signature))
+    chunk_size = max(1, -(-len(blocks)//(4*workers)))
+    return [executor.submit(verify_blocks, blocks[i:i+chunk_size], block_format) for i in range(0, len(blocks), chunk_size)]
+
+def get_block_verification(chunks):
+    # This collects the results of the verification processes and records the new signature checks in the signature cache. The results of a failed chunk are left out, its blocks are then checked in order by check_file.
+
+    results = {}
+    for chunk in chunks:
+        try:
+            results.update(chunk.result())
+        except Exception:
+            pass
+    cache_signatures({result['signature'][0]: result['signature'][1] for result in results.values() if result['signature'] is not None})
+    return results
+
+def check_new_block(data, block_number, genesis, eth_lookup = None, chain_index = None, header_rules = None):
+    # This performs the checks of a block of a full story that need more than its hash: mining date, ETH block, story run-time, difficulty, signature and chapter data.
+    # If provided, eth_lookup is the ETH lookup of the block already started in the background (see start_eth_lookups) and chain_index is the index of the authors of the story (see make_chain_index).
+    # If provided, header_rules are the results of the rules checked on all the blocks at once (see check_header_rules). The mining date, story run-time and difficulty are then not checked again.
+
+    block = data[str(block_number)]['block_content']
+    previous_block = data[str(block_number-1)]['block_content']
+
+    if header_rules is not None:
+        mining_delay_ok = header_rules['mining_delay'][block_number]
+    else:
+        mining_delay_ok = get_earliest_mining_date(genesis, previous_block['mining_date']) <= pytz.utc.localize(dt.datetime.strptime(block['mining_date'], '%Y/%m/%d %H:%M:%S'))
+    test = check(mining_delay_ok, 'The mining date of block '+str(block_number)+' is not consistent with the set mining delay.')
+    if test == 'error':
+        return 'error'
+
+    if eth_lookup is not None:
+        hash_eth = eth_lookup.result()
+    else:
+        hash_eth = get_eth_block_info(get_earliest_mining_date(genesis, previous_block['mining_date']))
+    test = check(hash_eth == block['hash_eth'], 'The \'hash_eth\' field of block '+str(block_number)+' does not match the right ETH block.')
+    if test == 'error':
+        return 'error'
+
+    if header_rules is not None:
+        story_runtime_ok = header_rules['story_runtime'][block_number]
+    else:
+        story_runtime_ok = previous_block['story_runtime_seconds'] + round((pytz.utc.localize(dt.datetime.strptime(block['mining_date'], '%Y/%m/%d %H:%M:%S'))-pytz.utc.localize(dt.datetime.strptime(genesis['mining_date'], '%Y/%m/%d %H:%M:%S'))).total_seconds()) == block['story_runtime_seconds']
+    test = check(story_runtime_ok, 'The story run-time of block '+str(block_number)+' is not calculated correctly.')
+    if test == 'error':
+        return 'error'
+
+    if header_rules is not None:
+        difficulty_ok = header_rules['difficulty'][block_number]
+    else:
+        difficulty_ok = get_difficulty(genesis, block, previous_block) == block['difficulty']
+    test = check(difficulty_ok, 'The difficulty of block '+str(block_number)+' was not calculated correctly.')
+    if test == 'error':
+        return 'error'
+
+    block = block['signed_chapter_data']
+
+    test = check(validate_chapter_data(block, data, chain_index), 'The signed chapter data of block '+str(block_number)+' does not comply with the rules of this story.')
+    if test == 'error':
+        return 'error'
+
+    block = block['chapter_data']
+
+    test = check(block['story_title'] == genesis['story_title'], 'The chapter title of block '+str(block_number)+' does not match the title in the genesis block.')
+    if test == 'error':
+        return 'error'
+
+    test = check(block['chapter_number'] == block_number, 'The chapter number of block '+str(block_number)+' is not '+str(block_number)+'.')
+    if test == 'error':
+        return 'error'
+
+    return True
+
+def get_header_rules(headers, genesis, first_block_number = 0):
+    # This checks the rules linking the blocks on all the blocks at once (see chain_headers.py). The headers start with the block first_block_number. It returns None if the headers do not fit in the table, the blocks are then checked one by one.
+
+    header_table = make_header_table(headers)
+    if header_table is None:
+        return None
+    return check_header_rules(header_table, genesis, first_block_number)
+
+def get_block_results(block_number, verification, header_rules):
+    # This returns the results of the checks of a block already performed by the verification processes (see verify_blocks) and on all the headers (see check_header_rules).
+
+    verified = dict(verification.get(block_number, {'hash': None, 'max_hash': None}))
+    if header_rules is not None:
+        verified['max_hash'] = header_rules['proof_of_work'][block_number]
+    return verified
+
+def check_story_genesis(genesis_block):
+    # This checks the genesis block of a full story. It returns the block format of the story or 'error'.
+
+    test = check(check_hash(genesis_block['hash'], genesis_block['block_content']), 'The hash value of the genesis block does not match its data.')
+    if test == 'error':
+        return 'error'
+    genesis = genesis_block['block_content']
+    test = check(genesis['chapter_number'] == 0, 'The chapter number is not zero in the genesis block.')
+    if test == 'error':
+        return 'error'
+    test = check(genesis['story_runtime_seconds'] == 0.0, 'The story run-time is not zero in the genesis block.')
+    if test == 'error':
+        return 'error'
+    block_format = get_block_format(genesis)
+    test = check(block_format in [1, 2], 'The \'block_format\' field of the genesis block must be 1 or 2.')
+    if test == 'error':
+        return 'error'
+    return block_format
+
+def check_block_hash_and_link(block_number, block, previous_block, block_format, verified = None):
+    # This checks the hash value of a block of a full story, its consistency with the difficulty of the previous block and the link to the previous block.
+    # verified contains the results of verify_blocks for the block, if they are available.
+
+    if verified is None:
+        verified = {'hash': None, 'max_hash': None}
+
+    hash_ok = verified['hash']
+    if hash_ok is None:
+        hash_ok = check_hash(block['hash'], block['block_content'], block_format)
+    test = check(hash_ok, 'The hash value of block '+str(block_number)+' does not match its data.')
+    if test == 'error':
+        return 'error'
+
+    max_hash_ok = verified['max_hash']
+    if max_hash_ok is None:
+        max_hash = 2**(256-previous_block['block_content']['difficulty'])-1
+        max_hash_ok = int.from_bytes(bytes.fromhex(block['hash']),'big') <= max_hash
+    test = check(max_hash_ok, 'The hash value of block '+str(block_number)+' is not consistent with the difficulty setting.')
+    if test == 'error':
+        return 'error'
+
+    test = check(block['block_content']['hash_previous_block'] == previous_block['hash'], 'The hash of block '+str(block_number-1)+' does not match the \'hash_previous_block\' field of block '+str(block_number)+'.')
+    if test == 'error':
+        return 'error'
+
+    return True
+
+def get_readable_chapter(chapter_data):
+    # This returns the lines of a chapter in the readable form of the story.
+
+    lines = [(k.replace('_',' ')+':').title() + ' ' + str(chapter_data[k])+'\n\n' for k in chapter_data.keys() if (k!='text') and (k!='story_title')]
+    lines.append('\n' + chapter_data['text'] + '\n\n\n\n\n\n')
+    return lines
+
+def get_readable_story_file_name(genesis, block_number):
+    # This returns the name of the *.txt file with the readable form of the story.
+
+    return genesis['story_title'].title().replace(' ','') + '_' + str(block_number).rjust(3, '0') +'.txt'
+
+def print_story_summary(verified_blocks):
+    # This prints the checks performed on a full story.
+
+    if verified_blocks == 1:
+        print('Block 1 was already verified (see '+verification_store_directory+'). Only its hash value and link were checked again.')
+    elif verified_blocks > 1:
+        print('Blocks 1 to '+str(verified_blocks)+' were already verified (see '+verification_store_directory+'). Only their hash values and links were checked again.')
+    print('Each block of the provided story has:')
+    print('    - consistent hash values.')
+    print('    - consistent chapter numbering.')
+    print('    - consistent \'story_runtime_seconds\' fields.')
+    print('    - the hash value of the right ETH block.')
+    print('    - a \'signed_chapter_data\' field with a consistent digital signature.')
+    print('    - a \'chapter_data\' that is consistent with the genesis bock.')
+    print()
+    print('The blocks are correctly linked to each other:')
+    print('    - Each block correctly references the hash of the previous block.')
+    print('    - All the reported \'mining_date\' fields are consistent.')
+    print('    - All the reported \'difficulty\' fields are set correctly.')
+    print('    - Each block hash value conform to the difficulty set by the previous block.')
+    print('    - A single and consistent public key is assocaited to each author.')
+
+def print_genesis_summary():
+    # This prints the checks performed on a story that only contains its genesis block.
+
+    print('The provided genesis block has:')
+    print('    - a consistent hash value.')
+    print('    - consistent chapter numbering.')
+    print('    - consistent \'story_runtime_seconds\' fields.')
+
+def check_story_stream(file_name, full = False, index = None):
+    # This checks a full story like check_file, but reads its blocks one at a time (see story_stream.py), so that the memory used does not grow with the size of the chapters.
+    # A first pass over the file collects the hash values and mining dates of the blocks to check and indexes the authors (see make_chain_index). The second pass checks the blocks in order, with only the block and the previous one in memory, and writes the readable story directly to the *.txt file.
+    # If the last verified block (see verification_store.py) is a recorded tip, the first pass starts from it.
+    # index is the position of the blocks in the file (see index_story_file), if already known. The chain logs (see chain_log.py) are read in the same way.
+
+    try:
+        if chain_log.is_chain_log(file_name):
+            story = chain_log.ChainLog(file_name)
+            if len(story) == 0:
+                story.close()
+                print('The submitted chain log is empty.')
+                return 'error'
+        else:
+            if index is None:
+                index = index_story_file(file_name)
+            if (index is None) or (len(index) == 0):
+                print('The submitted file is not a story.')
+                return 'error'
+
+            test = check(0 in index.keys(), 'The genesis block is absent from the submitted story.')
+            if test == 'error':
+                return 'error'
+            test = check(sorted(index.keys()) == list(range(len(index))), 'At least one block is missing from the submitted story.')
+            if test == 'error':
+                return 'error'
+            story = StoryFileReader(file_name, index)
+
+        with story:
+            # genesis block
+            genesis_block = story.read_block(0)
+            block_format = check_story_genesis(genesis_block)
+            if block_format == 'error':
+                return 'error'
+            genesis = genesis_block['block_content']
+            last_block_number = len(story) - 1
+            if last_block_number == 0:
+                print_genesis_summary()
+                return 'check_genesis'
+
+            verified_blocks, chain_index = 0, None
+            if not full:
+                verified_blocks, chain_index = get_verified_prefix(genesis_block['hash'], last_block_number, story.get_block_hash)
+
+            # First pass: headers of the blocks from the last verified one and authors of the blocks that are not in the recorded index.
+            if chain_index is None:
+                chain_index = {'authors': {}, 'public_keys': {}}
+                first_indexed_block_number = 1
+            else:
+                first_indexed_block_number = verified_blocks + 1
+            headers = make_block_headers()
+            for block_number in range(min(verified_blocks, first_indexed_block_number), last_block_number + 1):
+                block = story.read_block(block_number)
+                if block_number >= verified_blocks:
+                    add_block_header(headers, block)
+                if block_number >= first_indexed_block_number:
+                    add_block_to_chain_index(chain_index, block_number, block['block_content']['signed_chapter_data'])
+            header_rules = get_header_rules(headers, genesis, verified_blocks)
+
+            # Second pass: the checks, in order.
+            output_file = get_readable_story_file_name(genesis, last_block_number)
+            states = {}
+            executor = ThreadPoolExecutor(max_workers = eth_lookup_workers)
+            outfile = open(output_file+'.tmp', "w")
+            complete = False
+            try:
+                eth_lookups = start_eth_lookups(headers['mining_date'], genesis, verified_blocks + 1, executor)
+                outfile.write('Story title: '+genesis['story_title']+'\n\n\n\n\n\n')
+                previous_block = genesis_block
+                for block_number in range(1, last_block_number + 1):
+                    block = story.read_block(block_number)
+
+                    test = check_block_hash_and_link(block_number, block, previous_block, block_format, get_block_results(block_number, {}, header_rules))
+                    if test == 'error':
+                        return 'error'
+
+                    if block_number > verified_blocks:
+                        test = check_new_block({'0': genesis_block, str(block_number-1): previous_block, str(block_number): block}, block_number, genesis, eth_lookups.get(block_number), chain_index, header_rules)
+                        if test == 'error':
+                            return 'error'
+                        states[block['hash']] = get_chain_state(block_number, block['block_content'])
+
+                    outfile.writelines(get_readable_chapter(block['block_content']['signed_chapter_data']['chapter_data']))
+                    previous_block = block
+
+                if genesis['number_of_chapters'] == last_block_number:
+                    outfile.write('\n\nThe end.')
+                complete = True
+            finally:
+                executor.shutdown(wait = False, cancel_futures = True)
+                outfile.close()
+                if complete:
+                    os.replace(output_file+'.tmp', output_file)
+                else:
+                    os.remove(output_file+'.tmp')
+
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        print('Something is wrong with '+file_name+'.')
+        return 'error'
+
+    if len(states) > 0:
+        record_chain_states(genesis_block['hash'], states, previous_block['hash'], chain_index)
+    print_story_summary(verified_blocks)
+    print()
+    print('The full story up until now was saved in an easily readable form in the working directory in '+output_file+'.')
+
+    return output_file
+
+def check_file(file_name, full = False, workers = None, stream = None):
+    # The blocks of a full story that were already fully verified (see verification_store.py) only get their hash values and links checked again, unless full is True.
+    # The hash values and the signatures of the blocks of a long story are checked beforehand by 'workers' processes (verification_workers by default). The blocks are then checked in order with these results.
+    # The stories are checked one block at a time (see check_story_stream) if stream is True or, by default, if the file is larger than stream_threshold_bytes. The chain logs (see chain_log.py) are always checked one block at a time.
+
+    if chain_log.is_chain_log(file_name):
+        return check_story_stream(file_name, full)
+    if (stream != False) and (file_name[-5:].lower() == '.json') and os.path.isfile(file_name):
+        if (stream == True) or (os.path.getsize(file_name) >= stream_threshold_bytes):
+            index = index_story_file(file_name)
+            if (index is not None) and (len(index) > 0):
+                return check_story_stream(file_name, full, index)
 
     data = import_json(file_name)
     if data == 'error':
@@ -72,7 +448,14 @@ def check_file(file_name):
 
     elif set(['block_content', 'hash']) == set(data.keys()):
         # isolated validated block
-        test = check(check_hash(data['hash'], data['block_content']), 'The hash value of the provided block does not match its data.')
+        block_format = 1
+        if 'signed_chapter_data' in data['block_content'].keys():
+            # The hash of a normal block depends on the block format declared in the genesis block.
+            genesis = get_genesis_block(data['block_content']['signed_chapter_data']['chapter_data']['story_title'])
+            if genesis == 'error':
+                return 'error'
+            block_format = get_block_format(genesis)
+        test = check(check_hash(data['hash'], data['block_content'], block_format), 'The hash value of the provided block does not match its data.')
         if test == 'error':
             return 'error'
 
@@ -89,9 +472,6 @@ def check_file(file_name):
 
         elif 'signed_chapter_data' in data.keys():
             # normal block
-            genesis = get_genesis_block(data['signed_chapter_data']['chapter_data']['story_title'])
-            if genesis == 'error':
-                return 'error'
             test = check(validate_chapter_data(data['signed_chapter_data'], {'0':{'block_content':genesis}}), 'The signed chapter data does not comply with the rules of this story.')
             if test == 'error':
                 return 'error'
@@ -118,99 +498,70 @@ def check_file(file_name):
             return 'error'
 
         # genesis block
-        genesis = data['0']
-        test = check(check_hash(genesis['hash'], genesis['block_content']), 'The hash value of the genesis block does not match its data.')
-        if test == 'error':
-            return 'error'
-        genesis = genesis['block_content']
-        test = check(genesis['chapter_number'] == 0, 'The chapter number is not zero in the genesis block.')
-        if test == 'error':
+        block_format = check_story_genesis(data['0'])
+        if block_format == 'error':
             return 'error'
-        test = check(genesis['story_runtime_seconds'] == 0.0, 'The story run-time is not zero in the genesis block.')
-        if test == 'error':
-            return 'error'
-
-        to_write = ['Story title: '+genesis['story_title']+'\n\n\n\n\n\n']
-        block_number = 0
-        for block_number in range(1,len(data)):
-            # Chapter blocks
-
-            block = data[str(block_number)]
-            previous_block = data[str(block_number-1)]
+        genesis = data['0']['block_content']
 
-            test = check(check_hash(block['hash'], block['block_content']), 'The hash value of block '+str(block_number)+' does not match its data.')
-            if test == 'error':
-                return 'error'
-
-            max_hash = 2**(256-previous_block['block_content']['difficulty'])-1
-            test = check(int.from_bytes(bytes.fromhex(block['hash']),'big') <= max_hash, 'The hash value of block '+str(block_number)+' is not consistent with the difficulty setting.')
-            if test == 'error':
-                return 'error'
+        verified_blocks, chain_index = 0, None
+        if not full:
+            verified_blocks, chain_index = get_verified_prefix(data['0']['hash'], len(data)-1, lambda block_number: data[str(block_number)].get('hash'))
 
-            test = check(block['block_content']['hash_previous_block'] == previous_block['hash'], 'The hash of block '+str(block_number-1)+' does not match the \'hash_previous_block\' field of block '+str(block_number)+'.')
-            if test == 'error':
-                return 'error'
-
-            block = block['block_content']
-            previous_block = previous_block['block_content']
-
-            earliest_mining_date = pytz.utc.localize(dt.datetime.strptime(previous_block['mining_date'], '%Y/%m/%d %H:%M:%S')) + dt.timedelta(days = genesis['mining_delay_days'])
-            test = check(earliest_mining_date <= pytz.utc.localize(dt.datetime.strptime(block['mining_date'], '%Y/%m/%d %H:%M:%S')), 'The mining date of block '+str(block_number)+' is not consistent with the set mining delay.')
-            if test == 'error':
-                return 'error'
-
-            test = check(get_eth_block_info(earliest_mining_date) == block['hash_eth'], 'The \'hash_eth\' field of block '+str(block_number)+' does not match the right ETH block.')
-            if test == 'error':
-                return 'error'
-
-            test = check(previous_block['story_runtime_seconds'] + round((pytz.utc.localize(dt.datetime.strptime(block['mining_date'], '%Y/%m/%d %H:%M:%S'))-pytz.utc.localize(dt.datetime.strptime(genesis['mining_date'], '%Y/%m/%d %H:%M:%S'))).total_seconds()) == block['story_runtime_seconds'], 'The story run-time of block '+str(block_number)+' is not calculated correctly.')
-            if test == 'error':
-                return 'error'
-
-            test = check(get_difficulty(genesis, block, previous_block) == block['difficulty'], 'The difficulty of block '+str(block_number)+' was not calculated correctly.')
-            if test == 'error':
-                return 'error'
-
-            block = block['signed_chapter_data']
-
-            test = check(validate_chapter_data(block, data), 'The signed chapter data of block '+str(block_number)+' does not comply with the rules of this story.')
-            if test == 'error':
-                return 'error'
-
-            block = block['chapter_data']
-
-            test = check(block['story_title'] == genesis['story_title'], 'The chapter title of block '+str(block_number)+' does not match the title in the genesis block.')
-            if test == 'error':
-                return 'error'
-
-            test = check(block['chapter_number'] == block_number, 'The chapter number of block '+str(block_number)+' is not '+str(block_number)+'.')
-            if test == 'error':
-                return 'error'
+        # The authors of the story are indexed once for the checks of all the blocks (starting from the recorded index of the last verified block, if any), and the rules linking the blocks are checked on the headers of the blocks to check at once.
+        if chain_index is None:
+            chain_index = make_chain_index(data)
+        else:
+            for block_number in range(verified_blocks + 1, len(data)):
+                add_block_to_chain_index(chain_index, block_number, data[str(block_number)]['block_content']['signed_chapter_data'])
+        headers = make_block_headers()
+        for block_number in range(verified_blocks, len(data)):
+            add_block_header(headers, data[str(block_number)])
+        header_rules = get_header_rules(headers, genesis, verified_blocks)
 
-            to_write = to_write + ([(k.replace('_',' ')+':').title() + ' ' + str(block[k])+'\n\n' for k in block.keys() if (k!='text') and (k!='story_title')])
-            to_write.append('\n' + block['text'] + '\n\n\n\n\n\n')
+        to_write = ['Story title: '+genesis['story_title']+'\n\n\n\n\n\n']
+        if workers is None:
+            workers = verification_workers
+        # The independent checks of the blocks are sent to the verification processes first (before any thread is started, the processes are forked).
+        verification_executor = None
+        verification_chunks = []
+        if (workers > 1) and (len(data) - 1 >= min_parallel_blocks):
+            verification_executor = ProcessPoolExecutor(max_workers = workers)
+        # The ETH lookups of the blocks to check all start now and run in the background while the blocks are checked in order.
+        executor = ThreadPoolExecutor(max_workers = eth_lookup_workers)
+        try:
+            if verification_executor is not None:
+                verification_chunks = start_block_verification(data, block_format, verified_blocks + 1, verification_executor, workers)
+            eth_lookups = start_eth_lookups(headers['mining_date'], genesis, verified_blocks + 1, executor)
+            verification = get_block_verification(verification_chunks)
+            block_number = 0
+            for block_number in range(1,len(data)):
+                # Chapter blocks
+
+                test = check_block_hash_and_link(block_number, data[str(block_number)], data[str(block_number-1)], block_format, get_block_results(block_number, verification, header_rules))
+                if test == 'error':
+                    return 'error'
+
+                if block_number > verified_blocks:
+                    test = check_new_block(data, block_number, genesis, eth_lookups.get(block_number), chain_index, header_rules)
+                    if test == 'error':
+                        return 'error'
+
+                to_write.extend(get_readable_chapter(data[str(block_number)]['block_content']['signed_chapter_data']['chapter_data']))
+        finally:
+            executor.shutdown(wait = False, cancel_futures = True)
+            if verification_executor is not None:
+                verification_executor.shutdown(cancel_futures = True)
 
         if block_number > 0:
 
-            print('Each block of the provided story has:')
-            print('    - consistent hash values.')
-            print('    - consistent chapter numbering.')
-            print('    - consistent \'story_runtime_seconds\' fields.')
-            print('    - the hash value of the right ETH block.')
-            print('    - a \'signed_chapter_data\' field with a consistent digital signature.')
-            print('    - a \'chapter_data\' that is consistent with the genesis bock.')
-            print()
-            print('The blocks are correctly linked to each other:')
-            print('    - Each block correctly references the hash of the previous block.')
-            print('    - All the reported \'mining_date\' fields are consistent.')
-            print('    - All the reported \'difficulty\' fields are set correctly.')
-            print('    - Each block hash value conform to the difficulty set by the previous block.')
-            print('    - A single and consistent public key is assocaited to each author.')
+            if verified_blocks < block_number:
+                record_verified_blocks(data, verified_blocks + 1, chain_index)
+            print_story_summary(verified_blocks)
 
             if genesis['number_of_chapters'] == block_number:
                 to_write.append('\n\nThe end.')
 
-            output_file = genesis['story_title'].title().replace(' ','') + '_' + str(block_number).rjust(3, '0') +'.txt'
+            output_file = get_readable_story_file_name(genesis, block_number)
             with open(output_file, "w") as outfile:
                 outfile.writelines(to_write)
             print()
@@ -219,10 +570,7 @@ def check_file(file_name):
             return output_file
 
         else:
-            print('The provided genesis block has:')
-            print('    - a consistent hash value.')
-            print('    - consistent chapter numbering.')
-            print('    - consistent \'story_runtime_seconds\' fields.')
+            print_genesis_summary()
             
             return 'check_genesis'
 
@@ -234,6 +582,16 @@ def check_file(file_name):
 ################################# The program starts here ################################################
 
 if __name__ == "__main__":
+    full = pop_flag(sys.argv, '--full')
+    stream = pop_flag(sys.argv, '--stream')
+    workers = pop_option(sys.argv, '--workers')
+    if workers == 'error':
+        sys.exit()
+    if (workers is not None) and ((not workers.isdigit()) or (int(workers) == 0)):
+        print('The number of workers must be a positive integer.')
+        sys.exit()
+    if workers is not None:
+        workers = int(workers)
     file_name = sys.argv[1]
-    status = check_file(file_name)
+    status = check_file(file_name, full, workers, stream or None)
     print(status)
\ No newline at end of file
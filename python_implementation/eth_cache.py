@@ -0,0 +1,91 @@
+# -----------------------------------------------------------
+# Persistent cache of the ETH block lookups
+#
+# The ETH block of a given date (see get_eth_block_info) never changes once it is finalised. The finalised answers are kept in a SQLite database (eth_blocks.cache in the working directory), so that mining.py, checks.py and gui.py do not ask the ETH node again for the same date.
+# The answers are stored for each ETH node (its URL), so that a test node (see eth_test_server.py) does not mix its blocks with the real ones.
+# SQLite handles the locking, so that several scripts can use the cache at the same time.
+#
+# Inspect or clear the cache with:
+#    python eth_cache.py show
+#    python eth_cache.py clear
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import sys
+import sqlite3
+import datetime as dt
+import pytz
+
+eth_cache_file_name = 'eth_blocks.cache'
+
+def connect_eth_cache():
+    # This opens the cache and creates its table if needed.
+
+    connection = sqlite3.connect(eth_cache_file_name, timeout = 30)
+    connection.execute('CREATE TABLE IF NOT EXISTS eth_blocks (node TEXT NOT NULL, target_timestamp REAL NOT NULL, block_number INTEGER NOT NULL, block_hash TEXT NOT NULL, finalized INTEGER NOT NULL, PRIMARY KEY (node, target_timestamp))')
+    return connection
+
+def get_cached_eth_block(node, target_timestamp):
+    # This returns the cached (block number, block hash) of the first ETH block after the target timestamp or None.
+
+    if not os.path.isfile(eth_cache_file_name):
+        return None
+    try:
+        connection = connect_eth_cache()
+        try:
+            return connection.execute('SELECT block_number, block_hash FROM eth_blocks WHERE node = ? AND target_timestamp = ? AND finalized = 1', (node, target_timestamp)).fetchone()
+        finally:
+            connection.close()
+    except sqlite3.Error as error:
+        print('The ETH cache '+eth_cache_file_name+' could not be read: '+str(error))
+        return None
+
+def cache_eth_block(node, target_timestamp, block_number, block_hash, finalized):
+    # This records the answer of a lookup. Only the finalised blocks are recorded, the others could still change.
+
+    if not finalized:
+        return
+    try:
+        connection = connect_eth_cache()
+        try:
+            with connection:
+                connection.execute('INSERT OR REPLACE INTO eth_blocks VALUES (?, ?, ?, ?, 1)', (node, target_timestamp, block_number, block_hash))
+        finally:
+            connection.close()
+    except sqlite3.Error as error:
+        print('The ETH cache '+eth_cache_file_name+' could not be updated: '+str(error))
+
+def show_eth_cache():
+    # This prints the content of the cache.
+
+    if not os.path.isfile(eth_cache_file_name):
+        print('The ETH cache is empty.')
+        return
+    connection = connect_eth_cache()
+    try:
+        rows = connection.execute('SELECT node, target_timestamp, block_number, block_hash FROM eth_blocks ORDER BY node, target_timestamp').fetchall()
+    finally:
+        connection.close()
+    print(str(len(rows))+' ETH block(s) in '+eth_cache_file_name+':')
+    for node, target_timestamp, block_number, block_hash in rows:
+        target_date = dt.datetime.fromtimestamp(target_timestamp, pytz.UTC).strftime('%Y/%m/%d %H:%M:%S')
+        print('    '+target_date+' -> block '+str(block_number)+' '+block_hash+' ('+node+')')
+
+def clear_eth_cache():
+    # This forgets all the cached lookups.
+
+    if os.path.isfile(eth_cache_file_name):
+        os.remove(eth_cache_file_name)
+    print('The ETH cache is cleared.')
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    if (len(sys.argv) == 2) and (sys.argv[1] == 'show'):
+        show_eth_cache()
+    elif (len(sys.argv) == 2) and (sys.argv[1] == 'clear'):
+        clear_eth_cache()
+    else:
+        print('Usage: python eth_cache.py show|clear')
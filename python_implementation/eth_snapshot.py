@@ -0,0 +1,266 @@
+# -----------------------------------------------------------
+# Local snapshot of the ETH block headers, for the lookups without network access
+#
+# The snapshot is a binary file (eth_headers.snapshot in the working directory, or the file given by the environment variable ETH_SNAPSHOT_FILE) with one record of 48 bytes per ETH block, in increasing block number order and without gaps:
+#    - the block number (unsigned 64 bits integer, little endian),
+#    - the block timestamp (unsigned 64 bits integer, little endian),
+#    - the block hash (32 bytes).
+# It is memory-mapped with numpy, so that finding the first block after a date is a binary search (searchsorted) in the timestamps. get_eth_block_info uses the snapshot first and only asks the ETH node for the dates that are not covered by it.
+# Only finalised blocks are written to the snapshot.
+#
+# Use it with:
+#    python eth_snapshot.py build first_block_number [last_block_number]   (needs network access, the last block defaults to the last finalised one)
+#    python eth_snapshot.py append [last_block_number]                      (needs network access, continues the snapshot)
+#    python eth_snapshot.py import file_name                                (a snapshot or a csv file with lines 'number,timestamp,hash', for example copied from a computer with network access)
+#    python eth_snapshot.py verify [--rpc N]                                (checks the file, and compares N random blocks with the ETH node)
+#    python eth_snapshot.py info
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import sys
+import random
+import datetime as dt
+import numpy as np
+import pytz
+
+import blockchain_functions
+
+eth_snapshot_file_name = os.environ.get('ETH_SNAPSHOT_FILE', 'eth_headers.snapshot')
+eth_snapshot_dtype = np.dtype([('number', '<u8'), ('timestamp', '<u8'), ('hash', 'u1', (32,))])
+# Number of blocks fetched per batched request when the snapshot is built.
+eth_snapshot_batch_size = 100
+# The memory-mapped snapshot, reloaded when the file changes.
+loaded_eth_snapshot = {'key': None, 'records': None}
+
+def load_eth_snapshot():
+    # This returns the records of the snapshot (memory-mapped) or None if there is no snapshot.
+
+    if not os.path.isfile(eth_snapshot_file_name):
+        return None
+    file_stat = os.stat(eth_snapshot_file_name)
+    key = (file_stat.st_mtime_ns, file_stat.st_size)
+    if loaded_eth_snapshot['key'] != key:
+        if (file_stat.st_size == 0) or (file_stat.st_size % eth_snapshot_dtype.itemsize != 0):
+            print('The ETH snapshot '+eth_snapshot_file_name+' is not valid (run \'python eth_snapshot.py verify\'). It is not used.')
+            return None
+        loaded_eth_snapshot['records'] = np.memmap(eth_snapshot_file_name, dtype = eth_snapshot_dtype, mode = 'r')
+        loaded_eth_snapshot['key'] = key
+    return loaded_eth_snapshot['records']
+
+def find_eth_block_in_snapshot(target_timestamp):
+    # This returns the (block number, block hash) of the first ETH block after the target timestamp (strictly larger timestamp) or None if the snapshot does not cover it.
+    # The snapshot covers the target if it contains the answer and the block before it (or if the answer is the first ETH block).
+
+    records = load_eth_snapshot()
+    if records is None:
+        return None
+    timestamps = records['timestamp']
+    position = int(np.searchsorted(timestamps, target_timestamp, side = 'right'))
+    if position == len(records):
+        return None
+    if (position == 0) and (records[0]['number'] != 0):
+        return None
+    record = records[position]
+    return int(record['number']), '0x'+record['hash'].tobytes().hex()
+
+def make_records(headers):
+    # This turns a list of headers (as returned by get_eth_headers) into snapshot records.
+
+    records = np.zeros(len(headers), dtype = eth_snapshot_dtype)
+    for i, header in enumerate(headers):
+        records[i] = (header['number'], header['timestamp'], np.frombuffer(bytes.fromhex(header['hash'][2:]), dtype = np.uint8))
+    return records
+
+def check_records(records, previous_record = None):
+    # This checks that the block numbers follow each other and that the timestamps increase, starting after previous_record if provided.
+
+    if len(records) == 0:
+        return True
+    numbers = records['number'].astype(np.int64)
+    timestamps = records['timestamp'].astype(np.int64)
+    if previous_record is not None:
+        numbers = np.concatenate([[int(previous_record['number'])], numbers])
+        timestamps = np.concatenate([[int(previous_record['timestamp'])], timestamps])
+    gaps = np.flatnonzero(np.diff(numbers) != 1)
+    if len(gaps) > 0:
+        print('The block numbers are not consecutive after block '+str(numbers[gaps[0]])+'.')
+        return False
+    steps = np.flatnonzero(np.diff(timestamps) <= 0)
+    if len(steps) > 0:
+        print('The timestamps do not increase after block '+str(numbers[steps[0]])+'.')
+        return False
+    return True
+
+def append_records(records):
+    # This appends the records to the snapshot if they continue it.
+
+    snapshot = load_eth_snapshot()
+    previous_record = None if snapshot is None else snapshot[-1]
+    if check_records(records, previous_record) == False:
+        return 'error'
+    with open(eth_snapshot_file_name, 'ab') as outfile:
+        records.tofile(outfile)
+    return 'success'
+
+def fetch_eth_blocks(first_block_number, last_block_number = None, api_url = None):
+    # This fetches the headers of the blocks first_block_number to last_block_number (the last finalised block by default) from the ETH node and appends them to the snapshot, one batch at a time. An interrupted download can be continued with append_eth_snapshot.
+
+    headers = blockchain_functions.get_eth_headers(['finalized'], {}, api_url)
+    if last_block_number is None:
+        last_block_number = headers['finalized']['number']
+    if last_block_number > headers['finalized']['number']:
+        print('Block '+str(last_block_number)+' is not finalised yet. The snapshot stops at block '+str(headers['finalized']['number'])+'.')
+        last_block_number = headers['finalized']['number']
+    if last_block_number < first_block_number:
+        print('There is no new finalised block to add to the snapshot.')
+        return 'success'
+    print('Fetching the blocks '+str(first_block_number)+' to '+str(last_block_number)+'.')
+    for batch_start in range(first_block_number, last_block_number + 1, eth_snapshot_batch_size):
+        block_numbers = list(range(batch_start, min(batch_start + eth_snapshot_batch_size, last_block_number + 1)))
+        headers = blockchain_functions.get_eth_headers(block_numbers, {}, api_url)
+        if append_records(make_records([headers[n] for n in block_numbers])) == 'error':
+            return 'error'
+        print('\r'+str(block_numbers[-1] - first_block_number + 1)+' / '+str(last_block_number - first_block_number + 1)+' blocks', end = '', flush = True)
+    print()
+    return 'success'
+
+def build_eth_snapshot(first_block_number, last_block_number = None, api_url = None):
+    # This starts a new snapshot at first_block_number. It must start before the earliest date to look up (the genesis block of the oldest story).
+
+    if os.path.isfile(eth_snapshot_file_name):
+        print('The ETH snapshot '+eth_snapshot_file_name+' already exists. Use \'append\' to extend it or remove it first.')
+        return 'error'
+    return fetch_eth_blocks(first_block_number, last_block_number, api_url)
+
+def append_eth_snapshot(last_block_number = None, api_url = None):
+    # This extends the snapshot up to last_block_number (the last finalised block by default).
+
+    snapshot = load_eth_snapshot()
+    if snapshot is None:
+        print('There is no ETH snapshot to extend. Use \'build\' first.')
+        return 'error'
+    return fetch_eth_blocks(int(snapshot[-1]['number']) + 1, last_block_number, api_url)
+
+def read_snapshot_file(file_name):
+    # This reads the records of a snapshot file or of a csv file with lines 'number,timestamp,hash' (the hash in hexadecimal, with or without '0x').
+
+    if file_name.lower().endswith('.csv'):
+        headers = []
+        with open(file_name, encoding='utf-8') as infile:
+            for line in infile:
+                fields = line.strip().split(',')
+                if (len(fields) != 3) or (not fields[0].strip().isdigit()):
+                    # Header line or empty line.
+                    continue
+                block_hash = fields[2].strip()
+                if not block_hash.startswith('0x'):
+                    block_hash = '0x'+block_hash
+                headers.append({'number': int(fields[0]), 'timestamp': int(fields[1]), 'hash': block_hash})
+        return make_records(headers)
+    if os.path.getsize(file_name) % eth_snapshot_dtype.itemsize != 0:
+        print('The size of '+file_name+' is not a multiple of '+str(eth_snapshot_dtype.itemsize)+' bytes. It is not a snapshot file.')
+        return 'error'
+    return np.fromfile(file_name, dtype = eth_snapshot_dtype)
+
+def import_eth_snapshot(file_name):
+    # This adds the records of another snapshot (or csv) file to the snapshot. The records already in the snapshot must be identical and the new ones must continue it.
+
+    try:
+        records = read_snapshot_file(file_name)
+    except (OSError, ValueError) as error:
+        print('Could not read '+file_name+': '+str(error))
+        return 'error'
+    if type(records) == str:
+        return 'error'
+    if len(records) == 0:
+        print('There is no block in '+file_name+'.')
+        return 'error'
+    if check_records(records) == False:
+        return 'error'
+    snapshot = load_eth_snapshot()
+    if snapshot is not None:
+        first = int(snapshot[0]['number'])
+        last = int(snapshot[-1]['number'])
+        overlap = records[(records['number'] >= first) & (records['number'] <= last)]
+        if (len(overlap) > 0) and (not (snapshot[overlap['number'].astype(np.int64) - first] == overlap).all()):
+            print('The blocks of '+file_name+' do not match the ones already in the snapshot.')
+            return 'error'
+        if int(records[0]['number']) < first:
+            print('The blocks of '+file_name+' start before the snapshot. Build a new snapshot from it instead.')
+            return 'error'
+        records = records[records['number'] > last]
+    if append_records(records) == 'error':
+        return 'error'
+    print(str(len(records))+' block(s) added to the snapshot.')
+    return 'success'
+
+def verify_eth_snapshot(nb_rpc_checks = 0, api_url = None):
+    # This checks that the snapshot is well formed and compares nb_rpc_checks random blocks (and the last one) with the ETH node.
+
+    if not os.path.isfile(eth_snapshot_file_name):
+        print('There is no ETH snapshot.')
+        return 'error'
+    if os.path.getsize(eth_snapshot_file_name) % eth_snapshot_dtype.itemsize != 0:
+        print('The size of the snapshot is not a multiple of '+str(eth_snapshot_dtype.itemsize)+' bytes. The last record is incomplete.')
+        return 'error'
+    snapshot = load_eth_snapshot()
+    if (snapshot is None) or (check_records(snapshot) == False):
+        return 'error'
+    if nb_rpc_checks > 0:
+        positions = random.sample(range(len(snapshot)), min(nb_rpc_checks, len(snapshot))) + [len(snapshot) - 1]
+        block_numbers = [int(snapshot[position]['number']) for position in positions]
+        headers = {}
+        for batch_start in range(0, len(block_numbers), eth_snapshot_batch_size):
+            blockchain_functions.get_eth_headers(block_numbers[batch_start:batch_start + eth_snapshot_batch_size], headers, api_url)
+        for position, block_number in zip(positions, block_numbers):
+            if make_records([headers[block_number]])[0] != snapshot[position]:
+                print('Block '+str(block_number)+' of the snapshot does not match the ETH node.')
+                return 'error'
+        print(str(len(set(block_numbers)))+' block(s) match the ETH node.')
+    print_eth_snapshot_info()
+    return 'success'
+
+def print_eth_snapshot_info():
+    # This prints the blocks and the dates covered by the snapshot.
+
+    snapshot = load_eth_snapshot()
+    if snapshot is None:
+        print('There is no ETH snapshot.')
+        return
+    first_date = dt.datetime.fromtimestamp(int(snapshot[0]['timestamp']), pytz.UTC).strftime('%Y/%m/%d %H:%M:%S')
+    last_date = dt.datetime.fromtimestamp(int(snapshot[-1]['timestamp']), pytz.UTC).strftime('%Y/%m/%d %H:%M:%S')
+    print('The ETH snapshot '+eth_snapshot_file_name+' contains the blocks '+str(int(snapshot[0]['number']))+' to '+str(int(snapshot[-1]['number']))+' ('+first_date+' to '+last_date+' UTC).')
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    nb_rpc_checks = blockchain_functions.pop_option(sys.argv, '--rpc', '0')
+    if (nb_rpc_checks == 'error') or (not nb_rpc_checks.isdigit()):
+        print('The option --rpc needs a number of blocks.')
+        sys.exit()
+    for argument in sys.argv[2:]:
+        if (sys.argv[1] in ['build', 'append']) and (not argument.isdigit()):
+            print('The block numbers must be positive integers.')
+            sys.exit()
+    if (len(sys.argv) in [3, 4]) and (sys.argv[1] == 'build'):
+        status = build_eth_snapshot(*[int(argument) for argument in sys.argv[2:]])
+    elif (len(sys.argv) in [2, 3]) and (sys.argv[1] == 'append'):
+        status = append_eth_snapshot(*[int(argument) for argument in sys.argv[2:]])
+    elif (len(sys.argv) == 3) and (sys.argv[1] == 'import'):
+        status = import_eth_snapshot(sys.argv[2])
+    elif (len(sys.argv) == 2) and (sys.argv[1] == 'verify'):
+        status = verify_eth_snapshot(int(nb_rpc_checks))
+    elif (len(sys.argv) == 2) and (sys.argv[1] == 'info'):
+        print_eth_snapshot_info()
+        status = 'success'
+    else:
+        print('Usage:')
+        print('    python eth_snapshot.py build first_block_number [last_block_number]')
+        print('    python eth_snapshot.py append [last_block_number]')
+        print('    python eth_snapshot.py import file_name')
+        print('    python eth_snapshot.py verify [--rpc N]')
+        print('    python eth_snapshot.py info')
+        status = 'error'
+    print(status)
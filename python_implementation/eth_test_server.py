@@ -0,0 +1,97 @@
+# -----------------------------------------------------------
+# Local stand-in for an ETH node, to test the search of ETH blocks
+#
+# This serves a synthetic ETH chain through the JSON-RPC method eth_getBlockByNumber (single and batched requests, block numbers and the tags 'latest' and 'finalized').
+# The blocks are 12 seconds apart (with about 1% of missed slots) and the block hashes are the SHA-256 hashes of the block numbers. The chain is generated from a seed, so that it is the same at each start.
+# The latest block is the last block before the current time. Each request is counted and, with '--verbose', printed.
+#
+# Run it with:
+#    python eth_test_server.py [--port 8545] [--start 2023/01/01] [--seed 0] [--verbose]
+# and point the scripts to it with the environment variable ETH_API_URL=http://127.0.0.1:8545
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import json
+import sys
+import time
+import hashlib
+import datetime as dt
+import numpy as np
+import pytz
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from blockchain_functions import pop_option, pop_flag
+
+def make_test_chain(start_date, seed = 0, missed_slots = 0.01):
+    # This returns the timestamps of the synthetic blocks, from start_date to one day after now.
+
+    start_timestamp = int(start_date.timestamp())
+    nb_slots = int((time.time() + 86400 - start_timestamp)//12)
+    rng = np.random.default_rng(seed)
+    gaps = 12*(1 + (rng.random(nb_slots) < missed_slots))
+    return start_timestamp + np.concatenate([[0], np.cumsum(gaps)]).astype(np.int64)
+
+def get_test_block(timestamps, block_id):
+    # This returns the block as served by eth_getBlockByNumber (only the fields used by get_eth_block_info) or None if it does not exist.
+
+    latest = int(np.searchsorted(timestamps, time.time(), side = 'right')) - 1
+    if block_id == 'latest':
+        number = latest
+    elif block_id == 'finalized':
+        number = latest - 64
+    else:
+        number = int(block_id, 16)
+    if (number < 0) or (number > latest):
+        return None
+    return {'number': hex(number), 'timestamp': hex(int(timestamps[number])), 'hash': '0x'+hashlib.sha256(b'%d' % number).hexdigest()}
+
+def make_request_handler(timestamps, verbose = False):
+    # This returns the class handling the HTTP requests. The number of requests (HTTP requests and JSON-RPC calls) is counted in its attribute 'counts'.
+
+    class TestNodeHandler(BaseHTTPRequestHandler):
+        # Keep the connections alive, like a real node.
+        protocol_version = 'HTTP/1.1'
+        counts = {'http_requests': 0, 'calls': 0}
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            calls = payload if type(payload) == list else [payload]
+            TestNodeHandler.counts['http_requests'] += 1
+            TestNodeHandler.counts['calls'] += len(calls)
+            results = []
+            for call in calls:
+                if call.get('method') != 'eth_getBlockByNumber':
+                    results.append({'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}})
+                    continue
+                results.append({'jsonrpc': '2.0', 'id': call.get('id'), 'result': get_test_block(timestamps, call['params'][0])})
+            if verbose:
+                print('Request '+str(TestNodeHandler.counts['http_requests'])+': '+', '.join([str(call['params'][0]) for call in calls]))
+            body = json.dumps(results if type(payload) == list else results[0]).encode('utf8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TestNodeHandler
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    port = pop_option(sys.argv, '--port', '8545')
+    start = pop_option(sys.argv, '--start', '2023/01/01')
+    seed = pop_option(sys.argv, '--seed', '0')
+    if 'error' in [port, start, seed]:
+        sys.exit()
+    verbose = pop_flag(sys.argv, '--verbose')
+    timestamps = make_test_chain(pytz.utc.localize(dt.datetime.strptime(start, '%Y/%m/%d')), int(seed))
+    server = ThreadingHTTPServer(('127.0.0.1', int(port)), make_request_handler(timestamps, verbose))
+    print('Serving a test ETH chain of '+str(len(timestamps))+' blocks on http://127.0.0.1:'+port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopped.')
@@ -10,8 +10,10 @@ import tkinter.scrolledtext as scrolledtext
 from tkinter import ttk
 import json
 import os
-import glob
 import sys
+import threading
+import queue
+import datetime as dt
 from io import StringIO
 #from tkinter.tix import *
 #from tkinter.ttk import *
@@ -20,6 +22,9 @@ from chapter_signature import *
 from mining import *
 from checks import *
 from blockchain_functions import *
+import workspace
+import workspace_watcher
+import block_tree
 
 class ScrollableFrame:
     # thanks https://stackoverflow.com/questions/1844995/how-to-add-a-scrollbar-to-a-window-with-tkinter?answertab=modifieddesc#tab-top
@@ -66,6 +71,42 @@ class ScrollableFrame:
         if self.mousescroll:
             self.canvas.unbind_all("<MouseWheel>")
 
+class QueueWriter:
+    # This replaces sys.stdout while a script runs in a background thread. The printed text is put in a queue and shown by the window as it arrives.
+    
+    def __init__ (self, messages):
+        self.messages = messages
+
+    def write(self, text):
+        self.messages.put(('text', text))
+
+    def flush(self):
+        pass
+
+def set_table_row(table, file_name, values, position = None):
+    # This inserts or updates the row of a file in a table. The rows are identified by the file names and shown in reverse alphabetical order.
+    # The position of a new row is found among the other rows, unless it is given ('end' when the rows are inserted in order).
+    
+    if table.exists(file_name):
+        table.item(file_name, values = values)
+    else:
+        if position is None:
+            position = len([iid for iid in table.get_children() if iid > file_name])
+        table.insert(parent='',index=position,iid=file_name,text='', values = values)
+
+def follow_workspace_changes(window, watcher, callback):
+    # This calls callback(change, file_name, summary) for each file that changes in the working directory while the window is open (see workspace_watcher.py).
+    
+    watcher.subscribe(callback)
+    def process_changes():
+        watcher.process_changes()
+        window.after(500, process_changes)
+    def stop_following(event):
+        if event.widget is window:
+            watcher.unsubscribe(callback)
+    window.bind('<Destroy>', stop_following, add = '+')
+    window.after(500, process_changes)
+
 def open_chapter_signature_window(event):
     
     welcome_window.destroy()
@@ -196,31 +237,13 @@ def open_mining_window(event):
     mining_window_frame_scroll = ScrollableFrame(mining_window,height=800 ,width=600)
     mining_window_frame = mining_window_frame_scroll.frame
     
-    lbl_story_choice = tk.Label(master = mining_window_frame, text="Select an unfinished validated story below. This is the story\nto which you want to add a new chapter. Pick the story with\nthe right title and the largest number of chapters. If multiple\nstories have the same title and number of chapters, then pick\nthe one with the smallest story run-time. You can scroll!",justify="left")
+    lbl_story_choice = tk.Label(master = mining_window_frame, text="Select an unfinished validated story below. This is the story\nto which you want to add a new chapter. Pick the story with\nthe right title and the largest number of chapters. If multiple\nstories have the same title and number of chapters, then pick\nthe one with the smallest story run-time. You can scroll!\nThis story is selected automatically when you select a signed\nchapter below.",justify="left")
 #    lbl_story_choice = tk.Label(text="Select an unfinished validated story below. This is the story to which you want to add a new chapter.\n\nPick the story with:\n - the right title.\n - the largest number of chapters.\n \nIf multiple stories have the same title and number of chapters, then pick the one with the smallest story run-time. You can scroll !",justify="left")
     lbl_story_choice.grid(row = 0, column = 0, sticky = 'nw', padx = 10)
     
-    json_files = glob.glob('*.json')
-    
-    validated_stories = sorted([f for f in json_files if all([x.isdigit() for x in import_json(f, False).keys()]) and (len(import_json(f, False)) != 0)])
-    validated_stories.reverse()
-
-    signed_chapters = sorted([f for f in json_files if set(['chapter_data', 'encrypted_hashed_chapter', 'public_key']) == set(import_json(f, False).keys())])
-    signed_chapters.reverse()
-
-    # Import all the available signed chapters and validated stories
-    validated_stories_json = []
-    for validated_story in validated_stories:
-        temp = import_json(validated_story)
-        if temp != 'error':
-            temp = temp[str(max([int(b) for b in temp.keys()]))]['block_content']
-            validated_stories_json.append(temp)
-    signed_chapters_json = []
-    for signed_chapter in signed_chapters:
-        temp = import_json(signed_chapter)
-        if temp != 'error':
-            temp = temp['chapter_data']
-            signed_chapters_json.append(temp)
+    # Find all the available signed chapters and validated stories (see workspace.py). The tables follow the changes of the files (see workspace_watcher.py).
+    watcher = workspace_watcher.get_workspace_watcher()
+    watcher.process_changes()
     
     table_validated_chapters = ttk.Treeview(master = mining_window_frame, height = 9)
 
@@ -237,12 +260,15 @@ def open_mining_window(event):
     table_validated_chapters.heading("miner_name",text="Last miner name")
     table_validated_chapters.heading("story_runtime_seconds",text="Story run-time")
     
-    for ind, validated_story in enumerate(validated_stories_json):
-        if 'signed_chapter_data' in validated_story.keys():
-            val = (validated_story['signed_chapter_data']['chapter_data']['story_title'], validated_story['signed_chapter_data']['chapter_data']['chapter_number'],validated_story['miner_name'],validated_story['story_runtime_seconds'])
-        else:
-            val = (validated_story['story_title'], validated_story['chapter_number'],validated_story['miner_name'],validated_story['story_runtime_seconds'])
-        table_validated_chapters.insert(parent='',index='end',iid=ind,text='', values = val)
+    def show_validated_story(file_name, summary, position = None):
+        if (summary is not None) and (summary['type'] == 'story'):
+            val = (summary['story_title'], summary['chapter_number'],summary['miner_name'],summary['story_runtime_seconds'])
+            set_table_row(table_validated_chapters, file_name, val, position)
+        elif table_validated_chapters.exists(file_name):
+            table_validated_chapters.delete(file_name)
+    
+    for file_name in sorted(workspace.find_workspace_files('story', watcher.index), reverse = True):
+        show_validated_story(file_name, watcher.index[file_name], 'end')
         
     table_validated_chapters.grid(row = 1,column = 0, padx = 10, pady = 10)
 
@@ -250,7 +276,7 @@ def open_mining_window(event):
         # thanks: https://stackoverflow.com/questions/30614279/tkinter-treeview-get-selected-item-values
         curItem = table_validated_chapters.focus()
         global validated_story_file
-        validated_story_file = validated_stories[int(curItem)]
+        validated_story_file = curItem
 
     table_validated_chapters.bind('<ButtonRelease-1>', get_validated_story_file)
 
@@ -272,16 +298,37 @@ def open_mining_window(event):
     table_signed_chapters.heading("author",text="Author")
     table_signed_chapters.heading("chapter_title",text="Chapter title")
     
-    for ind, signed_chapter in enumerate(signed_chapters_json):
-        val = (signed_chapter['story_title'], signed_chapter['chapter_number'],signed_chapter['author'],signed_chapter['chapter_title'])
-        table_signed_chapters.insert(parent='',index='end',iid=ind,text='', values = val)
+    def show_signed_chapter(file_name, summary, position = None):
+        if (summary is not None) and (summary['type'] == 'signed_chapter'):
+            val = (summary['story_title'], summary['chapter_number'],summary['author'],summary['chapter_title'])
+            set_table_row(table_signed_chapters, file_name, val, position)
+        elif table_signed_chapters.exists(file_name):
+            table_signed_chapters.delete(file_name)
+    
+    for file_name in sorted(workspace.find_workspace_files('signed_chapter', watcher.index), reverse = True):
+        show_signed_chapter(file_name, watcher.index[file_name], 'end')
+    
+    def show_file_change(change, file_name, summary):
+        show_validated_story(file_name, summary)
+        show_signed_chapter(file_name, summary)
+    
+    follow_workspace_changes(mining_window, watcher, show_file_change)
     
     table_signed_chapters.grid(row = 3,column = 0, padx = 10, pady = 10)
     
     def get_signed_chapter_file(a):
         curItem = table_signed_chapters.focus()
         global signed_chapter_file
-        signed_chapter_file = signed_chapters[int(curItem)]
+        global validated_story_file
+        signed_chapter_file = curItem
+        # Select the canonical story of the title of the chapter (see block_tree.py).
+        if curItem in watcher.index.keys():
+            story_file = block_tree.get_canonical_story_file(watcher.index[curItem]['story_title'], watcher.index)
+            if (story_file is not None) and table_validated_chapters.exists(story_file):
+                table_validated_chapters.selection_set(story_file)
+                table_validated_chapters.focus(story_file)
+                table_validated_chapters.see(story_file)
+                validated_story_file = story_file
     
     table_signed_chapters.bind('<ButtonRelease-1>', get_signed_chapter_file)
     
@@ -295,8 +342,19 @@ def open_mining_window(event):
     var1 = tk.IntVar(master = mining_window_frame, )
     check_send_to_discord = tk.Checkbutton(master = mining_window_frame, text="Automatically send the validated file to\nthe discord server. You can also\nupload it manually later.", variable=var1,justify="left")
     check_send_to_discord.grid(row = 2,column = 1, padx = 10, pady = 10, sticky = 'nw')
+    fr_mining_options = tk.Frame(master = mining_window_frame)
+    lbl_workers = tk.Label(master = fr_mining_options, text="Number of workers (cores):")
+    global spin_workers
+    spin_workers = tk.Spinbox(master = fr_mining_options, from_ = 1, to = os.cpu_count(), width = 5)
+    global var_resume
+    var_resume = tk.IntVar(master = mining_window_frame)
+    check_resume = tk.Checkbutton(master = fr_mining_options, text="Resume the saved mining session\nof this chapter (if there is one).", variable=var_resume,justify="left")
+    lbl_workers.grid(row = 0, column = 0, sticky = 'w')
+    spin_workers.grid(row = 0, column = 1, sticky = 'w', padx = 5)
+    check_resume.grid(row = 1, column = 0, columnspan = 2, sticky = 'w', pady = 5)
+    fr_mining_options.grid(row = 3, column = 1, padx = 10, pady = 10, sticky = 'nw')
     but_start_mining = tk.Button(master = mining_window_frame, text = 'Start mining! This will take some time.')
-    but_start_mining.grid(row = 3, column = 1,padx = 10, pady = 10)
+    but_start_mining.grid(row = 4, column = 1,padx = 10, pady = 10)
     but_start_mining.bind("<Button-1>", run_mining)
     #https://www.geeksforgeeks.org/how-to-get-selected-value-from-listbox-in-tkinter/
     # to make tickboxes: https://python-course.eu/tkinter/checkboxes-in-tkinter.php
@@ -305,6 +363,7 @@ def open_mining_window(event):
     mining_window.mainloop()
     
 def run_mining(event):
+    # The mining runs in a background thread so that the window stays responsive. What mine_chapter prints and its progress reports are passed to the window through a queue.
     
     miner_name = ent_miner_name.get()
     send = var1.get()
@@ -312,6 +371,8 @@ def run_mining(event):
         send = 'yes'
     else:
         send = 'no'
+    workers = int(spin_workers.get())
+    resume = bool(var_resume.get())
 
     mining_window.destroy()
     mined_chapter_window = tk.Tk()
@@ -323,21 +384,76 @@ def run_mining(event):
     mined_chapter_window_frame_scroll = ScrollableFrame(mined_chapter_window,height=800 ,width=600)
     mined_chapter_window_frame = mined_chapter_window_frame_scroll.frame
     
-    old_stdout = sys.stdout
-    result = StringIO()
-    sys.stdout = result
-    status = mine_chapter(validated_story_file, signed_chapter_file, miner_name, send = send)
-    result_string = result.getvalue()
-    sys.stdout = old_stdout
-    
-    scroll_sign_messages = scrolledtext.ScrolledText(master = mined_chapter_window_frame, height = 35, width = 105)
-    scroll_sign_messages.insert("1.0", result_string)
-    if status == 'error':
-        lbl_mined_chapter = tk.Label(master = mined_chapter_window_frame, text = 'Something is not right.\nSee the text below for a description of what happened.\nClose this window and try again.')
-    else:
-        lbl_mined_chapter = tk.Label(master = mined_chapter_window_frame, text = 'Your have mined a new chapter!\nSee the text below for a description of what happened.\nClose this window when you are finished.')
+    lbl_mined_chapter = tk.Label(master = mined_chapter_window_frame, text = 'Mining in progress...\nSee the text below for a description of what happens.')
+    fr_progress = tk.Frame(master = mined_chapter_window_frame, highlightbackground="black", highlightthickness=2)
+    lbl_progress = tk.Label(master = fr_progress, text = 'Tries: 0\nHash rate: -\nBest hash: -\nExpected time left: -', justify = 'left', width = 40, anchor = 'w')
+    but_cancel = tk.Button(master = fr_progress, text = 'Cancel the mining')
+    scroll_sign_messages = scrolledtext.ScrolledText(master = mined_chapter_window_frame, height = 30, width = 105)
     lbl_mined_chapter.grid(row = 0, column = 0, sticky = 'n', padx=10, pady = 10)
-    scroll_sign_messages.grid(row = 1, column = 0, sticky = 'n', padx=10, pady = 10)
+    lbl_progress.grid(row = 0, column = 0, padx = 10, pady = 5)
+    but_cancel.grid(row = 0, column = 1, padx = 10, pady = 5)
+    fr_progress.grid(row = 1, column = 0, sticky = 'nw', padx=10, pady = 5)
+    scroll_sign_messages.grid(row = 2, column = 0, sticky = 'n', padx=10, pady = 10)
+
+    messages = queue.Queue()
+    cancel = threading.Event()
+
+    def mining_thread():
+        old_stdout = sys.stdout
+        sys.stdout = QueueWriter(messages)
+        status = 'error'
+        try:
+            status = mine_chapter(validated_story_file, signed_chapter_file, miner_name, send = send, workers = workers, resume = resume, progress = lambda report: messages.put(('progress', report)), cancel = cancel)
+        except Exception as error:
+            print('The mining stopped with an error: '+repr(error))
+        finally:
+            sys.stdout = old_stdout
+            messages.put(('done', status))
+
+    def cancel_mining(a = None):
+        if not cancel.is_set():
+            cancel.set()
+            but_cancel.config(text = 'Cancelling...', state = 'disabled')
+
+    def close_window():
+        # Stop the workers cleanly before closing the window.
+        cancel_mining()
+        if worker_thread.is_alive():
+            mined_chapter_window.after(200, close_window)
+        else:
+            mined_chapter_window.destroy()
+
+    def show_messages():
+        while True:
+            try:
+                kind, content = messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'text':
+                scroll_sign_messages.insert(tk.END, content)
+                scroll_sign_messages.see(tk.END)
+            elif kind == 'progress':
+                if 'expected_seconds_left' in content.keys():
+                    eta = str(dt.timedelta(seconds = round(content['expected_seconds_left'])))
+                else:
+                    eta = '-'
+                lbl_progress.config(text = 'Tries: '+str(content['nb_tries'])+'\nHash rate: '+str(round(content['hashes_per_second']))+' hashes per second\nBest hash: '+content['best_hash'][:16]+'...\nExpected time left: '+eta)
+            elif kind == 'done':
+                but_cancel.config(state = 'disabled')
+                if cancel.is_set():
+                    lbl_mined_chapter.config(text = 'The mining was cancelled.\nThe mining session was saved: tick the \'resume\' box to continue it later.\nClose this window when you are finished.')
+                elif content == 'error':
+                    lbl_mined_chapter.config(text = 'Something is not right.\nSee the text below for a description of what happened.\nClose this window and try again.')
+                else:
+                    lbl_mined_chapter.config(text = 'Your have mined a new chapter!\nSee the text below for a description of what happened.\nClose this window when you are finished.')
+                return
+        mined_chapter_window.after(200, show_messages)
+
+    but_cancel.bind("<Button-1>", cancel_mining)
+    mined_chapter_window.protocol("WM_DELETE_WINDOW", close_window)
+    worker_thread = threading.Thread(target = mining_thread, daemon = True)
+    worker_thread.start()
+    mined_chapter_window.after(200, show_messages)
     
     mined_chapter_window.mainloop()
     
@@ -357,9 +473,9 @@ def open_check_window(event):
     lbl_check_greeting = tk.Label(master = check_window_frame, text="Select a file to check and then view.\n\nYou can scroll!")
     lbl_check_greeting.grid(row = 0, column = 0, padx = 10, pady = 10)
     
-    file_names = sorted(glob.glob('*.json'))
-    file_names.reverse()
-    json_files = [import_json(f, False) for f in file_names]
+    # The files are described with the workspace index (see workspace.py). The table follows the changes of the files (see workspace_watcher.py).
+    watcher = workspace_watcher.get_workspace_watcher()
+    watcher.process_changes()
     
     table_to_check = ttk.Treeview(master = check_window_frame, height = 22)
     table_to_check['columns'] = ('file_type', 'story_title', 'chapter_number', 'chapter_title', 'author')
@@ -377,38 +493,31 @@ def open_check_window(event):
     table_to_check.heading("chapter_title",text="(Last) chapter title")
     table_to_check.heading("author",text="Author")
     
-    for ind, file in enumerate(json_files):
-        if set(['story_title', 'chapter_number', 'author', 'chapter_title', 'text']) == set(file.keys()):
-            val = ('un-signed chapter',file['story_title'],file['chapter_number'],file['chapter_title'],file['author'])
-            table_to_check.insert(parent='',index='end',iid=ind,text='', values = val)
-        elif set(['chapter_data', 'encrypted_hashed_chapter', 'public_key']) == set(file.keys()):
-            val = ('signed chapter',file['chapter_data']['story_title'],file['chapter_data']['chapter_number'],file['chapter_data']['chapter_title'],file['chapter_data']['author'])
-            table_to_check.insert(parent='',index='end',iid=ind,text='', values = val)
-        elif set(['block_content', 'hash']) == set(file.keys()):
-            if 'signed_chapter_data' in file['block_content'].keys():
-                file = file['block_content']['signed_chapter_data']
-                val = ('validated block (isolated)',file['story_title'],file['chapter_number'],file['chapter_title'],file['author'])
-                table_to_check.insert(parent='',index='end',iid=ind,text='', values = val)
+    def show_file_to_check(change, file_name, summary, position = None):
+        if summary is None:
+            val = None
+        elif summary['type'] in ['unsigned_chapter', 'signed_chapter', 'block', 'genesis_block']:
+            val = (workspace.workspace_file_types[summary['type']],summary['story_title'],summary['chapter_number'],summary['chapter_title'],summary['author'])
+        elif summary['type'] == 'story':
+            if summary['tip_block_number'] == 0:
+                val = ('validated genesis block',summary['story_title'],summary['chapter_number'], 'no title',summary['author'])
             else:
-                file = file['block_content']
-                val = ('validated genesis block (isolated)',file['story_title'],file['chapter_number'],file['chapter_title'],file['author'])
-                table_to_check.insert(parent='',index='end',iid=ind,text='', values = val)
-        elif all([x.isdigit() for x in file.keys()]) and (len(file) != 0):
-            
-            largest_block_nb = str(max([int(k) for k in file.keys()]))
-            if largest_block_nb == '0':
-                file = file['0']['block_content']
-                val = ('validated genesis block',file['story_title'],file['chapter_number'], 'no title',file['author'])
-                table_to_check.insert(parent='',index='end',iid=ind,text='', values = val)
-            else:
-                file = file[largest_block_nb]['block_content']['signed_chapter_data']['chapter_data']
-                val = ('validated story',file['story_title'],file['chapter_number'],file['chapter_title'],file['author'])
-                table_to_check.insert(parent='',index='end',iid=ind,text='', values = val)
+                val = ('validated story',summary['story_title'],summary['chapter_number'],summary['chapter_title'],summary['author'])
+        else:
+            val = None
+        if val is not None:
+            set_table_row(table_to_check, file_name, val, position)
+        elif table_to_check.exists(file_name):
+            table_to_check.delete(file_name)
+    
+    for file_name in sorted(watcher.index.keys(), reverse = True):
+        show_file_to_check('added', file_name, watcher.index[file_name], 'end')
+    follow_workspace_changes(check_window, watcher, show_file_to_check)
     
     def get_file_to_check(a):
         curItem = table_to_check.focus()
         global file_to_check
-        file_to_check = file_names[int(curItem)]
+        file_to_check = curItem
     
     table_to_check.bind('<ButtonRelease-1>', get_file_to_check)
     
@@ -459,27 +568,31 @@ def run_checks(event):
     
     checked_window.mainloop()
     
-welcome_window = tk.Tk()
-welcome_window.title('What to do...')
-welcome_window.columnconfigure([0,1,2], weight=1)
-welcome_window.rowconfigure([0,1], weight=1)
-welcome_window.eval('tk::PlaceWindow . center')
+################################# The program starts here ################################################
 
-lbl_greeting = tk.Label(text="What do you want to do?")
-but_sign_chapter = tk.Button(text = 'Digiatlly sign a chapter')
-but_mine_chapter = tk.Button(text = 'Attempt to mine a chapter')
-but_check_read = tk.Button(text = 'Check a json file and read it\'s content')
+if __name__ == "__main__":
+    # The guard is needed because the mining processes import this module again on the platforms that do not fork (Windows and macOS).
+    welcome_window = tk.Tk()
+    welcome_window.title('What to do...')
+    welcome_window.columnconfigure([0,1,2], weight=1)
+    welcome_window.rowconfigure([0,1], weight=1)
+    welcome_window.eval('tk::PlaceWindow . center')
 
-lbl_greeting.grid(row = 0, column = 1)
-but_sign_chapter.grid(row=1, column=0, pady = 10, padx = 10)
-but_mine_chapter.grid(row=1, column=1, pady = 10, padx = 10)
-but_check_read.grid(row=1, column=2, pady = 10, padx = 10)
+    lbl_greeting = tk.Label(text="What do you want to do?")
+    but_sign_chapter = tk.Button(text = 'Digiatlly sign a chapter')
+    but_mine_chapter = tk.Button(text = 'Attempt to mine a chapter')
+    but_check_read = tk.Button(text = 'Check a json file and read it\'s content')
 
-but_sign_chapter.bind("<Button-1>", open_chapter_signature_window)
-but_mine_chapter.bind("<Button-1>", open_mining_window)
-but_check_read.bind("<Button-1>", open_check_window)
-    
-welcome_window.mainloop()
+    lbl_greeting.grid(row = 0, column = 1)
+    but_sign_chapter.grid(row=1, column=0, pady = 10, padx = 10)
+    but_mine_chapter.grid(row=1, column=1, pady = 10, padx = 10)
+    but_check_read.grid(row=1, column=2, pady = 10, padx = 10)
+
+    but_sign_chapter.bind("<Button-1>", open_chapter_signature_window)
+    but_mine_chapter.bind("<Button-1>", open_mining_window)
+    but_check_read.bind("<Button-1>", open_check_window)
+
+    welcome_window.mainloop()
 
 # https://realpython.com/python-gui-tkinter/
 # https://www.askpython.com/python-modules/tkinter/tkinter-text-widget-tkinter-scrollbar
\ No newline at end of file
@@ -16,12 +16,20 @@
 #    - Initialise the block to validate with the hash of the previous block, the hash of the correct block of the ETH blockchain and the provided signed chapter data
 #    - Performs the mining:
 #        - Use the difficulty specified in the previous block
-#        - Pick a nonce at random
+#        - Pick a nonce: a random starting point is picked once and each try adds its try number to it
 #        - include the nonce, the current date and time, the number of guesses, the difficulty of the next block
 #        - compute the hash of the current value
 #        - retry unless the obtained hash is smaller than the max_hash (determined by the difficulty)
 #    - The difficulty of the current block is determined with the 'intended_mining_time_days' attribute of the genesis block. If the mining time is shorter than 1/4 of the intented mining time, then the difficulty is set to the difficulty of the previous block plus 1 (effectively doubling the mining time). If the mining time is longer than 1/4 of the intented mining time, the the dificulty is set to the difficulty of the previous block minus one. In the other cases, the difficulty is the difficulty of the previous block.
 #    - Once a suitable nonce is found, then the corresponding hash is included in the dictionary and the new story json file is saved to the working directory.
+#    - The block is serialized only once, into a template. Each try splices the new values of the changing fields into it (see block_template.py).
+#    - If the genesis block declares 'block_format': 2, the signed chapter data is replaced by its hash in the hashed block content (see get_hashed_block_content). Each try then only hashes a few hundred bytes.
+#    - The progress of the mining is saved regularly in a session file (mining_session_*.session). With the '--resume' option, an interrupted mining continues where it stopped, with the same nonces and number of tries. The session is refused if the previous block or the ETH block hash have changed.
+#    - Run 'python mining.py bench' to measure the hash rate of the computer (for one worker and for all the cores, or '--workers N'). The result is saved in 'mining.calibration' and used to estimate the mining time and the difficulty of new genesis blocks.
+#    - The progress of the mining (number of tries, hash rate, lowest hash so far and expected remaining time) is shown on a status line. With the option '--log file_name', it is also appended every second to the given file as json lines.
+#    - The mining can be spread over several processes with the '--workers N' option. The workers share a counter of tries so that the 'nb_tries' field of the mined block is the total number of tries of all the workers. All the workers stop as soon as one of them finds a valid nonce.
+#    - The story can also be a chain log (a *.chain directory, see chain_log.py). The mined block is then appended to it instead of writing a new story file.
+#    - With the '--canonical' option ('python mining.py --canonical signed_chapter_file miner_name'), the story is not given: the chapter is added to the canonical story of its title among all the story files of the working directory (the one with the largest number of chapters and then the smallest story run-time, see block_tree.py).
 #
 # 18/10/2023 Steven Mathey
 # email steven.mathey@gmail.ch
@@ -34,24 +42,64 @@ import sys
 import pytz
 import numpy as np
 import random
+import time
+import os
+import signal
+import socket
+import queue
+import multiprocessing as mp
 from discord_webhook import DiscordWebhook, DiscordEmbed
 from blockchain_functions import *
+from block_template import *
+import block_tree
+import chain_log
 
-def time_to_mine_days(difficulty):
+calibration_file_name = 'mining.calibration'
+
+def load_calibration(block_format = 1):
+    # This returns the hash rates measured by 'python mining.py bench' for the given block format. It returns an empty dictionary if the computer was not calibrated.
+    
+    try:
+        with open(calibration_file_name, encoding='utf-8') as file:
+            calibration = json.load(file)
+        return calibration['block_formats'][str(block_format)]
+    except:
+        return {}
+
+def get_hashes_per_second(calibration, workers = 1):
+    # This estimates the total hash rate of the given number of workers from the calibration.
+    # The loss of efficiency of the parallel mining measured during the calibration is applied to any number of workers larger than one.
+    
+    if workers == 1:
+        return calibration['hashes_per_second_per_worker']
+    efficiency = calibration['hashes_per_second']/(calibration['hashes_per_second_per_worker']*calibration['workers'])
+    return calibration['hashes_per_second_per_worker']*workers*min(efficiency, 1)
+
+def time_to_mine_days(difficulty, workers = 1, block_format = 1):
     # This function estimates the time to solve the mining problem as a function of the difficulty (in days).
-    seconds_to_try_once = 0.0001
+    # The measured hash rate is used if the computer was calibrated with 'python mining.py bench'.
+    seconds_to_try_once = 0.0001/workers
+    calibration = load_calibration(block_format)
+    if len(calibration) > 0:
+        seconds_to_try_once = 1/get_hashes_per_second(calibration, workers)
     return seconds_to_try_once*(2**difficulty)/(24*3600)
 
-def estimate_difficulty(days):
+def estimate_difficulty(days, block_format = 1):
     # This function estimates the difficulty as a function of the desired solution time (given in days).
+    # The measured hash rate of a single worker is used if the computer was calibrated with 'python mining.py bench'.
     seconds_to_try_once = 0.0002
+    calibration = load_calibration(block_format)
+    if len(calibration) > 0:
+        seconds_to_try_once = 1/calibration['hashes_per_second_per_worker']
     # Use floor to be nice.
     return int(np.floor(np.log(24*3600*days/seconds_to_try_once)/np.log(2)))
 
-def set_new_block_difficulty_and_mining_date(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block):
+def set_new_block_difficulty_and_mining_date(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block, mining_date = None):
     # Set the difficulty and mining date of the new block. 'mining_date_previous_block' is given as a timedelta.
+    # The mining date defaults to right now (see get_now).
     
-    mining_date = get_now()
+    if mining_date is None:
+        mining_date = get_now()
     mining_delay = dt.timedelta(days = genesis['mining_delay_days'])
     intended_mining_time = dt.timedelta(days = genesis['intended_mining_time_days'])
     grace = 0.25*intended_mining_time
@@ -70,43 +118,266 @@ def set_new_block_difficulty_and_mining_date(new_block, genesis, difficulty, min
         new_block['difficulty'] = difficulty
     return new_block
 
-def mine_chapter(story_file, chapter_file, miner_name, send = None):
+def mining_worker(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block, tries_counter, best_hash, stop_event, results, batch_size, nonce_base, last_try = None):
+    # This is the proof of work loop that runs in each mining process.
+    # The try numbers are reserved from the shared counter in batches. This way each try has a unique number and the 'nb_tries' field of the winning block is the total number of tries of all the workers.
+    # The nonce of try number n is nonce_base + n (modulo 2**256, written with 64 hexadecimal characters). The workers thus never try the same nonce twice.
+    # The stop event is only checked between batches, so it has to be small enough for the workers to stop quickly.
+    # The lowest hash found by the worker is shared with the main process (in best_hash) at the end of each batch. It is reported in the progress of the mining.
+    # If last_try is provided, the worker stops once all the tries up to last_try are handed out and reports it with the message 'exhausted'.
     
-    if chapter_file == None:
-        print('2 arguments provided, this validates the genesis block.')
-        genesis = import_json(story_file)
-        if genesis == 'error':
-            return 'error'
-        test = check('intended_mining_time_days' in genesis.keys(), 'The provided file is not a valid genesis block.')
-        if test == 'error':
-            return 'error'
-        if 'difficulty' not in genesis.keys():
-            genesis['difficulty'] = estimate_difficulty(genesis['intended_mining_time_days'])
-        if 'miner_name' not in genesis.keys():
-            genesis['miner_name'] = miner_name
-        genesis_hash = rsa.compute_hash(json.dumps(genesis, sort_keys = True, ensure_ascii = False).encode('utf8'), 'SHA-256').hex()
-        genesis = {'block_content': genesis.copy()}
-        genesis['hash'] = genesis_hash
-        file_name = genesis['block_content']['story_title'].title().replace(' ','')+'_000_'+genesis['block_content']['mining_date'].replace(' ','_').replace(':','_').replace('/','_')+'.json'
-        with open(file_name, "w", encoding='utf8') as outfile:
-            json.dump({'0': genesis}, outfile, sort_keys = True, ensure_ascii = False)
-        return 'success'
+    # The block is serialized once into a template (see block_template.py). Each try only splices the new field values into it.
+    # The time-dependent fields are only recomputed when the (rounded) wall-clock second changes.
+    
+    # The interruptions (ctrl-c) are handled by the main process, which stops the workers between two batches.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    max_hash = 2**(256-difficulty)-1
+    template = make_block_template(get_hashed_block_content(new_block, get_block_format(genesis)))
+    if template == 'error':
+        return
+    current_second = None
+    worker_best_hash = bytes(best_hash[:])
+    while not stop_event.is_set():
+        with tries_counter.get_lock():
+            first_try = tries_counter.value + 1
+            end_try = first_try + batch_size
+            if last_try is not None:
+                end_try = max(first_try, min(end_try, last_try + 1))
+            tries_counter.value = end_try - 1
+        if end_try == first_try:
+            results.put('exhausted')
+            return
+        for nb_tries in range(first_try, end_try):
+            # Round to the closest second, like get_now.
+            second = int(time.time() + 0.5)
+            if second != current_second:
+                current_second = second
+                new_block = set_new_block_difficulty_and_mining_date(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block, dt.datetime.fromtimestamp(second, pytz.UTC))
+                template = set_template_time_fields(template, new_block)
+                if template == 'error':
+                    return
+            nonce = b'%064x' % ((nonce_base + nb_tries) % 2**256)
+            new_hash = hash_template_try(template, nb_tries, nonce)
+            if new_hash < worker_best_hash:
+                # Both hashes have 32 bytes, so comparing the bytes compares the numbers.
+                worker_best_hash = new_hash
+            if int.from_bytes(new_hash,'big') <= max_hash:
+                new_block['nb_tries'] = nb_tries
+                new_block['nonce'] = nonce.decode('utf8')
+                results.put((new_block, new_hash))
+                stop_event.set()
+                return
+        with best_hash.get_lock():
+            if worker_best_hash < bytes(best_hash[:]):
+                best_hash[:] = worker_best_hash
 
-    if len(miner_name) == 0:
-        print('Empty miner name provided.')
+def get_mining_progress(difficulty, nb_tries, new_tries, best_hash, elapsed_seconds, sample_seconds):
+    # This summarizes the state of the mining. The hash rate is measured over the last sample.
+    # Each try succeeds with probability 2**-difficulty, independently of the previous ones. The expected remaining time is thus always 2**difficulty tries, whatever the number of tries already performed.
+    
+    progress = {'date': dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S'), 'difficulty': difficulty, 'nb_tries': nb_tries, 'elapsed_seconds': round(elapsed_seconds, 3), 'best_hash': best_hash.hex()}
+    progress['hashes_per_second'] = new_tries/sample_seconds if sample_seconds > 0 else 0
+    # Probability that a valid nonce would have been found with that many tries.
+    progress['success_probability'] = -np.expm1(-nb_tries/2**difficulty)
+    if progress['hashes_per_second'] > 0:
+        progress['expected_seconds_left'] = 2**difficulty/progress['hashes_per_second']
+        # Time after which the block is found with a 50% and a 90% probability.
+        progress['eta_seconds_50'] = np.log(2)*2**difficulty/progress['hashes_per_second']
+        progress['eta_seconds_90'] = np.log(10)*2**difficulty/progress['hashes_per_second']
+    return progress
+
+def print_mining_status_line(progress):
+    # This rewrites a single status line in the terminal.
+    
+    if 'expected_seconds_left' in progress.keys():
+        eta = str(dt.timedelta(seconds = round(progress['expected_seconds_left'])))
+    else:
+        eta = 'unknown'
+    line = str(progress['nb_tries'])+' tries in '+str(dt.timedelta(seconds = round(progress['elapsed_seconds'])))+', '+str(round(progress['hashes_per_second']))+' hashes per second, best hash '+progress['best_hash'][:12]+'..., expected time left '+eta
+    print('\r'+line.ljust(110), end = '', flush = True)
+
+def make_mining_log(log_file_name):
+    # This returns a progress callback that appends each progress report as a json line to the log file. The host name is added to compare the miners of a fleet.
+    
+    host = socket.gethostname()
+    def write_mining_log(progress):
+        with open(log_file_name, "a", encoding='utf-8') as outfile:
+            outfile.write(json.dumps(dict(progress, host = host), sort_keys = True)+'\n')
+    return write_mining_log
+
+def mine_block(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block, workers = 1, batch_size = 1000, nonce_base = None, first_try = 0, checkpoint = None, checkpoint_interval = 60, progress = None, progress_interval = 1, cancel = None, last_try = None):
+    # This runs the proof of work on 'workers' processes and returns the mined block content together with its hash.
+    # The first worker to find a valid nonce stops all the others.
+    # To continue an interrupted mining, provide the same nonce_base and the number of tries already performed as first_try. The nonces of these tries are not tested again.
+    # If provided, checkpoint(nb_tries) is called every checkpoint_interval seconds and when the mining stops without success. nb_tries is the number of tries that were handed out to the workers.
+    # If provided, progress(report) is called every progress_interval seconds with the report of get_mining_progress. It is computed by the main process from the shared counters, so it does not slow the workers down.
+    # The mining stops (without success) within about a second when the event 'cancel' (from threading or multiprocessing) is set. This is used by the graphical user interface.
+    # If last_try is provided, only the tries first_try + 1 to last_try are performed and 'exhausted' is returned if none of them succeeds. This is used by the mining pool (see mining_pool.py).
+    
+    tries_counter = mp.Value('q', first_try)
+    best_hash = mp.Array('B', 32*[255])
+    stop_event = mp.Event()
+    results = mp.Queue()
+    if nonce_base is None:
+        # Pick the starting point of the nonces at random.
+        nonce_base = random.getrandbits(256)
+    processes = [mp.Process(target = mining_worker, args = (new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block, tries_counter, best_hash, stop_event, results, batch_size, nonce_base, last_try), daemon = True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    mined = 'error'
+    exhausted_workers = 0
+    start_time = time.time()
+    last_checkpoint = start_time
+    last_sample = (start_time, first_try)
+    try:
+        while mined == 'error':
+            try:
+                message = results.get(timeout = min(progress_interval, 1))
+                if message == 'exhausted':
+                    exhausted_workers += 1
+                    if exhausted_workers == workers:
+                        mined = 'exhausted'
+                else:
+                    mined = message
+            except queue.Empty:
+                if not any([process.is_alive() for process in processes]):
+                    print('The mining processes stopped unexpectedly.')
+                    break
+                if (cancel is not None) and cancel.is_set():
+                    print('The mining was cancelled.')
+                    break
+                now = time.time()
+                if (checkpoint is not None) and (now - last_checkpoint > checkpoint_interval):
+                    checkpoint(tries_counter.value)
+                    last_checkpoint = now
+                if (progress is not None) and (now - last_sample[0] >= progress_interval):
+                    nb_tries = tries_counter.value
+                    progress(get_mining_progress(difficulty, nb_tries, nb_tries - last_sample[1], bytes(best_hash[:]), now - start_time, now - last_sample[0]))
+                    last_sample = (now, nb_tries)
+    except KeyboardInterrupt:
+        print('The mining was interrupted.')
+    finally:
+        # Stop the workers. They finish their current batch of tries and terminate.
+        stop_event.set()
+        for process in processes:
+            process.join(timeout = 10)
+            if process.is_alive():
+                process.terminate()
+    if (type(mined) == str) and (checkpoint is not None):
+        checkpoint(tries_counter.value)
+    return mined
+
+def measure_hashes_per_second(new_block, genesis, workers, duration):
+    # This runs the mining workers on an impossible problem (difficulty 256) and measures how many tries they perform per second.
+    # The first second is not measured, to leave time for the processes to start.
+    
+    tries_counter = mp.Value('q', 0)
+    best_hash = mp.Array('B', 32*[255])
+    stop_event = mp.Event()
+    results = mp.Queue()
+    mining_date_previous_block = pytz.utc.localize(dt.datetime.strptime(genesis['mining_date'], '%Y/%m/%d %H:%M:%S'))
+    processes = [mp.Process(target = mining_worker, args = (new_block, genesis, 256, mining_date_previous_block, 0, tries_counter, best_hash, stop_event, results, 1000, random.getrandbits(256)), daemon = True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    time.sleep(1)
+    first_count = tries_counter.value
+    start_time = time.perf_counter()
+    time.sleep(duration)
+    last_count = tries_counter.value
+    hashes_per_second = (last_count - first_count)/(time.perf_counter() - start_time)
+    stop_event.set()
+    for process in processes:
+        process.join(timeout = 10)
+        if process.is_alive():
+            process.terminate()
+    return hashes_per_second
+
+def calibrate(workers = None, duration = 5):
+    # This measures the hash rate of this computer for a block with a chapter of maximal length (taken from 'genesis_block.json' if available), for both block formats.
+    # The hash rate is measured for a single worker and for all the workers together. The results are saved in 'mining.calibration' and used by time_to_mine_days and estimate_difficulty.
+    
+    if workers is None:
+        workers = os.cpu_count()
+    test = check((type(workers) == int) and (workers >= 1), 'The number of workers must be a positive integer.')
+    if test == 'error':
+        return 'error'
+    test = check(duration > 0, 'The duration of the measure must be a positive number of seconds.')
+    if test == 'error':
         return 'error'
+    genesis = import_json('genesis_block.json', False)
+    text_length = genesis.get('character_limits', {}).get('text', 30000)
+    calibration = {'date': dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S'), 'text_length': text_length, 'block_formats': {}}
+    print('Measuring the hash rate for a chapter text of '+str(text_length)+' characters, with 1 and '+str(workers)+' worker(s). This takes about '+str(round(4*(duration+1)))+' seconds.')
+    for block_format in [1, 2]:
+        genesis = {'mining_date': '2023/10/17 12:30:00', 'mining_delay_days': 1, 'intended_mining_time_days': 0.1, 'block_format': block_format}
+        new_block = make_benchmark_block(text_length)
+        per_worker = measure_hashes_per_second(new_block, genesis, 1, duration)
+        total = measure_hashes_per_second(new_block, genesis, workers, duration)
+        calibration['block_formats'][str(block_format)] = {'hashes_per_second_per_worker': per_worker, 'hashes_per_second': total, 'workers': workers}
+        print('Block format '+str(block_format)+':')
+        print('    - '+str(round(per_worker))+' hashes per second with 1 worker.')
+        print('    - '+str(round(total))+' hashes per second with '+str(workers)+' worker(s) ('+str(round(total/workers))+' per worker).')
+    with open(calibration_file_name, "w", encoding='utf-8') as outfile:
+        json.dump(calibration, outfile, sort_keys = True, ensure_ascii = False)
+    print('The calibration was saved in the working directory in '+calibration_file_name+'.')
+    return 'success'
+
+def get_mining_session_file_name(signed_chapter_data):
+    # The mining session of a signed chapter is saved in the working directory. The file name contains the hash of the signed chapter data.
     
-    # Import the data to validate
-    story = import_json(story_file)
-    if story == 'error':
+    chapter_data = signed_chapter_data['chapter_data']
+    chapter_hash = rsa.compute_hash(json.dumps(signed_chapter_data, sort_keys = True, ensure_ascii = False).encode('utf8'), 'SHA-256').hex()
+    return 'mining_session_'+chapter_data['story_title'].title().replace(' ','')+'_'+str(chapter_data['chapter_number']).rjust(3, '0')+'_'+chapter_hash[:16]+'.session'
+
+def save_mining_session(session_file_name, session):
+    # Write the session to a temporary file first so that an interruption never leaves a half-written session behind.
+    
+    with open(session_file_name+'.tmp', "w", encoding='utf-8') as outfile:
+        json.dump(session, outfile, sort_keys = True, ensure_ascii = False)
+    os.replace(session_file_name+'.tmp', session_file_name)
+
+def load_mining_session(session_file_name, new_block):
+    # This loads a mining session and checks that it was started for the same block. It returns 'error' if the session can't be resumed.
+    
+    with open(session_file_name, encoding='utf-8') as file:
+        session = json.load(file)
+    test = check(session['hash_previous_block'] == new_block['hash_previous_block'], 'The mining session in '+session_file_name+' was started on another previous block. It can\'t be resumed. Start a new mining without \'--resume\'.')
+    if test == 'error':
+        return 'error'
+    test = check(session['hash_eth'] == new_block['hash_eth'], 'The mining session in '+session_file_name+' was started with another ETH block hash. It can\'t be resumed. Start a new mining without \'--resume\'.')
+    if test == 'error':
         return 'error'
+    test = check(session['miner_name'] == new_block['miner_name'], 'The mining session in '+session_file_name+' was started by the miner '+session['miner_name']+'. It can\'t be resumed with another miner name.')
+    if test == 'error':
+        return 'error'
+    return session
+
+def prepare_block_to_mine(story_file, chapter_file, miner_name, chain_index = None):
+    # This imports the story and the signed chapter, performs all the checks that can be done before the mining and initialises the new block (without the mining fields).
+    # It returns a dictionary with everything the mining needs (see mine_block) or 'error'. It is shared by mine_chapter and the mining pool (see mining_pool.py).
+    # chain_index is the index of the authors of the story (see make_chain_index). It is built from the story if not provided and returned in the dictionary.
+    
+    # Import the data to validate
+    if chain_log.is_chain_log(story_file):
+        # Only the genesis block and the last block of a chain log are kept in the story.
+        chain_log_tip = chain_log.read_chain_log_tip(story_file, chain_index)
+        if chain_log_tip == 'error':
+            return 'error'
+        story, chain_index = chain_log_tip
+    else:
+        story = import_json(story_file)
+        if story == 'error':
+            return 'error'
     signed_chapter_data = import_json(chapter_file)
     if signed_chapter_data == 'error':
         return 'error'
 
     # Check that the chapter data is valid.
     genesis = story['0']['block_content']
-    test = check(validate_chapter_data(signed_chapter_data, story), 'The signed chapter data does not comply with the rules of this story.')
+    if chain_index is None:
+        chain_index = make_chain_index(story)
+    test = check(validate_chapter_data(signed_chapter_data, story, chain_index), 'The signed chapter data does not comply with the rules of this story.')
     if test == 'error':
         return 'error'
 
@@ -129,39 +400,41 @@ def mine_chapter(story_file, chapter_file, miner_name, send = None):
     if new_block['hash_eth'] == 'error':
         return 'error'
 
-    # Now perform the actual mining!
-    # It takes about (2)**difficulty tries to find a valid nonce. On my computer, it takes about 0.0001 seconds for each try. difficulty = 23 should take about 10 minutes.
+    # The difficulty of the new block is the one of the previous block.
     difficulty = previous_block['block_content']['difficulty']
-    new_block = set_new_block_difficulty_and_mining_date(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block)
-    # Set the hash value below which the block hash has to be. Use powers of 2 so that the difficulty is doubled as difficulty increases by 1.
-    max_hash = 2**(256-difficulty)-1
-    print('Start mining (at '+ dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S')+' UTC)! On my computer, I estimate it to take about '+str(round(time_to_mine_days(difficulty)*24,3))+' hours to complete.')
-    nb_tries = 1
-    start_time = pytz.utc.localize(dt.datetime.strptime(new_block['mining_date'], '%Y/%m/%d %H:%M:%S'))
-    new_block['nb_tries'] = nb_tries
-    new_block['nonce'] = ''.join(random.choice('0123456789abcdef') for _ in range(64))
-    new_hash = rsa.compute_hash(json.dumps(new_block, sort_keys = True, ensure_ascii = False).encode('utf8'), 'SHA-256')
-    while int.from_bytes(new_hash,'big') > max_hash:
-        nb_tries += 1
-        new_block = set_new_block_difficulty_and_mining_date(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block)
-        new_block['nb_tries'] = nb_tries
-        new_block['nonce'] = ''.join(random.choice('0123456789abcdef') for _ in range(64))
-        new_hash = rsa.compute_hash(json.dumps(new_block, sort_keys = True, ensure_ascii = False).encode('utf8'), 'SHA-256')
-
-    try_time = get_now()-start_time
-    print('The mining took',nb_tries,'tries and',str(try_time)+'. This is',try_time/nb_tries,'per try.')
+    return {'story_file': story_file, 'story': story, 'signed_chapter_data': signed_chapter_data, 'chain_index': chain_index, 'genesis': genesis, 'new_block': new_block, 'difficulty': difficulty, 'mining_date_previous_block': mining_date_previous_block, 'story_runtime_previous_block': story_runtime_previous_block}
+
+def save_mined_story(story, new_block, new_hash, story_file = None):
+    # This adds the mined block to the story and saves the new story in the working directory. It returns the name of the new file.
+    # If story_file is a chain log (see chain_log.py), the block is appended to it instead and the name of the chain log is returned.
+    
+    chapter_number = new_block['signed_chapter_data']['chapter_data']['chapter_number']
     new_block = {'block_content': new_block.copy()}
     new_block['hash'] = new_hash.hex()
-    story[str(signed_chapter_data['chapter_data']['chapter_number'])] = new_block
-    new_file_name = story['0']['block_content']['story_title'].title().replace(' ','')+'_'+str(signed_chapter_data['chapter_data']['chapter_number']).rjust(3, '0')+'_'+new_block['block_content']['mining_date'].replace(' ','_').replace(':','_').replace('/','_')+'.json'
+    story[str(chapter_number)] = new_block
+    if (story_file != None) and chain_log.is_chain_log(story_file):
+        with chain_log.ChainLog(story_file) as log:
+            test = log.append_block(new_block)
+        if test == 'error':
+            return 'error'
+        print('The newly validated block was appended to '+story_file+'.')
+        return story_file
+    new_file_name = story['0']['block_content']['story_title'].title().replace(' ','')+'_'+str(chapter_number).rjust(3, '0')+'_'+new_block['block_content']['mining_date'].replace(' ','_').replace(':','_').replace('/','_')+'.json'
 
     with open(new_file_name, "w", encoding='utf-8') as outfile:
         json.dump(story, outfile, sort_keys = True, ensure_ascii = False)
     print('The newly validated story was saved in the working directory in '+new_file_name+'.')
+    return new_file_name
 
+def send_story_to_discord(new_file_name, miner_name, send = None):
+    # This sends the newly validated story to the discord server. If send is None, the user is asked first.
+    
     if send == None:
         send = input('Hurray, you validated a new block! Do you want to send it automatically to the discord server (y/n)?')
     if send.lower() in ['y','yes']:
+        if chain_log.is_chain_log(new_file_name):
+            # The story is sent as a story file.
+            new_file_name = chain_log.export_chain_log(new_file_name)
         # Thanks! https://www.reddit.com/r/Discord_Bots/comments/iirmzy/how_to_send_files_using_discord_webhooks_python/
         #Replace the webhook URL with your own
         webhook_url = 'https://discord.com/api/webhooks/1138436079448498176/ErxoQ7gHxjoowu5BNyxxhg9bUGkqK6CtkZzk9xjRoOs2MjyaLpoQkwq_njmhPyYltxIH'
@@ -187,11 +460,179 @@ def mine_chapter(story_file, chapter_file, miner_name, send = None):
     else:
         print('Your newly validated story was not sent to the discord server!')
         print('Quickly, upload it manually at https://discord.gg/wD8zs75tck')
+
+def mine_chapter(story_file, chapter_file, miner_name, send = None, workers = 1, resume = False, progress = None, status_line = False, log_file = None, cancel = None, chain_index = None):
+    # The progress of the mining is reported every second (see get_mining_progress):
+    #    - to the callback 'progress' if provided.
+    #    - on a status line in the terminal if status_line is True.
+    #    - as json lines appended to log_file if provided.
+    # The mining stops when the event 'cancel' is set. The mining session is then saved and can be resumed.
+    # If provided, chain_index is the index of the authors of the story in story_file (see make_chain_index). The mined block is added to it.
+    # If story_file is None, the chapter is added to the canonical story of its title (see block_tree.py).
+    
+    if chapter_file == None:
+        print('2 arguments provided, this validates the genesis block.')
+        genesis = import_json(story_file)
+        if genesis == 'error':
+            return 'error'
+        test = check('intended_mining_time_days' in genesis.keys(), 'The provided file is not a valid genesis block.')
+        if test == 'error':
+            return 'error'
+        test = check(get_block_format(genesis) in [1, 2], 'The \'block_format\' field of the genesis block must be 1 or 2.')
+        if test == 'error':
+            return 'error'
+        if 'difficulty' not in genesis.keys():
+            genesis['difficulty'] = estimate_difficulty(genesis['intended_mining_time_days'], get_block_format(genesis))
+        if 'miner_name' not in genesis.keys():
+            genesis['miner_name'] = miner_name
+        genesis_hash = rsa.compute_hash(json.dumps(genesis, sort_keys = True, ensure_ascii = False).encode('utf8'), 'SHA-256').hex()
+        genesis = {'block_content': genesis.copy()}
+        genesis['hash'] = genesis_hash
+        file_name = genesis['block_content']['story_title'].title().replace(' ','')+'_000_'+genesis['block_content']['mining_date'].replace(' ','_').replace(':','_').replace('/','_')+'.json'
+        with open(file_name, "w", encoding='utf8') as outfile:
+            json.dump({'0': genesis}, outfile, sort_keys = True, ensure_ascii = False)
+        return 'success'
+
+    if len(miner_name) == 0:
+        print('Empty miner name provided.')
+        return 'error'
+    test = check((type(workers) == int) and (workers >= 1), 'The number of workers must be a positive integer.')
+    if test == 'error':
+        return 'error'
+    
+    if story_file == None:
+        signed_chapter_data = import_json(chapter_file)
+        if signed_chapter_data == 'error':
+            return 'error'
+        test = check((type(signed_chapter_data) == dict) and (set(['chapter_data', 'encrypted_hashed_chapter', 'public_key']) == set(signed_chapter_data.keys())), 'The file '+chapter_file+' is not a signed chapter.')
+        if test == 'error':
+            return 'error'
+        test = check((type(signed_chapter_data['chapter_data']) == dict) and (type(signed_chapter_data['chapter_data'].get('story_title')) == str), 'The signed chapter in '+chapter_file+' has no story title.')
+        if test == 'error':
+            return 'error'
+        story_title = signed_chapter_data['chapter_data']['story_title']
+        story_file = block_tree.get_canonical_story_file(story_title)
+        test = check(story_file != None, 'There is no valid story file with the title \''+story_title+'\' in the working directory.')
+        if test == 'error':
+            return 'error'
+        print('Adding the chapter to the canonical story in \''+story_file+'\'.')
+    
+    block_to_mine = prepare_block_to_mine(story_file, chapter_file, miner_name, chain_index)
+    if block_to_mine == 'error':
+        return 'error'
+    story = block_to_mine['story']
+    signed_chapter_data = block_to_mine['signed_chapter_data']
+    genesis = block_to_mine['genesis']
+    new_block = block_to_mine['new_block']
+    difficulty = block_to_mine['difficulty']
+    mining_date_previous_block = block_to_mine['mining_date_previous_block']
+    story_runtime_previous_block = block_to_mine['story_runtime_previous_block']
+
+    # Now perform the actual mining!
+    # It takes about (2)**difficulty tries to find a valid nonce. On my computer, it takes about 0.0001 seconds for each try. difficulty = 23 should take about 10 minutes.
+    # The hash value below which the block hash has to be is set with powers of 2 so that the difficulty is doubled as difficulty increases by 1 (see mining_worker).
+    # The progress of the mining is saved in a session file. It records the random starting point of the nonces, the number of tries (the nonces from the starting point to the starting point plus the number of tries are covered) and the mining time.
+    session_file_name = get_mining_session_file_name(signed_chapter_data)
+    session = {'hash_previous_block': new_block['hash_previous_block'], 'hash_eth': new_block['hash_eth'], 'miner_name': miner_name, 'nonce_base': format(random.getrandbits(256), '064x'), 'nb_tries': 0, 'elapsed_seconds': 0}
+    if resume:
+        if os.path.isfile(session_file_name):
+            session = load_mining_session(session_file_name, new_block)
+            if session == 'error':
+                return 'error'
+            print('Resuming the mining session from '+session_file_name+' after '+str(session['nb_tries'])+' tries and '+str(dt.timedelta(seconds = session['elapsed_seconds']))+'.')
+        else:
+            print('There is no mining session to resume for this chapter. Starting a new one.')
+
+    if len(load_calibration(get_block_format(genesis))) > 0:
+        computer = 'With the hash rate measured on this computer'
+    else:
+        computer = 'On my computer (run \'python mining.py bench\' to measure the hash rate of yours)'
+    print('Start mining (at '+ dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S')+' UTC) with '+str(workers)+' worker(s)! '+computer+', I estimate it to take about '+str(round(time_to_mine_days(difficulty, workers, get_block_format(genesis))*24,3))+' hours to complete.')
+    start_time = get_now()
+    previous_elapsed_seconds = session['elapsed_seconds']
+
+    def checkpoint(nb_tries):
+        session['nb_tries'] = nb_tries
+        session['elapsed_seconds'] = previous_elapsed_seconds + (get_now()-start_time).total_seconds()
+        save_mining_session(session_file_name, session)
+
+    checkpoint(session['nb_tries'])
+
+    progress_callbacks = []
+    if progress is not None:
+        progress_callbacks.append(progress)
+    if status_line:
+        progress_callbacks.append(print_mining_status_line)
+    if log_file is not None:
+        progress_callbacks.append(make_mining_log(log_file))
+    def report_progress(report):
+        for callback in progress_callbacks:
+            callback(report)
+
+    mined = mine_block(new_block, genesis, difficulty, mining_date_previous_block, story_runtime_previous_block, workers, nonce_base = int(session['nonce_base'], 16), first_try = session['nb_tries'], checkpoint = checkpoint, progress = report_progress if len(progress_callbacks) > 0 else None, cancel = cancel)
+    if status_line:
+        # End the status line.
+        print()
+    if mined == 'error':
+        print('The mining session was saved in '+session_file_name+'. Run the mining again with the option \'--resume\' to continue it.')
+        return 'error'
+    new_block, new_hash = mined
+    nb_tries = new_block['nb_tries']
+    test = check(check_hash(new_hash.hex(), new_block, get_block_format(genesis)), 'The hash of the mined block does not match its content. The block template is not serialized like the block.')
+    if test == 'error':
+        return 'error'
+    if os.path.isfile(session_file_name):
+        os.remove(session_file_name)
+
+    try_time = get_now()-start_time+dt.timedelta(seconds = previous_elapsed_seconds)
+    print('The mining took',nb_tries,'tries and',str(try_time)+'. This is',try_time/nb_tries,'per try.')
+    new_file_name = save_mined_story(story, new_block, new_hash, block_to_mine['story_file'])
+    if new_file_name == 'error':
+        return 'error'
+    add_block_to_chain_index(block_to_mine['chain_index'], signed_chapter_data['chapter_data']['chapter_number'], signed_chapter_data)
+    send_story_to_discord(new_file_name, miner_name, send)
         
 ################################# The program starts here ################################################
 
 if __name__ == "__main__":
-    if (len(sys.argv) == 3) or (len(sys.argv) == 2):
+    workers = pop_option(sys.argv, '--workers')
+    if workers == 'error':
+        sys.exit()
+    if (workers is not None) and ((not workers.isdigit()) or (int(workers) == 0)):
+        print('The number of workers must be a positive integer.')
+        sys.exit()
+    resume = pop_flag(sys.argv, '--resume')
+    canonical = pop_flag(sys.argv, '--canonical')
+    log_file = pop_option(sys.argv, '--log')
+    if log_file == 'error':
+        sys.exit()
+    if (len(sys.argv) >= 2) and (sys.argv[1] == 'bench'):
+        # Calibration of the hash rate. By default, all the cores are used.
+        duration = pop_option(sys.argv, '--seconds', '5')
+        if duration == 'error':
+            sys.exit()
+        try:
+            duration = float(duration)
+        except ValueError:
+            duration = 0
+        if not duration > 0:
+            print('The duration of the measure must be a positive number of seconds.')
+            sys.exit()
+        if workers is not None:
+            workers = int(workers)
+        status = calibrate(workers, duration)
+        print(status)
+        sys.exit()
+    if workers is None:
+        workers = '1'
+    if canonical:
+        # The story is the canonical story of the title of the signed chapter.
+        if len(sys.argv) != 3:
+            print('Usage: python mining.py --canonical signed_chapter_file miner_name')
+            sys.exit()
+        status = mine_chapter(None, sys.argv[1], sys.argv[2], workers = int(workers), resume = resume, status_line = True, log_file = log_file)
+        print(status)
+    elif (len(sys.argv) == 3) or (len(sys.argv) == 2):
         genesis_file_name = sys.argv[1]
         genesis = import_json(genesis_file_name)
         if 'miner_name' not in genesis.keys():
@@ -204,5 +645,5 @@ if __name__ == "__main__":
         story_file = sys.argv[1]
         signed_chapter_file = sys.argv[2]
         miner_name = sys.argv[3]
-        status = mine_chapter(story_file, signed_chapter_file, miner_name)
+        status = mine_chapter(story_file, signed_chapter_file, miner_name, workers = int(workers), resume = resume, status_line = True, log_file = log_file)
         print(status)
\ No newline at end of file
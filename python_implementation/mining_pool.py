@@ -0,0 +1,293 @@
+# -----------------------------------------------------------
+# Mine a chapter with several computers
+#
+# A coordinator prepares the block to mine exactly like mining.py does (same checks, same ETH block hash, same difficulty) and waits for workers on a TCP port.
+# Each worker receives the block and then asks for disjoint ranges of try numbers. The nonce of try number n is nonce_base + n (see mining_worker), so that the workers never try the same nonce twice.
+# The workers mine their range with all their processes (see mine_block) and report their progress (number of tries, hash rate and lowest hash) to the coordinator as shares.
+# When a worker finds a valid nonce, it sends the block to the coordinator. The coordinator checks it, tells all the workers to stop and saves the story exactly like mining.py does.
+# The ranges of the workers that disconnect before finishing them are handed out again.
+# The messages are json objects, one per line: 'hello', 'job', 'get_range', 'range', 'share', 'found' and 'stop'.
+#
+# Start the coordinator with:
+#    python mining_pool.py coordinator story_file signed_chapter_file miner_name [--host 0.0.0.0] [--port 8765] [--range-size 10000000] [--send yes/no] [--log file_name]
+# and the workers (on the same computer or on others) with:
+#    python mining_pool.py worker coordinator_host [--port 8765] [--workers N]
+# The miner name of the coordinator is the one written in the block.
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import json
+import sys
+import os
+import socket
+import asyncio
+import functools
+import threading
+import random
+import time
+import datetime as dt
+import pytz
+
+from blockchain_functions import *
+from mining import *
+
+default_port = 8765
+# The lines of the messages contain a whole chapter. This is the largest accepted line (in bytes).
+message_limit = 2**24
+
+async def send_message(writer, message):
+    # This sends one message as a json line.
+
+    writer.write(json.dumps(message, sort_keys = True, ensure_ascii = False).encode('utf8')+b'\n')
+    await writer.drain()
+
+def check_pool_result(block_to_mine, found_block, found_hash):
+    # This checks the block found by a worker: the block must be the one handed out with valid mining fields and its hash must be correct and small enough.
+
+    new_block = block_to_mine['new_block']
+    genesis = block_to_mine['genesis']
+    test = check(type(found_block) == dict and (set(found_block.keys()) == set(new_block.keys()) | set(mining_fields)), 'The block found by the worker does not have the right fields.')
+    if test == 'error':
+        return 'error'
+    test = check(all([found_block[key] == new_block[key] for key in new_block.keys()]), 'The block found by the worker is not the block handed out.')
+    if test == 'error':
+        return 'error'
+    try:
+        mining_date = pytz.utc.localize(dt.datetime.strptime(found_block['mining_date'], '%Y/%m/%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        print('The mining date of the block found by the worker is not valid.')
+        return 'error'
+    test = check(mining_date <= get_now() + dt.timedelta(minutes = 1), 'The block found by the worker is mined in the future.')
+    if test == 'error':
+        return 'error'
+    expected_block = set_new_block_difficulty_and_mining_date(new_block.copy(), genesis, block_to_mine['difficulty'], block_to_mine['mining_date_previous_block'], block_to_mine['story_runtime_previous_block'], mining_date)
+    test = check((found_block['difficulty'] == expected_block['difficulty']) and (found_block['story_runtime_seconds'] == expected_block['story_runtime_seconds']), 'The difficulty or the story runtime of the block found by the worker are not valid.')
+    if test == 'error':
+        return 'error'
+    test = check(check_hash(found_hash, found_block, get_block_format(genesis)), 'The hash of the block found by the worker does not match its content.')
+    if test == 'error':
+        return 'error'
+    test = check(int(found_hash, 16) <= 2**(256-block_to_mine['difficulty'])-1, 'The hash of the block found by the worker is too large.')
+    if test == 'error':
+        return 'error'
+    return 'success'
+
+async def run_coordinator(block_to_mine, host, port, range_size, progress = None):
+    # This hands out the block and the ranges of tries to the workers until one of them finds a valid nonce. It returns the mined block and its hash (as bytes).
+    # progress(report) is called at most every second with the report of get_mining_progress, summed over all the workers.
+
+    new_block = block_to_mine['new_block']
+    job = {'type': 'job', 'new_block': new_block, 'genesis': block_to_mine['genesis'], 'difficulty': block_to_mine['difficulty'],
+           'mining_date_previous_block': dt.datetime.strftime(block_to_mine['mining_date_previous_block'], '%Y/%m/%d %H:%M:%S'),
+           'story_runtime_previous_block': block_to_mine['story_runtime_previous_block'], 'nonce_base': format(random.getrandbits(256), '064x')}
+    state = {'next_try': 0, 'free_ranges': [], 'nb_tries': 0, 'best_hash': bytes(32*[255]), 'mined': None, 'writers': set(), 'tasks': set()}
+    start_time = time.time()
+    last_sample = [start_time, 0]
+    done = asyncio.Event()
+
+    def report_share(message):
+        state['nb_tries'] += message['nb_tries']
+        if bytes.fromhex(message['best_hash']) < state['best_hash']:
+            state['best_hash'] = bytes.fromhex(message['best_hash'])
+        now = time.time()
+        if (progress is not None) and (now - last_sample[0] >= 1):
+            progress(get_mining_progress(block_to_mine['difficulty'], state['nb_tries'], state['nb_tries'] - last_sample[1], state['best_hash'], now - start_time, now - last_sample[0]))
+            last_sample[:] = [now, state['nb_tries']]
+
+    async def handle_worker(reader, writer):
+        peer = writer.get_extra_info('peername')
+        current_range = None
+        state['writers'].add(writer)
+        state['tasks'].add(asyncio.current_task())
+        try:
+            hello = json.loads(await reader.readline())
+            print('\nWorker '+str(hello.get('host'))+' '+str(peer)+' joined with '+str(hello.get('workers'))+' process(es).')
+            await send_message(writer, job)
+            while not done.is_set():
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+                message = json.loads(line)
+                if message['type'] == 'get_range':
+                    # The previous range (if any) was fully tried.
+                    if len(state['free_ranges']) > 0:
+                        current_range = state['free_ranges'].pop()
+                    else:
+                        current_range = (state['next_try'], state['next_try'] + range_size)
+                        state['next_try'] += range_size
+                    await send_message(writer, {'type': 'range', 'first_try': current_range[0], 'last_try': current_range[1]})
+                elif message['type'] == 'share':
+                    report_share(message)
+                elif message['type'] == 'found':
+                    test = check_pool_result(block_to_mine, message['block_content'], message['hash'])
+                    if test == 'error':
+                        print('\nThe block sent by worker '+str(peer)+' was refused.')
+                        continue
+                    state['mined'] = (message['block_content'], bytes.fromhex(message['hash']))
+                    current_range = None
+                    done.set()
+        except (ConnectionError, json.JSONDecodeError, KeyError, ValueError) as error:
+            print('\nThe connection with worker '+str(peer)+' failed: '+str(error))
+        finally:
+            if (current_range is not None) and (not done.is_set()):
+                # Hand out the unfinished range to the next worker.
+                state['free_ranges'].append(current_range)
+            if not done.is_set():
+                print('\nWorker '+str(peer)+' left.')
+                state['writers'].discard(writer)
+                writer.close()
+
+    server = await asyncio.start_server(handle_worker, host, port, limit = message_limit)
+    print('The coordinator is waiting for workers on '+host+':'+str(port)+'.')
+    async with server:
+        await done.wait()
+        # Tell all the workers to stop.
+        for writer in list(state['writers']):
+            try:
+                await send_message(writer, {'type': 'stop'})
+                writer.close()
+            except ConnectionError:
+                pass
+        # The connections are closed, so the other workers' handlers finish.
+        await asyncio.wait(state['tasks'], timeout = 5)
+    return state['mined']
+
+def mine_chapter_with_pool(story_file, chapter_file, miner_name, host = '0.0.0.0', port = default_port, range_size = 10000000, send = None, log_file = None):
+    # This is the coordinator. It mines the chapter like mine_chapter, but the tries are performed by the workers that connect to it.
+
+    if len(miner_name) == 0:
+        print('Empty miner name provided.')
+        return 'error'
+    block_to_mine = prepare_block_to_mine(story_file, chapter_file, miner_name)
+    if block_to_mine == 'error':
+        return 'error'
+
+    progress_callbacks = [print_mining_status_line]
+    if log_file is not None:
+        progress_callbacks.append(make_mining_log(log_file))
+    def report_progress(report):
+        for callback in progress_callbacks:
+            callback(report)
+
+    print('Start mining (at '+ dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S')+' UTC) with the mining pool.')
+    start_time = get_now()
+    try:
+        mined = asyncio.run(run_coordinator(block_to_mine, host, port, range_size, report_progress))
+    except KeyboardInterrupt:
+        print('\nThe mining pool was interrupted.')
+        return 'error'
+    except OSError as error:
+        print('The coordinator could not listen on '+host+':'+str(port)+': '+str(error))
+        return 'error'
+    print()
+    new_block, new_hash = mined
+    print('The mining took',new_block['nb_tries'],'tries and',str(get_now()-start_time)+'.')
+    new_file_name = save_mined_story(block_to_mine['story'], new_block, new_hash, block_to_mine['story_file'])
+    if new_file_name == 'error':
+        return 'error'
+    send_story_to_discord(new_file_name, miner_name, send)
+    return 'success'
+
+async def run_worker(host, port, workers):
+    # This connects to the coordinator and mines the ranges of tries it hands out until it says to stop.
+
+    try:
+        reader, writer = await asyncio.open_connection(host, port, limit = message_limit)
+    except OSError as error:
+        print('Could not connect to the coordinator at '+host+':'+str(port)+': '+str(error))
+        return 'error'
+    await send_message(writer, {'type': 'hello', 'host': socket.gethostname(), 'workers': workers})
+    line = await reader.readline()
+    if len(line) == 0:
+        print('The coordinator closed the connection.')
+        return 'error'
+    job = json.loads(line)
+    genesis = job['genesis']
+    mining_date_previous_block = pytz.utc.localize(dt.datetime.strptime(job['mining_date_previous_block'], '%Y/%m/%d %H:%M:%S'))
+    nonce_base = int(job['nonce_base'], 16)
+    print('Mining chapter '+str(job['new_block']['signed_chapter_data']['chapter_data']['chapter_number'])+' of '+genesis['story_title']+' with '+str(workers)+' process(es).')
+
+    # The messages of the coordinator are read in the background, so that a 'stop' cancels the current range right away.
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    messages = asyncio.Queue()
+    async def listen():
+        while True:
+            line = await reader.readline()
+            if len(line) == 0:
+                message = {'type': 'stop'}
+            else:
+                message = json.loads(line)
+            if message['type'] == 'stop':
+                cancel.set()
+                await messages.put(message)
+                return
+            await messages.put(message)
+    listener = asyncio.create_task(listen())
+
+    status = 'success'
+    try:
+        while not cancel.is_set():
+            await send_message(writer, {'type': 'get_range'})
+            message = await messages.get()
+            if message['type'] == 'stop':
+                break
+            first_try = message['first_try']
+            last_try = message['last_try']
+            reported = [first_try]
+            def share(report):
+                # This runs in the mining thread.
+                asyncio.run_coroutine_threadsafe(send_message(writer, {'type': 'share', 'nb_tries': report['nb_tries'] - reported[0], 'best_hash': report['best_hash'], 'hashes_per_second': report['hashes_per_second']}), loop)
+                reported[0] = report['nb_tries']
+            mined = await loop.run_in_executor(None, functools.partial(mine_block, job['new_block'], genesis, job['difficulty'], mining_date_previous_block, job['story_runtime_previous_block'], workers,
+                                                                       nonce_base = nonce_base, first_try = first_try, last_try = last_try, progress = share, cancel = cancel))
+            if mined == 'exhausted':
+                await send_message(writer, {'type': 'share', 'nb_tries': last_try - reported[0], 'best_hash': 64*'f', 'hashes_per_second': 0})
+            elif mined == 'error':
+                if not cancel.is_set():
+                    status = 'error'
+                break
+            else:
+                new_block, new_hash = mined
+                print('Found a valid nonce after try '+str(new_block['nb_tries'])+'.')
+                await send_message(writer, {'type': 'found', 'block_content': new_block, 'hash': new_hash.hex()})
+    except ConnectionError as error:
+        print('The connection with the coordinator failed: '+str(error))
+        status = 'error'
+    finally:
+        cancel.set()
+        listener.cancel()
+        writer.close()
+    if status == 'success':
+        print('The coordinator stopped the mining.')
+    return status
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    port = pop_option(sys.argv, '--port', str(default_port))
+    workers = pop_option(sys.argv, '--workers', str(os.cpu_count()))
+    host = pop_option(sys.argv, '--host', '0.0.0.0')
+    range_size = pop_option(sys.argv, '--range-size', '10000000')
+    send = pop_option(sys.argv, '--send')
+    log_file = pop_option(sys.argv, '--log')
+    if 'error' in [port, workers, host, range_size, send, log_file]:
+        sys.exit()
+    for name, value in [('port', port), ('number of workers', workers), ('range size', range_size)]:
+        if (not value.isdigit()) or (int(value) == 0):
+            print('The '+name+' must be a positive integer.')
+            sys.exit()
+    if (len(sys.argv) == 3) and (sys.argv[1] == 'worker'):
+        try:
+            status = asyncio.run(run_worker(sys.argv[2], int(port), int(workers)))
+        except KeyboardInterrupt:
+            status = 'The worker was interrupted.'
+        print(status)
+    elif (len(sys.argv) == 5) and (sys.argv[1] == 'coordinator'):
+        status = mine_chapter_with_pool(sys.argv[2], sys.argv[3], sys.argv[4], host, int(port), int(range_size), send, log_file)
+        print(status)
+    else:
+        print('Usage:')
+        print('    python mining_pool.py coordinator story_file signed_chapter_file miner_name [--host 0.0.0.0] [--port 8765] [--range-size 10000000] [--send yes/no] [--log file_name]')
+        print('    python mining_pool.py worker coordinator_host [--port 8765] [--workers N]')
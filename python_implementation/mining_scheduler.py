@@ -0,0 +1,328 @@
+# -----------------------------------------------------------
+# Queue of mining jobs sharing the processor cores of one computer
+#
+# A mining job is one signed chapter to add to one validated story (like one run of mining.py). The jobs are kept in the file mining_jobs.queue in the working directory, so that a restart of the scheduler resumes the queue.
+# The scheduler runs the jobs in separate processes (with the mining session resumed, see mine_chapter) and makes sure that:
+#    - at most max_cores processor cores are used by all the running jobs together,
+#    - the jobs with the highest priority run first. A queued job with a higher priority than a running one stops it (its mining session is saved and it is queued again),
+#    - each job runs with its own nice level (lower priority for the operating system) and only during its optional daily time window (for example '22:00-06:00', local time),
+#    - as soon as a block is mined on top of the story tip of a job (by this scheduler or by anyone else, as soon as the validated story file is in the working directory), the other jobs for the same tip are cancelled.
+# The messages of each job are written to mining_job_[id].log.
+#
+# Use it with:
+#    python mining_scheduler.py add story_file signed_chapter_file miner_name [--priority P] [--workers N] [--nice N] [--window HH:MM-HH:MM] [--send yes/no]
+#    python mining_scheduler.py list
+#    python mining_scheduler.py remove job_id
+#    python mining_scheduler.py run [--max-cores N]
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import json
+import sys
+import os
+import glob
+import time
+import signal
+import datetime as dt
+import multiprocessing as mp
+
+from blockchain_functions import *
+from mining import *
+
+jobs_file_name = 'mining_jobs.queue'
+# The working directory is searched for newly mined blocks every so many seconds.
+scan_interval = 10
+
+def load_jobs():
+    # This returns the dictionary of the jobs indexed by their id (as strings).
+
+    return load_json_file(jobs_file_name)
+
+def update_jobs(function):
+    # This applies function(jobs) to the jobs file. The scheduler and the commands 'add' and 'remove' can run at the same time (see update_json_file).
+
+    return update_json_file(jobs_file_name, function, indent = 4)
+
+def parse_time_window(window):
+    # This turns 'HH:MM-HH:MM' into two datetime.time objects or returns 'error'.
+
+    try:
+        start, end = window.split('-')
+        return dt.datetime.strptime(start, '%H:%M').time(), dt.datetime.strptime(end, '%H:%M').time()
+    except ValueError:
+        print('The time window must be given as HH:MM-HH:MM.')
+        return 'error'
+
+def in_time_window(window, now = None):
+    # This tells if the local time is inside the daily time window. The window can go past midnight (for example '22:00-06:00').
+
+    if window is None:
+        return True
+    if now is None:
+        now = dt.datetime.now().time()
+    start, end = parse_time_window(window)
+    if start <= end:
+        return start <= now < end
+    return (now >= start) or (now < end)
+
+def add_job(story_file, chapter_file, miner_name, priority = 0, workers = 1, nice = 0, window = None, send = 'no'):
+    # This adds a job to the queue and returns its id. The tip of the story (the hash of its last block) is recorded to find the other jobs for the same block.
+
+    if len(miner_name) == 0:
+        print('Empty miner name provided.')
+        return 'error'
+    test = check((type(workers) == int) and (workers >= 1), 'The number of workers must be a positive integer.')
+    if test == 'error':
+        return 'error'
+    if (window is not None) and (parse_time_window(window) == 'error'):
+        return 'error'
+    story = import_json(story_file)
+    if story == 'error':
+        return 'error'
+    signed_chapter_data = import_json(chapter_file)
+    if signed_chapter_data == 'error':
+        return 'error'
+    last_block_number = max([int(n) for n in story.keys()])
+    chapter_number = signed_chapter_data['chapter_data']['chapter_number']
+    test = check(chapter_number == last_block_number + 1, 'The chapter number of the block to add is not the last chapter number of the story.')
+    if test == 'error':
+        return 'error'
+    genesis = story['0']['block_content']
+    job = {'story_file': story_file, 'chapter_file': chapter_file, 'miner_name': miner_name, 'priority': priority, 'workers': workers, 'nice': nice, 'window': window, 'send': send,
+           'story_prefix': genesis['story_title'].title().replace(' ',''), 'chapter_number': chapter_number, 'tip': story[str(last_block_number)]['hash'],
+           'difficulty': story[str(last_block_number)]['block_content']['difficulty'], 'block_format': get_block_format(genesis),
+           'state': 'queued', 'reason': '', 'added': dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S')}
+
+    def add(jobs):
+        job_id = str(max([int(n) for n in jobs.keys()] + [0]) + 1)
+        jobs[job_id] = job
+        return job_id
+    return update_jobs(add)
+
+def remove_job(job_id):
+    # This cancels a job. A running job is stopped by the scheduler (its mining session is kept).
+
+    def remove(jobs):
+        if job_id not in jobs.keys():
+            print('There is no job '+job_id+' in the queue.')
+            return 'error'
+        if jobs[job_id]['state'] in ['queued', 'running']:
+            jobs[job_id]['state'] = 'cancelled'
+            jobs[job_id]['reason'] = 'removed from the queue'
+        return 'success'
+    return update_jobs(remove)
+
+def set_job_state(job_id, state, reason = ''):
+    # This records the new state of a job.
+
+    def set_state(jobs):
+        if job_id in jobs.keys():
+            jobs[job_id]['state'] = state
+            jobs[job_id]['reason'] = reason
+    return update_jobs(set_state)
+
+def print_jobs(jobs):
+    # This prints the queue, one job per line.
+
+    if len(jobs) == 0:
+        print('The mining queue is empty.')
+    for job_id in sorted(jobs.keys(), key = int):
+        job = jobs[job_id]
+        line = job_id.rjust(4)+' '+job['state'].ljust(9)+' priority '+str(job['priority'])+', '+str(job['workers'])+' worker(s), nice '+str(job['nice'])
+        if job['window'] is not None:
+            line = line+', window '+job['window']
+        line = line+': '+job['chapter_file']+' on '+job['story_file']
+        if len(job['reason']) > 0:
+            line = line+' ('+job['reason']+')'
+        print(line)
+
+def find_mined_block(job):
+    # This looks in the working directory for a validated story containing a block mined on top of the tip of the job. It returns the file name or None.
+    # Only the hash of that block is checked (it must match the block and the difficulty), not the whole story.
+
+    for file_name in glob.glob(job['story_prefix']+'_*.json'):
+        block_number = file_name[len(job['story_prefix'])+1:].split('_')[0]
+        if (not block_number.isdigit()) or (int(block_number) < job['chapter_number']):
+            continue
+        try:
+            with open(file_name, encoding='utf-8') as infile:
+                block = json.load(infile)[str(job['chapter_number'])]
+            if block['block_content']['hash_previous_block'] != job['tip']:
+                continue
+            if check_hash(block['hash'], block['block_content'], job['block_format']) and (int(block['hash'], 16) <= 2**(256-job['difficulty'])-1):
+                return file_name
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+    return None
+
+def remove_mining_session(job):
+    # This removes the mining session of a job whose block was mined by someone else. It can not be resumed anymore.
+
+    signed_chapter_data = import_json(job['chapter_file'], False)
+    if signed_chapter_data == 'error':
+        return
+    session_file_name = get_mining_session_file_name(signed_chapter_data)
+    if os.path.isfile(session_file_name):
+        os.remove(session_file_name)
+
+def run_mining_job(job_id, job, cancel):
+    # This runs in the process of a job. The mining session of the chapter is always resumed, so that a stopped job continues where it stopped.
+
+    # The scheduler stops the jobs through the event 'cancel'.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if (job['nice'] != 0) and hasattr(os, 'nice'):
+        os.nice(job['nice'])
+    sys.stdout = open('mining_job_'+job_id+'.log', "a", encoding='utf-8', buffering = 1)
+    print('Job '+job_id+' started at '+dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S')+' UTC.')
+    status = mine_chapter(job['story_file'], job['chapter_file'], job['miner_name'], send = job['send'], workers = job['workers'], resume = True, cancel = cancel)
+    print(status)
+    sys.exit(1 if status == 'error' else 0)
+
+def run_scheduler(max_cores = None, poll_interval = 1):
+    # This runs the jobs of the queue until it is empty. The jobs added or removed in the meantime (with the other commands) are taken into account.
+
+    if max_cores is None:
+        max_cores = os.cpu_count()
+    # The jobs that were running when the scheduler stopped are queued again. Their mining session is resumed.
+    def requeue(jobs):
+        for job in jobs.values():
+            if job['state'] == 'running':
+                job['state'] = 'queued'
+    if update_jobs(requeue) == 'error':
+        return 'error'
+
+    # Each running job is stored with its process, its cancel event and the reason why it was stopped (if it was).
+    running = {}
+    last_scan = 0
+    print('The scheduler runs the mining queue with at most '+str(max_cores)+' core(s).')
+    try:
+        while True:
+            # Record the jobs that finished.
+            jobs = load_jobs()
+            for job_id in list(running.keys()):
+                process, cancel, stop = running[job_id]
+                if process.is_alive():
+                    continue
+                process.join()
+                del running[job_id]
+                if stop is not None:
+                    state = 'queued' if stop in ['preempted', 'outside of its time window'] else 'cancelled'
+                    set_job_state(job_id, state, stop)
+                    if stop.startswith('block already mined'):
+                        remove_mining_session(jobs[job_id])
+                elif process.exitcode == 0:
+                    set_job_state(job_id, 'mined')
+                    print('Job '+job_id+' mined its block.')
+                    last_scan = 0
+                else:
+                    set_job_state(job_id, 'failed', 'see mining_job_'+job_id+'.log')
+                    print('Job '+job_id+' failed (see mining_job_'+job_id+'.log).')
+            jobs = load_jobs()
+
+            def stop_job(job_id, stop):
+                if running[job_id][2] is None:
+                    print('Stopping job '+job_id+' ('+stop+').')
+                    running[job_id] = (running[job_id][0], running[job_id][1], stop)
+                    running[job_id][1].set()
+
+            # Stop the running jobs that were removed or are outside of their time window.
+            for job_id in running.keys():
+                if (job_id not in jobs.keys()) or (jobs[job_id]['state'] != 'running'):
+                    stop_job(job_id, 'removed from the queue')
+                elif not in_time_window(jobs[job_id]['window']):
+                    stop_job(job_id, 'outside of its time window')
+
+            # Cancel the jobs whose block was mined by another job (or by someone else).
+            if time.time() - last_scan > scan_interval:
+                last_scan = time.time()
+                for job_id, job in jobs.items():
+                    if job['state'] not in ['queued', 'running']:
+                        continue
+                    mined_file = find_mined_block(job)
+                    if mined_file is None:
+                        continue
+                    if job_id in running.keys():
+                        stop_job(job_id, 'block already mined in '+mined_file)
+                    else:
+                        set_job_state(job_id, 'cancelled', 'block already mined in '+mined_file)
+                        remove_mining_session(job)
+                jobs = load_jobs()
+
+            queued = [job_id for job_id in jobs.keys() if jobs[job_id]['state'] == 'queued']
+            if (len(queued) == 0) and (len(running) == 0):
+                print('The mining queue is empty.')
+                return 'success'
+
+            # Start the queued jobs by decreasing priority (and in the order they were added).
+            free_cores = max_cores - sum([min(jobs[job_id]['workers'], max_cores) for job_id in running.keys() if job_id in jobs.keys()])
+            for job_id in sorted(queued, key = lambda job_id: (-jobs[job_id]['priority'], int(job_id))):
+                job = jobs[job_id]
+                if not in_time_window(job['window']):
+                    continue
+                cores = min(job['workers'], max_cores)
+                if cores <= free_cores:
+                    job = dict(job, workers = cores)
+                    cancel = mp.Event()
+                    process = mp.Process(target = run_mining_job, args = (job_id, job, cancel))
+                    process.start()
+                    running[job_id] = (process, cancel, None)
+                    set_job_state(job_id, 'running')
+                    print('Started job '+job_id+' with '+str(cores)+' worker(s).')
+                    free_cores -= cores
+                    continue
+                # Stop running jobs with a lower priority to make room. The job starts once they are stopped.
+                lower = sorted([other for other in running.keys() if (running[other][2] is None) and (jobs[other]['priority'] < job['priority'])], key = lambda other: jobs[other]['priority'])
+                freed_cores = 0
+                to_stop = []
+                for other in lower:
+                    if free_cores + freed_cores >= cores:
+                        break
+                    to_stop.append(other)
+                    freed_cores += min(jobs[other]['workers'], max_cores)
+                if free_cores + freed_cores >= cores:
+                    for other in to_stop:
+                        stop_job(other, 'preempted')
+                # The jobs with a lower priority wait for this one.
+                break
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print('The scheduler was interrupted. The running jobs are stopped and will be resumed at the next start.')
+        for job_id in running.keys():
+            running[job_id][1].set()
+        for job_id in running.keys():
+            running[job_id][0].join()
+            set_job_state(job_id, 'queued', 'scheduler interrupted')
+        return 'error'
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    options = {}
+    for name, default in [('--priority', '0'), ('--workers', '1'), ('--nice', '0'), ('--window', None), ('--send', 'no'), ('--max-cores', None)]:
+        options[name] = pop_option(sys.argv, name, default)
+        if options[name] == 'error':
+            sys.exit()
+    for name in ['--priority', '--workers', '--nice', '--max-cores']:
+        if (options[name] is not None) and (not options[name].lstrip('-').isdigit()):
+            print('The option '+name+' must be an integer.')
+            sys.exit()
+    if (len(sys.argv) == 5) and (sys.argv[1] == 'add'):
+        status = add_job(sys.argv[2], sys.argv[3], sys.argv[4], int(options['--priority']), int(options['--workers']), int(options['--nice']), options['--window'], options['--send'])
+        if status != 'error':
+            print('Added job '+status+' to the mining queue.')
+    elif (len(sys.argv) == 2) and (sys.argv[1] == 'list'):
+        print_jobs(load_jobs())
+    elif (len(sys.argv) == 3) and (sys.argv[1] == 'remove'):
+        status = remove_job(sys.argv[2])
+        print(status)
+    elif (len(sys.argv) == 2) and (sys.argv[1] == 'run'):
+        max_cores = options['--max-cores']
+        status = run_scheduler(None if max_cores is None else int(max_cores))
+        print(status)
+    else:
+        print('Usage:')
+        print('    python mining_scheduler.py add story_file signed_chapter_file miner_name [--priority P] [--workers N] [--nice N] [--window HH:MM-HH:MM] [--send yes/no]')
+        print('    python mining_scheduler.py list')
+        print('    python mining_scheduler.py remove job_id')
+        print('    python mining_scheduler.py run [--max-cores N]')
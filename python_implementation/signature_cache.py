@@ -0,0 +1,109 @@
+# -----------------------------------------------------------
+# Cache of the signature checks of the signed chapters
+#
+# Checking the RSA signature of a signed chapter is slow and the same signed chapter is checked many times: by checks.py on the signed chapter file, by mining.py before the mining, by checks.py again in each story that contains it and by gui.py.
+# The result of each check is kept, keyed by the SHA-256 hash of the SHA-256 hashes of the chapter data, of the signature and of the public key. The key depends on the whole content that is checked, so that a modified chapter, signature or key is a new key and the cache never needs to be invalidated.
+# The results are kept in memory and in the SQLite database signatures.cache in the working directory, which is shared by all the scripts. Set the environment variable SIGNATURE_CACHE_FILE to use another file, or to an empty value to keep the results in memory only.
+#
+# Inspect or clear the cache with:
+#    python signature_cache.py show
+#    python signature_cache.py clear
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+
+signature_cache_file_name = os.environ.get('SIGNATURE_CACHE_FILE', 'signatures.cache')
+# The results already known in this process, by key.
+known_signatures = {}
+
+def get_signature_key(signed_chapter_data):
+    # This returns the cache key of a signed chapter: the hash of the hashes of the serialised chapter data (as signed), of the signature and of the public key.
+    # Each field is hashed separately, so that moving bytes from the end of the signature to the start of the public key gives another key.
+
+    clear_chapter_data = json.dumps(signed_chapter_data['chapter_data'], ensure_ascii = False, sort_keys = True).encode('utf8')
+    key = hashlib.sha256()
+    key.update(hashlib.sha256(clear_chapter_data).digest())
+    key.update(hashlib.sha256(bytes.fromhex(signed_chapter_data['encrypted_hashed_chapter'])).digest())
+    key.update(hashlib.sha256(bytes.fromhex(signed_chapter_data['public_key'])).digest())
+    return key.hexdigest()
+
+def connect_signature_cache():
+    # This opens the cache and creates its table if needed.
+
+    connection = sqlite3.connect(signature_cache_file_name, timeout = 30)
+    connection.execute('CREATE TABLE IF NOT EXISTS signatures (signature_key TEXT PRIMARY KEY, valid INTEGER NOT NULL)')
+    return connection
+
+def get_cached_signature(signature_key):
+    # This returns the recorded result (True or False) of the signature check or None if the signature was never checked.
+
+    if signature_key in known_signatures.keys():
+        return known_signatures[signature_key]
+    if (len(signature_cache_file_name) == 0) or (not os.path.isfile(signature_cache_file_name)):
+        return None
+    try:
+        connection = connect_signature_cache()
+        try:
+            row = connection.execute('SELECT valid FROM signatures WHERE signature_key = ?', (signature_key,)).fetchone()
+        finally:
+            connection.close()
+    except sqlite3.Error as error:
+        print('The signature cache '+signature_cache_file_name+' could not be read: '+str(error))
+        return None
+    if row is None:
+        return None
+    known_signatures[signature_key] = (row[0] == 1)
+    return known_signatures[signature_key]
+
+def cache_signatures(results):
+    # This records the results of several signature checks (a dictionary signature key -> True or False).
+
+    known_signatures.update(results)
+    if (len(signature_cache_file_name) == 0) or (len(results) == 0):
+        return
+    try:
+        connection = connect_signature_cache()
+        try:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO signatures VALUES (?, ?)', [(signature_key, int(valid)) for signature_key, valid in results.items()])
+        finally:
+            connection.close()
+    except sqlite3.Error as error:
+        print('The signature cache '+signature_cache_file_name+' could not be updated: '+str(error))
+
+def show_signature_cache():
+    # This prints the number of recorded signature checks.
+
+    if (len(signature_cache_file_name) == 0) or (not os.path.isfile(signature_cache_file_name)):
+        print('The signature cache is empty.')
+        return
+    connection = connect_signature_cache()
+    try:
+        nb_valid, nb_invalid = [connection.execute('SELECT COUNT(*) FROM signatures WHERE valid = ?', (valid,)).fetchone()[0] for valid in [1, 0]]
+    finally:
+        connection.close()
+    print(signature_cache_file_name+' contains '+str(nb_valid)+' valid and '+str(nb_invalid)+' invalid signature(s).')
+
+def clear_signature_cache():
+    # This forgets all the recorded signature checks.
+
+    known_signatures.clear()
+    if (len(signature_cache_file_name) > 0) and os.path.isfile(signature_cache_file_name):
+        os.remove(signature_cache_file_name)
+    print('The signature cache is cleared.')
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    if (len(sys.argv) == 2) and (sys.argv[1] == 'show'):
+        show_signature_cache()
+    elif (len(sys.argv) == 2) and (sys.argv[1] == 'clear'):
+        clear_signature_cache()
+    else:
+        print('Usage: python signature_cache.py show|clear')
@@ -0,0 +1,154 @@
+# -----------------------------------------------------------
+# Reading of the story files one block at a time
+#
+# A story file is a JSON object with one entry per block. The blocks are written with sorted keys ('0', '1', '10', '11', ..., '2', ...), so that they are not in block order in the file.
+# index_story_file scans the file once, without decoding it, and records where each block starts and ends. The blocks can then be read one by one in block order (see iter_story_blocks), so that only one block is in memory at a time.
+# This is used by checks.py to check long stories with a bounded memory (see check_story_stream). StoryFileReader reads the blocks like a chain log (see chain_log.py), so that both are checked in the same way.
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import re
+import json
+
+# The characters that change the structure of the file (inside a string, only '"' and '\' matter).
+story_structure_pattern = re.compile(rb'["\\{}\[\]]')
+# What may come between a key and its block, and between a block and the next key.
+story_separator_pattern = re.compile(rb'\s*:\s*')
+story_comma_pattern = re.compile(rb'\s*,\s*')
+
+def index_story_file(file_name, chunk_size = 2**20):
+    # This returns the position (first byte, byte after the last one) of each block of a story file, indexed by block number.
+    # It returns None if the file is not a story (a JSON object whose keys are block numbers and whose values are objects). The content of the blocks is not checked, it is decoded when the blocks are read.
+
+    entries = []
+    depth = 0
+    in_string = False
+    skip_position = -1
+    expecting_key = True
+    closed = False
+    key_start = key_end = value_start = None
+    object_start = object_end = None
+    offset = 0
+    with open(file_name, 'rb') as infile:
+        while True:
+            chunk = infile.read(chunk_size)
+            if len(chunk) == 0:
+                break
+            for match in story_structure_pattern.finditer(chunk):
+                position = offset + match.start()
+                character = match.group()
+                if position == skip_position:
+                    # Escaped character
+                    continue
+                if in_string:
+                    if character == b'\\':
+                        skip_position = position + 1
+                    elif character == b'"':
+                        in_string = False
+                        if (depth == 1) and expecting_key:
+                            key_end = position
+                            expecting_key = False
+                    continue
+                if (depth == 0) and ((character != b'{') or closed):
+                    return None
+                if character == b'"':
+                    in_string = True
+                    if depth == 1:
+                        if not expecting_key:
+                            return None
+                        key_start = position + 1
+                elif character in [b'{', b'[']:
+                    if depth == 0:
+                        object_start = position
+                    elif depth == 1:
+                        if expecting_key or (character == b'[') or (key_end is None):
+                            return None
+                        value_start = position
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        closed = True
+                        object_end = position
+                    elif depth == 1:
+                        entries.append((key_start, key_end, value_start, position + 1))
+                        key_start = key_end = value_start = None
+                        expecting_key = True
+            offset += len(chunk)
+
+        if (not closed) or (depth != 0) or in_string or (key_start is not None):
+            return None
+
+        # Only white spaces may come around the object.
+        if (object_start > 4096) or (offset - object_end > 4096):
+            return None
+        infile.seek(0)
+        if len(infile.read(object_start).strip()) > 0:
+            return None
+        infile.seek(object_end + 1)
+        if len(infile.read().strip()) > 0:
+            return None
+
+        # Read the keys and check what comes between the entries.
+        if len(entries) > 0:
+            infile.seek(object_start + 1)
+            if len(infile.read(entries[0][0] - 2 - object_start).strip()) > 0:
+                return None
+            infile.seek(entries[-1][3])
+            if len(infile.read(object_end - entries[-1][3]).strip()) > 0:
+                return None
+        index = {}
+        for i, (key_start, key_end, value_start, value_end) in enumerate(entries):
+            infile.seek(key_start)
+            key = infile.read(key_end - key_start)
+            if (not key.isdigit()) or (len(key) > 12) or (key != str(int(key)).encode()) or (int(key) in index.keys()):
+                return None
+            infile.seek(key_end + 1)
+            if story_separator_pattern.fullmatch(infile.read(value_start - key_end - 1)) is None:
+                return None
+            if i + 1 < len(entries):
+                infile.seek(value_end)
+                if story_comma_pattern.fullmatch(infile.read(entries[i+1][0] - 1 - value_end)) is None:
+                    return None
+            index[int(key)] = (value_start, value_end)
+    return index
+
+def read_story_block(infile, index, block_number):
+    # This reads and decodes a single block from a story file opened in binary mode.
+
+    value_start, value_end = index[block_number]
+    infile.seek(value_start)
+    return json.loads(infile.read(value_end - value_start).decode('utf8'))
+
+def iter_story_blocks(file_name, index, first_block_number = 0):
+    # This yields the (block number, block) of the story file in block order, one block at a time.
+
+    with open(file_name, 'rb') as infile:
+        for block_number in range(first_block_number, len(index)):
+            yield block_number, read_story_block(infile, index, block_number)
+
+class StoryFileReader:
+    # The blocks of an indexed story file, read with the same methods as a chain log (see ChainLog in chain_log.py).
+
+    def __init__(self, file_name, index):
+        self.index = index
+        self.infile = open(file_name, 'rb')
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.infile.close()
+
+    def read_block(self, block_number):
+        return read_story_block(self.infile, self.index, block_number)
+
+    def get_block_hash(self, block_number):
+        return self.read_block(block_number)['hash']
@@ -0,0 +1,63 @@
+# -----------------------------------------------------------
+# Test of the block formats 1 and 2 (see get_block_format in blockchain_functions.py)
+#
+# Run with:
+#    python -m pytest test_block_format.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import copy
+import json
+import rsa
+
+import pytest
+
+from blockchain_functions import check_hash, get_block_format, get_hashed_block_content
+
+def make_block_content():
+    chapter_data = {'story_title': 'Test Story', 'chapter_number': 1, 'author': 'Alice', 'chapter_title': 'One', 'text': 'Once upon a time, à Paris.'}
+    return {'signed_chapter_data': {'chapter_data': chapter_data, 'encrypted_hashed_chapter': 'ab'*64, 'public_key': 'cd'*128},
+            'hash_previous_block': '00'*32, 'hash_eth': '0x'+'11'*32, 'miner_name': 'Bob',
+            'difficulty': 7, 'mining_date': '2026/10/18 12:30:05', 'story_runtime_seconds': 86405, 'nb_tries': 12, 'nonce': '%064x' % 12}
+
+def get_block_hash(block_content, block_format):
+    return rsa.compute_hash(json.dumps(get_hashed_block_content(block_content, block_format), ensure_ascii = False, sort_keys = True).encode('utf8'), 'SHA-256').hex()
+
+def test_block_format_of_genesis():
+    assert get_block_format({'story_title': 'Test Story'}) == 1
+    assert get_block_format({'story_title': 'Test Story', 'block_format': 2}) == 2
+
+@pytest.mark.parametrize('block_format', [1, 2])
+def test_blocks_round_trip_through_check_hash(block_format):
+    block_content = make_block_content()
+    block_hash = get_block_hash(block_content, block_format)
+    assert check_hash(block_hash, block_content, block_format)
+    # A block saved in a story file and read back must still be accepted.
+    assert check_hash(block_hash, json.loads(json.dumps(block_content, ensure_ascii = False)), block_format)
+
+def test_hashes_of_the_two_formats_differ():
+    block_content = make_block_content()
+    assert not check_hash(get_block_hash(block_content, 2), block_content, 1)
+    assert not check_hash(get_block_hash(block_content, 1), block_content, 2)
+
+def test_format_2_replaces_the_chapter_by_its_digest():
+    block_content = make_block_content()
+    hashed_block_content = get_hashed_block_content(block_content, 2)
+    assert 'signed_chapter_data' not in hashed_block_content.keys()
+    assert hashed_block_content['chapter_digest'] == rsa.compute_hash(json.dumps(block_content['signed_chapter_data'], ensure_ascii = False, sort_keys = True).encode('utf8'), 'SHA-256').hex()
+    assert 'signed_chapter_data' in block_content.keys()
+    # The genesis block has no chapter and is hashed as it is.
+    genesis = {'story_title': 'Test Story', 'block_format': 2}
+    assert get_hashed_block_content(genesis, 2) == genesis
+
+@pytest.mark.parametrize('block_format', [1, 2])
+def test_edited_chapter_is_rejected(block_format):
+    block_content = make_block_content()
+    block_hash = get_block_hash(block_content, block_format)
+    edited_block_content = copy.deepcopy(block_content)
+    edited_block_content['signed_chapter_data']['chapter_data']['text'] = 'Once upon a time, à Lyon.'
+    assert not check_hash(block_hash, edited_block_content, block_format)
+    edited_block_content = copy.deepcopy(block_content)
+    edited_block_content['signed_chapter_data']['public_key'] = 'ce'*128
+    assert not check_hash(block_hash, edited_block_content, block_format)
@@ -0,0 +1,50 @@
+# -----------------------------------------------------------
+# Test of the block template of the mining loop (see block_template.py)
+#
+# The bytes spliced by the template and the hashes computed from its SHA-256 midstate must be exactly the ones of json.dumps, so that check_hash accepts the mined blocks.
+#
+# Run with:
+#    python -m pytest test_block_template.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import pytest
+
+from blockchain_functions import check_hash, get_hashed_block_content
+from block_template import make_block_template, fill_block_template, hash_block_template, set_template_time_fields, hash_template_try, serialize_block
+
+def make_test_block():
+    # A block to mine with a chapter that is not ASCII (accents, CJK characters, an emoji, quotes and a line break).
+
+    chapter_data = {'author': 'Zoë', 'chapter_number': 3, 'chapter_title': 'Café "au lait"', 'story_title': 'Test Story', 'text': 'Ünïcödé text: 東京の夜 🚀\nand a second line.'}
+    return {'signed_chapter_data': {'chapter_data': chapter_data, 'encrypted_hashed_chapter': 'ab'*64, 'public_key': 'cd'*128},
+            'hash_previous_block': '00'*32, 'hash_eth': '0x'+'11'*32, 'miner_name': 'Mïner',
+            'difficulty': 7, 'mining_date': '2026/10/18 12:30:05', 'story_runtime_seconds': 86405, 'nb_tries': 0, 'nonce': '0'*64}
+
+@pytest.mark.parametrize('block_format', [1, 2])
+def test_template_hash_matches_check_hash(block_format):
+    new_block = make_test_block()
+    template = make_block_template(get_hashed_block_content(new_block, block_format))
+    template = set_template_time_fields(template, new_block)
+    # Small nonces keep their leading zeros: they are always 64 hexadecimal characters.
+    for nb_tries, nonce in [(1, 0), (9, 1), (10, 2**8), (12345, 2**128 + 7), (10**9, 2**256 - 1)]:
+        new_block['nb_tries'] = nb_tries
+        new_block['nonce'] = '%064x' % nonce
+        hashed_block_content = get_hashed_block_content(new_block, block_format)
+        block_hash = hash_template_try(template, nb_tries, new_block['nonce'].encode())
+        assert fill_block_template(template, hashed_block_content) == serialize_block(hashed_block_content)
+        assert hash_block_template(template, hashed_block_content) == block_hash
+        assert check_hash(block_hash.hex(), new_block, block_format)
+
+@pytest.mark.parametrize('block_format', [1, 2])
+def test_template_follows_the_time_fields(block_format):
+    # The time fields change once per second during the mining (see set_template_time_fields), including a run-time that is not an integer.
+
+    new_block = make_test_block()
+    template = make_block_template(get_hashed_block_content(new_block, block_format))
+    for difficulty, mining_date, story_runtime_seconds in [(6, '2026/10/18 12:30:06', 86406), (8, '2026/10/19 00:00:00', 129600.5)]:
+        new_block.update({'difficulty': difficulty, 'mining_date': mining_date, 'story_runtime_seconds': story_runtime_seconds, 'nb_tries': 42, 'nonce': '%064x' % 42})
+        template = set_template_time_fields(template, new_block)
+        block_hash = hash_template_try(template, 42, new_block['nonce'].encode())
+        assert check_hash(block_hash.hex(), new_block, block_format)
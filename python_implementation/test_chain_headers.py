@@ -0,0 +1,115 @@
+# -----------------------------------------------------------
+# Test of the rules checked on all the block headers at once (see chain_headers.py)
+#
+# The results of check_header_rules must be the ones of the checks performed block by block in checks.py, on a small mined chain and on chains with a tampered header.
+#
+# Run with:
+#    python -m pytest test_chain_headers.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import copy
+import json
+import random
+import hashlib
+import datetime as dt
+import pytz
+import pytest
+
+import checks
+from chain_headers import make_block_headers, add_block_header, make_header_table, check_header_rules
+
+def get_date(mining_date):
+    return pytz.utc.localize(dt.datetime.strptime(mining_date, '%Y/%m/%d %H:%M:%S'))
+
+def mine_block(block_content, difficulty):
+    # This mines a block with the previous difficulty, with a nonce on 64 hexadecimal characters.
+
+    nonce = 0
+    while True:
+        block_content['nonce'] = '%064x' % nonce
+        block_hash = hashlib.sha256(json.dumps(block_content, ensure_ascii = False, sort_keys = True).encode('utf8')).hexdigest()
+        if int(block_hash, 16) <= 2**(256-difficulty)-1:
+            return {'block_content': block_content, 'hash': block_hash}
+        nonce = nonce + 1
+
+def make_test_chain(nb_blocks, seed):
+    # This returns the genesis block and the blocks of a small valid chain, mined more or less quickly than intended so that the difficulty changes.
+
+    rng = random.Random(seed)
+    genesis = {'story_title': 'Test Story', 'mining_date': '2026/10/01 12:30:00', 'mining_delay_days': 0.5, 'intended_mining_time_days': 1/3, 'difficulty': 4, 'story_runtime_seconds': 0.0}
+    blocks = [{'block_content': genesis, 'hash': hashlib.sha256(json.dumps(genesis, sort_keys = True).encode('utf8')).hexdigest()}]
+    for block_number in range(1, nb_blocks+1):
+        previous_block = blocks[-1]['block_content']
+        step_days = genesis['mining_delay_days'] + genesis['intended_mining_time_days']*rng.choice([0.5, 1, 1, 1.5])
+        mining_date = (get_date(previous_block['mining_date']) + dt.timedelta(days = step_days)).strftime('%Y/%m/%d %H:%M:%S')
+        block_content = {'hash_previous_block': blocks[-1]['hash'], 'mining_date': mining_date}
+        block_content['difficulty'] = checks.get_difficulty(genesis, block_content, previous_block)
+        block_content['story_runtime_seconds'] = previous_block['story_runtime_seconds'] + round((get_date(mining_date)-get_date(genesis['mining_date'])).total_seconds())
+        blocks.append(mine_block(block_content, previous_block['difficulty']))
+    return genesis, blocks
+
+def get_block_rules(genesis, blocks, block_number):
+    # This checks the rules of a block one by one, like check_new_block and check_block_hash_and_link (see checks.py).
+
+    block = blocks[block_number]['block_content']
+    previous_block = blocks[block_number-1]['block_content']
+    return {'mining_delay': checks.get_earliest_mining_date(genesis, previous_block['mining_date']) <= get_date(block['mining_date']),
+            'story_runtime': previous_block['story_runtime_seconds'] + round((get_date(block['mining_date'])-get_date(genesis['mining_date'])).total_seconds()) == block['story_runtime_seconds'],
+            'difficulty': checks.get_difficulty(genesis, block, previous_block) == block['difficulty'],
+            'proof_of_work': int.from_bytes(bytes.fromhex(blocks[block_number]['hash']),'big') <= 2**(256-previous_block['difficulty'])-1}
+
+def get_header_rules(genesis, blocks, first_block_number = 0):
+    headers = make_block_headers()
+    for block in blocks[first_block_number:]:
+        add_block_header(headers, block)
+    return check_header_rules(make_header_table(headers), genesis, first_block_number)
+
+def assert_same_rules(genesis, blocks, first_block_number = 0):
+    header_rules = get_header_rules(genesis, blocks, first_block_number)
+    for block_number in range(1, len(blocks)):
+        block_rules = get_block_rules(genesis, blocks, block_number)
+        for rule in block_rules.keys():
+            assert len(header_rules[rule]) == len(blocks)
+            if block_number > first_block_number:
+                assert bool(header_rules[rule][block_number]) == block_rules[rule], (rule, block_number)
+            else:
+                assert header_rules[rule][block_number]
+    return header_rules
+
+@pytest.fixture(scope = 'module')
+def test_chain():
+    return make_test_chain(12, 1)
+
+def test_mined_chain(test_chain):
+    genesis, blocks = test_chain
+    header_rules = assert_same_rules(genesis, blocks)
+    assert all(header_rules[rule].all() for rule in header_rules.keys())
+    assert len(set(block['block_content']['difficulty'] for block in blocks)) > 1
+
+def test_verified_prefix(test_chain):
+    genesis, blocks = test_chain
+    for first_block_number in [1, 5, len(blocks)-2]:
+        assert_same_rules(genesis, blocks, first_block_number)
+
+@pytest.mark.parametrize('field, value', [('mining_date', lambda mining_date: (get_date(mining_date)-dt.timedelta(days = 1)).strftime('%Y/%m/%d %H:%M:%S')),
+                                          ('mining_date', lambda mining_date: (get_date(mining_date)+dt.timedelta(seconds = 1)).strftime('%Y/%m/%d %H:%M:%S')),
+                                          ('difficulty', lambda difficulty: difficulty+1),
+                                          ('difficulty', lambda difficulty: 300),
+                                          ('story_runtime_seconds', lambda runtime: runtime+1),
+                                          ('story_runtime_seconds', lambda runtime: runtime+0.5)])
+def test_tampered_header(test_chain, field, value):
+    genesis, blocks = test_chain
+    blocks = copy.deepcopy(blocks)
+    block_content = blocks[6]['block_content']
+    block_content[field] = value(block_content[field])
+    header_rules = assert_same_rules(genesis, blocks)
+    assert not all(header_rules[rule][6:8].all() for rule in header_rules.keys())
+
+def test_tampered_hash(test_chain):
+    genesis, blocks = test_chain
+    blocks = copy.deepcopy(blocks)
+    blocks[6]['hash'] = 'ff'*32
+    header_rules = assert_same_rules(genesis, blocks)
+    assert not header_rules['proof_of_work'][6]
@@ -0,0 +1,45 @@
+# -----------------------------------------------------------
+# Test of the search of the ETH block that follows a date (see get_eth_block_info in blockchain_functions.py)
+#
+# The search runs against the synthetic chain of eth_test_server.py, served on a free local port.
+#
+# Run with:
+#    python -m pytest test_eth_block_info.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import hashlib
+import threading
+import datetime as dt
+import pytz
+import pytest
+from http.server import ThreadingHTTPServer
+
+import blockchain_functions
+from eth_test_server import make_test_chain, make_request_handler
+
+@pytest.fixture
+def test_node(tmp_path, monkeypatch):
+    # The ETH cache and the ETH snapshot are looked for in an empty directory, so that every date is searched on the node.
+
+    monkeypatch.chdir(tmp_path)
+    timestamps = make_test_chain(pytz.utc.localize(dt.datetime(2026, 1, 1)))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_request_handler(timestamps))
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield timestamps, 'http://127.0.0.1:'+str(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+def get_test_block_hash(block_number):
+    return '0x'+hashlib.sha256(b'%d' % block_number).hexdigest()
+
+def test_block_at_the_target_date_is_not_the_right_one(test_node):
+    # The right block is the first one whose timestamp is strictly after the target date. A block mined exactly at the target date is skipped.
+
+    timestamps, api_url = test_node
+    for block_number in [1000, 50000, 200000, 200001]:
+        target_date = dt.datetime.fromtimestamp(int(timestamps[block_number]), pytz.utc)
+        assert blockchain_functions.get_eth_block_info(target_date, api_url = api_url) == get_test_block_hash(block_number + 1)
+        assert blockchain_functions.get_eth_block_info(target_date - dt.timedelta(seconds = 1), api_url = api_url) == get_test_block_hash(block_number)
@@ -0,0 +1,96 @@
+# -----------------------------------------------------------
+# Test of the mining pool (see mining_pool.py)
+#
+# The coordinator runs on a free local port and the workers run in the same event loop, each with one mining process. The difficulty is low, so that a block is found in a few hundred tries.
+#
+# Run with:
+#    python -m pytest test_mining_pool.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import json
+import socket
+import asyncio
+import datetime as dt
+
+import mining_pool
+from blockchain_functions import get_now
+
+def get_free_port():
+    with socket.socket() as test_socket:
+        test_socket.bind(('127.0.0.1', 0))
+        return test_socket.getsockname()[1]
+
+def make_block_to_mine(difficulty = 8):
+    # This returns a block to mine after a genesis block mined two days ago, in the form returned by prepare_block_to_mine (see mining.py).
+
+    mining_date_previous_block = get_now() - dt.timedelta(days = 2)
+    genesis = {'story_title': 'Test Story', 'mining_date': dt.datetime.strftime(mining_date_previous_block, '%Y/%m/%d %H:%M:%S'), 'mining_delay_days': 1, 'intended_mining_time_days': 1, 'difficulty': difficulty, 'story_runtime_seconds': 0.0}
+    chapter_data = {'story_title': 'Test Story', 'chapter_number': 1, 'author': 'Alice', 'chapter_title': 'One', 'text': 'Once upon a time.'}
+    new_block = {'signed_chapter_data': {'chapter_data': chapter_data, 'encrypted_hashed_chapter': 'ab'*64, 'public_key': 'cd'*128}, 'hash_previous_block': '00'*32, 'hash_eth': '0x'+'11'*32, 'miner_name': 'Bob'}
+    return {'genesis': genesis, 'new_block': new_block, 'difficulty': difficulty, 'mining_date_previous_block': mining_date_previous_block, 'story_runtime_previous_block': 0.0}
+
+def record_ranges(monkeypatch):
+    # This records the ranges of tries handed out by the coordinator.
+
+    ranges = []
+    send_message = mining_pool.send_message
+    async def recording_send_message(writer, message):
+        if message['type'] == 'range':
+            ranges.append((message['first_try'], message['last_try']))
+        await send_message(writer, message)
+    monkeypatch.setattr(mining_pool, 'send_message', recording_send_message)
+    return ranges
+
+def check_mined(block_to_mine, mined):
+    new_block, new_hash = mined
+    assert mining_pool.check_pool_result(block_to_mine, new_block, new_hash.hex()) == 'success'
+    assert int.from_bytes(new_hash, 'big') <= 2**(256-block_to_mine['difficulty'])-1
+
+def test_two_workers_mine_a_block(monkeypatch):
+    block_to_mine = make_block_to_mine()
+    port = get_free_port()
+    ranges = record_ranges(monkeypatch)
+
+    async def run_pool():
+        coordinator = asyncio.create_task(mining_pool.run_coordinator(block_to_mine, '127.0.0.1', port, 50))
+        await asyncio.sleep(0.2)
+        workers = [asyncio.create_task(mining_pool.run_worker('127.0.0.1', port, 1)) for _ in range(2)]
+        mined = await asyncio.wait_for(coordinator, timeout = 60)
+        return mined, await asyncio.gather(*workers)
+
+    mined, worker_status = asyncio.run(run_pool())
+    check_mined(block_to_mine, mined)
+    assert worker_status == ['success', 'success']
+    # The ranges handed out never overlap.
+    assert len(set(ranges)) == len(ranges)
+    assert mined[0]['nb_tries'] <= max(last_try for first_try, last_try in ranges)
+
+def test_range_of_a_dropped_worker_is_handed_out_again(monkeypatch):
+    block_to_mine = make_block_to_mine()
+    port = get_free_port()
+    ranges = record_ranges(monkeypatch)
+
+    async def run_pool():
+        coordinator = asyncio.create_task(mining_pool.run_coordinator(block_to_mine, '127.0.0.1', port, 50))
+        await asyncio.sleep(0.2)
+        # This worker asks for a range and leaves before finishing it.
+        reader, writer = await asyncio.open_connection('127.0.0.1', port, limit = mining_pool.message_limit)
+        await mining_pool.send_message(writer, {'type': 'hello', 'host': 'dropped', 'workers': 1})
+        job = json.loads(await reader.readline())
+        await mining_pool.send_message(writer, {'type': 'get_range'})
+        dropped_range = json.loads(await reader.readline())
+        writer.close()
+        await asyncio.sleep(0.2)
+        worker = asyncio.create_task(mining_pool.run_worker('127.0.0.1', port, 1))
+        mined = await asyncio.wait_for(coordinator, timeout = 60)
+        return job, dropped_range, mined, await worker
+
+    job, dropped_range, mined, worker_status = asyncio.run(run_pool())
+    assert job['type'] == 'job'
+    assert (dropped_range['first_try'], dropped_range['last_try']) == (0, 50)
+    # The next worker gets the unfinished range first.
+    assert ranges[:2] == [(0, 50), (0, 50)]
+    check_mined(block_to_mine, mined)
+    assert worker_status == 'success'
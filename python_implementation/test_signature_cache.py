@@ -0,0 +1,34 @@
+# -----------------------------------------------------------
+# Test of the keys of the signature cache (see signature_cache.py)
+#
+# Run with:
+#    python -m pytest test_signature_cache.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import json
+import rsa
+
+import signature_cache
+import blockchain_functions
+
+def make_signed_chapter_data():
+    (public_key, private_key) = rsa.newkeys(512)
+    chapter_data = {'story_title': 'Test Story', 'chapter_number': 1, 'author': 'Alice', 'chapter_title': 'One', 'text': 'Once upon a time.'}
+    encrypted_hashed_chapter = rsa.sign(json.dumps(chapter_data, ensure_ascii = False, sort_keys = True).encode('utf8'), private_key, 'SHA-256')
+    return {'chapter_data': chapter_data, 'encrypted_hashed_chapter': encrypted_hashed_chapter.hex(), 'public_key': public_key.save_pkcs1().hex()}
+
+def test_shifted_boundary_misses_the_cache(monkeypatch):
+    # Moving the first bytes of the public key to the end of the signature must not give the key of the valid signed chapter.
+
+    monkeypatch.setattr(signature_cache, 'signature_cache_file_name', '')
+    monkeypatch.setattr(signature_cache, 'known_signatures', {})
+    signed_chapter_data = make_signed_chapter_data()
+    assert blockchain_functions.verify_chapter_signature(signed_chapter_data)
+
+    forged_chapter_data = dict(signed_chapter_data)
+    forged_chapter_data['encrypted_hashed_chapter'] = signed_chapter_data['encrypted_hashed_chapter']+signed_chapter_data['public_key'][:40]
+    forged_chapter_data['public_key'] = signed_chapter_data['public_key'][40:]
+    assert signature_cache.get_signature_key(forged_chapter_data) != signature_cache.get_signature_key(signed_chapter_data)
+    assert signature_cache.get_cached_signature(signature_cache.get_signature_key(forged_chapter_data)) is None
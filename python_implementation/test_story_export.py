@@ -0,0 +1,63 @@
+# -----------------------------------------------------------
+# Test of the export of the stories kept in the block store and in the chain logs (see block_store.py and chain_log.py)
+#
+# The exported story files must be byte-identical to the story file saved by save_mined_story (see mining.py).
+#
+# Run with:
+#    python -m pytest test_story_export.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import json
+import rsa
+
+import pytest
+
+import block_store
+import chain_log
+from mining import save_mined_story
+
+def get_block_hash(block_content):
+    return rsa.compute_hash(json.dumps(block_content, ensure_ascii = False, sort_keys = True).encode('utf8'), 'SHA-256')
+
+def make_test_story(nb_blocks):
+    # This returns a story of nb_blocks blocks with a chapter that is not ASCII. The difficulty is zero, so that any hash is valid.
+    # With more than 10 blocks, the order of the keys sorted as strings ('10' before '2') differs from the block order.
+
+    genesis = {'story_title': 'Test Story', 'mining_date': '2026/10/01 12:30:00', 'mining_delay_days': 0, 'intended_mining_time_days': 1, 'difficulty': 0, 'story_runtime_seconds': 0.0}
+    story = {'0': {'block_content': genesis, 'hash': get_block_hash(genesis).hex()}}
+    for block_number in range(1, nb_blocks):
+        chapter_data = {'story_title': 'Test Story', 'chapter_number': block_number, 'author': 'Zoë', 'chapter_title': 'Chapitre '+str(block_number), 'text': 'Il était une fois… 東京 "'+str(block_number)+'" \\ fin.'}
+        block_content = {'signed_chapter_data': {'chapter_data': chapter_data, 'encrypted_hashed_chapter': 'ab'*64, 'public_key': 'cd'*128},
+                         'hash_previous_block': story[str(block_number-1)]['hash'], 'hash_eth': '0x'+'11'*32, 'miner_name': 'Mïner',
+                         'difficulty': 0, 'mining_date': '2026/10/%02d 12:30:00' % (block_number+1), 'story_runtime_seconds': 86400*block_number, 'nb_tries': block_number, 'nonce': '%064x' % block_number}
+        story[str(block_number)] = {'block_content': block_content, 'hash': get_block_hash(block_content).hex()}
+    return story
+
+@pytest.fixture
+def story_file(tmp_path, monkeypatch):
+    # This saves a story of 12 blocks with save_mined_story, as if its last block was just mined.
+
+    monkeypatch.chdir(tmp_path)
+    story = make_test_story(12)
+    last_block = story.pop('11')
+    return save_mined_story(story, last_block['block_content'], bytes.fromhex(last_block['hash']))
+
+def read_file(file_name):
+    with open(file_name, 'rb') as infile:
+        return infile.read()
+
+def test_export_story_of_the_block_store(story_file):
+    tip_hash = block_store.import_story(story_file)
+    assert tip_hash != 'error'
+    assert block_store.export_story(tip_hash, 'exported.json') == 'exported.json'
+    assert read_file('exported.json') == read_file(story_file)
+
+def test_export_chain_log(story_file):
+    assert chain_log.import_story_file(story_file, 'test_story_log') == 'test_story_log'
+    assert chain_log.export_chain_log('test_story_log', 'exported.json') == 'exported.json'
+    assert read_file('exported.json') == read_file(story_file)
+    # The default file name is the one of save_mined_story.
+    assert chain_log.export_chain_log('test_story_log') == story_file
+    assert read_file(story_file) == read_file('exported.json')
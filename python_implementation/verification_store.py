@@ -0,0 +1,89 @@
+# -----------------------------------------------------------
+# Store of the blocks that were already fully verified
+#
+# Checking a story (see check_file in checks.py) costs one SHA-256 hash, one RSA signature check and one ETH lookup per block. A new story file usually only adds one block to a story that was already checked.
+# Each time a story is fully verified, the state of the chain after each of its blocks is recorded here, keyed by the block hash:
+#    - the block number and the hash of the previous block,
+#    - the author of the block and its public key,
+#    - the difficulty, mining date and story run-time of the block.
+# Only what the block adds to the chain is recorded. The index of all the authors and public keys of the story (see make_chain_index in blockchain_functions.py) is only recorded for its last block (its tip), for the last max_recorded_tips tips of each story.
+# A block hash identifies the whole chain before it (each block contains the hash of the previous one). When a story contains a recorded block, the blocks up to it only need their hashes and links to be checked again. Only the new blocks go through all the checks. If the recorded block is a tip, the index of the authors starts from the recorded one and only the new blocks are added to it.
+# Each story has its own file in the directory verification_checkpoints of the working directory, named after the hash of its genesis block ([hash].checkpoint), so that checking a story only reads and writes the blocks of this story. The files are updated under a lock (see update_json_file) so that the command line scripts and the graphical user interface can share them.
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import datetime as dt
+
+from blockchain_functions import *
+
+verification_store_directory = 'verification_checkpoints'
+max_recorded_tips = 8
+
+def get_checkpoint_file_name(genesis_hash):
+    return os.path.join(verification_store_directory, str(genesis_hash)+'.checkpoint')
+
+def load_checkpoints(genesis_hash):
+    # This returns the recorded states of the blocks of a story ('blocks', indexed by block hash) and the recorded indexes of the authors of its tips ('tips', indexed by block hash).
+
+    try:
+        checkpoints = load_json_file(get_checkpoint_file_name(genesis_hash))
+    except (OSError, ValueError):
+        print('The verification store '+get_checkpoint_file_name(genesis_hash)+' could not be read. All the blocks are checked.')
+        checkpoints = {}
+    if set(checkpoints.keys()) != set(['blocks', 'tips']):
+        return {'blocks': {}, 'tips': {}}
+    return checkpoints
+
+def get_verified_prefix(genesis_hash, last_block_number, get_block_hash, checkpoints = None):
+    # This returns the largest block number of the story whose block (and thus the whole chain up to it) was already fully verified, together with the index of the authors recorded for this block (None if it is not a recorded tip).
+    # get_block_hash(block_number) returns the hash of a block of the story. The blocks are looked at from the last one, so that usually only one or two are read.
+    # It returns (0, None) if no block of the story was verified before.
+
+    if checkpoints is None:
+        checkpoints = load_checkpoints(genesis_hash)
+    if len(checkpoints['blocks']) == 0:
+        return 0, None
+    for block_number in range(last_block_number, 0, -1):
+        block_hash = get_block_hash(block_number)
+        state = checkpoints['blocks'].get(block_hash)
+        if (state is not None) and (state['block_number'] == block_number):
+            return block_number, checkpoints['tips'].get(block_hash)
+    return 0, None
+
+def get_chain_state(block_number, block_content):
+    # This returns the state of the chain after the block (see the description above).
+
+    signed_chapter_data = block_content['signed_chapter_data']
+    return {'block_number': block_number, 'hash_previous_block': block_content['hash_previous_block'],
+            'author': signed_chapter_data['chapter_data']['author'], 'public_key': signed_chapter_data['public_key'], 'difficulty': block_content['difficulty'],
+            'mining_date': block_content['mining_date'], 'story_runtime_seconds': block_content['story_runtime_seconds']}
+
+def record_verified_blocks(story, first_block_number, chain_index):
+    # This records the states of the chain after the blocks first_block_number to the last block of the story. These blocks must have been fully verified. chain_index is the index of the authors of the whole story.
+
+    states = {}
+    for block_number in range(first_block_number, len(story)):
+        block = story[str(block_number)]
+        states[block['hash']] = get_chain_state(block_number, block['block_content'])
+    return record_chain_states(story['0']['hash'], states, story[str(len(story)-1)]['hash'], chain_index)
+
+def record_chain_states(genesis_hash, states, tip_hash, chain_index):
+    # This records the states of the chain (see get_chain_state) indexed by block hash and the index of the authors of the story ending with tip_hash. The blocks must have been fully verified.
+
+    verified = dt.datetime.strftime(get_now(), '%Y/%m/%d %H:%M:%S')
+    states = {block_hash: dict(state, verified = verified) for block_hash, state in states.items()}
+
+    def record(checkpoints):
+        if set(checkpoints.keys()) != set(['blocks', 'tips']):
+            checkpoints.clear()
+            checkpoints.update({'blocks': {}, 'tips': {}})
+        checkpoints['blocks'].update(states)
+        checkpoints['tips'][tip_hash] = chain_index
+        # Only the indexes of the longest tips are kept.
+        tips = sorted(checkpoints['tips'].keys(), key = lambda block_hash: checkpoints['blocks'][block_hash]['block_number'] if block_hash in checkpoints['blocks'].keys() else -1)
+        for block_hash in tips[:-max_recorded_tips]:
+            del checkpoints['tips'][block_hash]
+    os.makedirs(verification_store_directory, exist_ok = True)
+    return update_json_file(get_checkpoint_file_name(genesis_hash), record)
@@ -0,0 +1,149 @@
+# -----------------------------------------------------------
+# Index of the *.json files of the working directory
+#
+# The scripts look for genesis blocks, key files, stories and signed chapters among all the *.json files of the working directory. The working directory can contain thousands of files downloaded from the discord server (see get_files_from_discord.py), so that reading all of them for each action takes a long time.
+# The index keeps a summary of each file: its type, story title, chapter number, chapter title, author and, for the stories, the number, hash, miner and story run-time of the last block.
+# It is kept in the file workspace.index in the working directory, together with the modification time and size of each file. Only the new and modified files are read again.
+#
+# Print the index with:
+#    python workspace.py
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import sys
+import glob
+import json
+
+import blockchain_functions
+
+workspace_index_file_name = 'workspace.index'
+# The names of the file types, as shown to the user.
+workspace_file_types = {'unsigned_chapter': 'un-signed chapter', 'signed_chapter': 'signed chapter', 'keys': 'key file', 'block': 'validated block (isolated)',
+                        'genesis_block': 'validated genesis block (isolated)', 'story': 'validated story', 'other': 'other', 'invalid': 'invalid json file'}
+
+def summarize_json_file(file_name):
+    # This reads a *.json file and returns its summary (see the description above). The files that can not be read are of type 'invalid' and the unknown contents are of type 'other'.
+
+    summary = {'type': 'other', 'story_title': None, 'chapter_number': None, 'chapter_title': None, 'author': None}
+    try:
+        with open(file_name, encoding='utf-8') as infile:
+            data = json.load(infile)
+    except (OSError, ValueError):
+        summary['type'] = 'invalid'
+        return summary
+    if type(data) != dict:
+        return summary
+
+    def add_chapter_data(chapter_data):
+        for k in ['story_title', 'chapter_number', 'chapter_title', 'author']:
+            summary[k] = chapter_data.get(k)
+
+    try:
+        if set(['story_title', 'chapter_number', 'author', 'chapter_title', 'text']) == set(data.keys()):
+            summary['type'] = 'unsigned_chapter'
+            add_chapter_data(data)
+        elif set(['chapter_data', 'encrypted_hashed_chapter', 'public_key']) == set(data.keys()):
+            summary['type'] = 'signed_chapter'
+            add_chapter_data(data['chapter_data'])
+        elif set(['public_key', 'private_key', 'author']) == set(data.keys()):
+            summary['type'] = 'keys'
+            summary['author'] = data['author']
+        elif set(['block_content', 'hash']) == set(data.keys()):
+            if 'signed_chapter_data' in data['block_content'].keys():
+                summary['type'] = 'block'
+                add_chapter_data(data['block_content']['signed_chapter_data']['chapter_data'])
+            else:
+                summary['type'] = 'genesis_block'
+                add_chapter_data(data['block_content'])
+        elif all([x.isdigit() for x in data.keys()]) and (len(data) != 0):
+            summary['type'] = 'story'
+            tip_block_number = max([int(k) for k in data.keys()])
+            tip = data[str(tip_block_number)]
+            if 'signed_chapter_data' in tip['block_content'].keys():
+                add_chapter_data(tip['block_content']['signed_chapter_data']['chapter_data'])
+            else:
+                add_chapter_data(tip['block_content'])
+            # The title of a story is the one of its genesis block.
+            summary['story_title'] = data['0']['block_content']['story_title'] if '0' in data.keys() else None
+            summary['tip_block_number'] = tip_block_number
+            summary['tip_hash'] = tip['hash']
+            summary['miner_name'] = tip['block_content'].get('miner_name')
+            summary['story_runtime_seconds'] = tip['block_content'].get('story_runtime_seconds')
+    except (KeyError, TypeError, AttributeError, ValueError):
+        summary = {'type': 'other', 'story_title': None, 'chapter_number': None, 'chapter_title': None, 'author': None}
+    return summary
+
+def update_file_summary(file_name, summary = None):
+    # This returns the summary of a file, from its previous summary if the modification time and size of the file did not change. It returns None if the file does not exist anymore.
+
+    try:
+        file_stat = os.stat(file_name)
+    except OSError:
+        return None
+    if (summary is None) or (summary['mtime_ns'] != file_stat.st_mtime_ns) or (summary['size'] != file_stat.st_size):
+        summary = dict(summarize_json_file(file_name), mtime_ns = file_stat.st_mtime_ns, size = file_stat.st_size)
+    return summary
+
+def save_workspace_index(index):
+    # This saves the summaries in workspace.index.
+
+    def replace(stored_index):
+        stored_index.clear()
+        stored_index.update(index)
+    try:
+        blockchain_functions.update_json_file(workspace_index_file_name, replace)
+    except OSError as error:
+        print('The workspace index '+workspace_index_file_name+' could not be saved: '+str(error))
+
+def get_workspace_index():
+    # This returns the summaries of all the *.json files of the working directory, indexed by file name (in the order of glob).
+    # The summaries of the files whose modification time and size did not change are taken from workspace.index, the other files are read again.
+
+    try:
+        cached_index = blockchain_functions.load_json_file(workspace_index_file_name)
+    except (OSError, ValueError):
+        cached_index = {}
+    index = {}
+    changed = False
+    for file_name in glob.glob('*.json'):
+        summary = update_file_summary(file_name, cached_index.get(file_name))
+        if summary is None:
+            continue
+        changed = changed or (summary is not cached_index.get(file_name))
+        index[file_name] = summary
+    if changed or (len(index) != len(cached_index)):
+        save_workspace_index(index)
+    return index
+
+def find_workspace_files(file_type, index = None, **fields):
+    # This returns the names of the files of the given type whose summary has the given values, for example find_workspace_files('keys', author = 'Bob').
+
+    if index is None:
+        index = get_workspace_index()
+    return [file_name for file_name, summary in index.items() if (summary['type'] == file_type) and all([summary.get(k) == v for k, v in fields.items()])]
+
+def print_workspace_index(index):
+    # This prints the summaries of the files.
+
+    for file_name in sorted(index.keys()):
+        summary = index[file_name]
+        line = file_name+': '+workspace_file_types[summary['type']]
+        if summary['story_title'] is not None:
+            line = line+', '+str(summary['story_title'])
+        if summary['type'] == 'story':
+            line = line+', last block '+str(summary['tip_block_number'])+' ('+str(summary['story_runtime_seconds'])+' s)'
+        elif summary['chapter_number'] is not None:
+            line = line+', chapter '+str(summary['chapter_number'])
+        if summary['author'] is not None:
+            line = line+', '+str(summary['author'])
+        print(line)
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        print_workspace_index(get_workspace_index())
+    else:
+        print('Usage: python workspace.py')
@@ -0,0 +1,253 @@
+# -----------------------------------------------------------
+# Live view of the *.json files of the working directory
+#
+# The workspace index (see workspace.py) is read again each time a window of gui.py is opened or a script looks for a file. The watcher keeps the index in memory instead and updates it as the files are created, modified, renamed or deleted, so that a long-running process (gui.py or a validator) never needs to scan the working directory again.
+# The changes are detected by a background thread:
+#    - with inotify on Linux: the kernel reports the names of the files that changed.
+#    - by polling elsewhere (or with --poll): the modification time and size of the files are compared every poll_interval_seconds.
+# Only the names of the changed files are collected by the thread. They are read again, and the subscribers are called, when process_changes is called by the process (for example from the tkinter main loop, see gui.py). A file is only read again if its modification time or size changed.
+#
+# Print the changes as they happen with:
+#    python workspace_watcher.py [--poll] [--check]
+# With --check, the new and modified files are checked with check_file (see checks.py).
+#
+# 18/10/2026
+# -----------------------------------------------------------
+
+import os
+import sys
+import glob
+import time
+import queue
+import struct
+import select
+import threading
+import ctypes
+import ctypes.util
+
+import blockchain_functions
+import workspace
+import checks
+
+# The inotify events that change the *.json files of the working directory (see 'man inotify').
+inotify_attributes = 0x00000004
+inotify_close_write = 0x00000008
+inotify_moved_from = 0x00000040
+inotify_moved_to = 0x00000080
+inotify_create = 0x00000100
+inotify_delete = 0x00000200
+inotify_queue_overflow = 0x00004000
+inotify_mask = inotify_attributes | inotify_close_write | inotify_moved_from | inotify_moved_to | inotify_create | inotify_delete
+inotify_event_header = struct.Struct('iIII')
+
+poll_interval_seconds = 2
+
+def start_inotify():
+    # This returns an inotify file descriptor watching the working directory or None if inotify is not available.
+
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+        file_descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if file_descriptor < 0:
+        return None
+    if libc.inotify_add_watch(file_descriptor, os.fsencode(os.getcwd()), inotify_mask) < 0:
+        os.close(file_descriptor)
+        return None
+    return file_descriptor
+
+def read_inotify_events(file_descriptor):
+    # This returns the names of the *.json files reported by the pending inotify events. It returns None if some events were lost, in which case all the files must be looked at again.
+
+    try:
+        data = os.read(file_descriptor, 2**16)
+    except BlockingIOError:
+        return []
+    file_names = []
+    position = 0
+    while position < len(data):
+        watch_descriptor, mask, cookie, name_length = inotify_event_header.unpack_from(data, position)
+        position += inotify_event_header.size
+        if mask & inotify_queue_overflow:
+            return None
+        file_name = os.fsdecode(data[position:position + name_length].rstrip(b'\0'))
+        position += name_length
+        if file_name[-5:] == '.json':
+            file_names.append(file_name)
+    return file_names
+
+def get_json_file_states():
+    # This returns the (modification time, size) of each *.json file of the working directory.
+
+    states = {}
+    with os.scandir('.') as entries:
+        for entry in entries:
+            if entry.name[-5:] != '.json':
+                continue
+            try:
+                file_stat = entry.stat()
+            except OSError:
+                continue
+            states[entry.name] = (file_stat.st_mtime_ns, file_stat.st_size)
+    return states
+
+class WorkspaceWatcher:
+    # The watcher of the working directory. Its index has the same content as the one returned by workspace.get_workspace_index.
+    # Usage:
+    #    watcher = WorkspaceWatcher()
+    #    watcher.subscribe(callback)      # callback(change, file_name, summary) with change = 'added', 'modified' or 'removed' (summary is None)
+    #    watcher.start()
+    #    ...
+    #    watcher.process_changes()        # regularly, from the thread that uses the index
+    #    ...
+    #    watcher.stop()
+
+    def __init__(self, use_inotify = True, save_index = True):
+        self.use_inotify = use_inotify
+        self.save_index = save_index
+        self.index = {}
+        self.subscribers = []
+        self.changed_files = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.backend = None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def start(self):
+        # This starts watching the working directory and builds the index. The watch starts before the index is built, so that no change is missed.
+
+        file_descriptor = start_inotify() if self.use_inotify else None
+        if file_descriptor is not None:
+            self.backend = 'inotify'
+            self.thread = threading.Thread(target = self.watch_inotify, args = (file_descriptor,), daemon = True)
+        else:
+            self.backend = 'polling'
+            self.thread = threading.Thread(target = self.watch_polling, args = (get_json_file_states(),), daemon = True)
+        self.thread.start()
+        self.index = workspace.get_workspace_index()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def watch_inotify(self, file_descriptor):
+        try:
+            while not self.stop_event.is_set():
+                ready, _, _ = select.select([file_descriptor], [], [], 0.5)
+                if len(ready) == 0:
+                    continue
+                file_names = read_inotify_events(file_descriptor)
+                if file_names is None:
+                    self.changed_files.put(None)
+                else:
+                    for file_name in file_names:
+                        self.changed_files.put(file_name)
+        finally:
+            os.close(file_descriptor)
+
+    def watch_polling(self, states):
+        while not self.stop_event.wait(poll_interval_seconds):
+            new_states = get_json_file_states()
+            for file_name in set(states.keys()) | set(new_states.keys()):
+                if states.get(file_name) != new_states.get(file_name):
+                    self.changed_files.put(file_name)
+            states = new_states
+
+    def wait_for_changes(self, timeout = None):
+        # This waits until a change is detected (or until the timeout in seconds) and then processes the changes (see process_changes).
+
+        try:
+            file_name = self.changed_files.get(timeout = timeout)
+        except queue.Empty:
+            return []
+        self.changed_files.put(file_name)
+        return self.process_changes()
+
+    def process_changes(self):
+        # This updates the index with the files that changed since the last call and calls the subscribers. It returns the list of the changes (change, file name, summary).
+
+        file_names = set()
+        while True:
+            try:
+                file_name = self.changed_files.get_nowait()
+            except queue.Empty:
+                break
+            if file_name is None:
+                # Some events were lost: look at all the files.
+                file_names.update(glob.glob('*.json'))
+                file_names.update(self.index.keys())
+            else:
+                file_names.add(file_name)
+
+        changes = []
+        for file_name in sorted(file_names):
+            previous_summary = self.index.get(file_name)
+            summary = workspace.update_file_summary(file_name, previous_summary)
+            if summary is None:
+                if previous_summary is not None:
+                    del self.index[file_name]
+                    changes.append(('removed', file_name, None))
+            elif previous_summary is None:
+                self.index[file_name] = summary
+                changes.append(('added', file_name, summary))
+            elif summary is not previous_summary:
+                self.index[file_name] = summary
+                changes.append(('modified', file_name, summary))
+
+        if len(changes) > 0:
+            if self.save_index:
+                workspace.save_workspace_index(self.index)
+            for change, file_name, summary in changes:
+                for callback in list(self.subscribers):
+                    callback(change, file_name, summary)
+        return changes
+
+# The watcher shared by the windows of a process (see get_workspace_watcher).
+workspace_watcher = None
+
+def get_workspace_watcher():
+    # This returns the watcher of the process, started on the first call.
+
+    global workspace_watcher
+    if workspace_watcher is None:
+        workspace_watcher = WorkspaceWatcher()
+        workspace_watcher.start()
+    return workspace_watcher
+
+def print_change(change, file_name, summary):
+    if summary is None:
+        print(time.strftime('%H:%M:%S')+' '+change+' '+file_name)
+    else:
+        print(time.strftime('%H:%M:%S')+' '+change+' '+file_name+': '+workspace.workspace_file_types[summary['type']])
+
+################################# The program starts here ################################################
+
+if __name__ == "__main__":
+    use_polling = blockchain_functions.pop_flag(sys.argv, '--poll')
+    check_changes = blockchain_functions.pop_flag(sys.argv, '--check')
+    if len(sys.argv) != 1:
+        print('Usage: python workspace_watcher.py [--poll] [--check]')
+        sys.exit()
+
+    watcher = WorkspaceWatcher(use_inotify = not use_polling)
+    watcher.subscribe(print_change)
+    watcher.start()
+    print('Watching '+str(len(watcher.index))+' *.json file(s) in '+os.getcwd()+' ('+watcher.backend+'). Stop with Ctrl+C.')
+    try:
+        while True:
+            for change, file_name, summary in watcher.wait_for_changes(timeout = 1):
+                if check_changes and (change != 'removed') and (summary['type'] not in ['keys', 'other', 'invalid']):
+                    print(checks.check_file(file_name))
+    except KeyboardInterrupt:
+        watcher.stop()